@@ -0,0 +1,75 @@
+"""
+Gunicorn configuration for the Stock Sentiment Analysis API
+
+The application (and with it the FinBERT weights) is loaded once in the master
+process before the workers are forked. The workers share the weight pages
+copy-on-write: inference only reads the weights, so no copy is ever made.
+Adding workers then costs little extra resident memory beyond per-worker
+activations.
+
+The same configuration serves the async ASGI app (src/asgi.py) with uvicorn's
+worker class:
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "src.asgi:create_asgi_app()"
+
+Environment variables:
+    PORT                 Port to bind (default 5000)
+    WEB_CONCURRENCY      Number of worker processes (default: one per CPU core, or 1 with
+                         SENTIMENT_BACKEND=pool, whose own processes already use every core)
+    GUNICORN_THREADS     Request threads per worker (default 8; unused by the ASGI worker)
+    TORCH_THREADS        Intra-op torch threads per worker (default: cores / workers)
+    SENTIMENT_LOAD_MODE  Defaults to 'preload' here; see src/lifecycle.py
+"""
+
+import gc
+import os
+
+
+def _cpu_count():
+    """Returns the number of cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+# Each worker of the pool backend's processes holds a full copy of the model, and every web
+# worker would start its own pool: one web worker per core would mean cores x cores copies
+_default_workers = 1 if os.environ.get('SENTIMENT_BACKEND') == 'pool' else _cpu_count()
+workers = int(os.environ.get('WEB_CONCURRENCY') or _default_workers)
+# PoolBackend sizes its pool to this worker's share of the cores
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 0
+
+# Load the model in the master so that every worker inherits the same pages;
+# each worker then runs its own warm-up (see post_fork)
+preload_app = True
+os.environ.setdefault('SENTIMENT_LOAD_MODE', 'preload')
+
+
+def pre_fork(server, worker):
+    """Move everything allocated so far out of the garbage collector's reach.
+
+    A collection in a worker would otherwise write to the headers of the
+    preloaded objects and force private copies of the pages they live on.
+    """
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Split the cores between workers and start this worker's model warm-up and job runner."""
+    import torch
+
+    torch_threads = int(os.environ.get('TORCH_THREADS', max(1, _cpu_count() // server.cfg.workers)))
+    torch.set_num_threads(torch_threads)
+    server.log.info("Worker %s using %s torch threads", worker.pid, torch_threads)
+
+    # Threads do not survive the fork, so every worker warms up its own process and
+    # starts its own job runner (only one of them will hold the runner lock)
+    extensions = getattr(worker.app.wsgi(), 'extensions', {})
+    if 'model_state' in extensions:
+        extensions['model_state'].start_warmup()
+    if 'job_runner' in extensions:
+        extensions['job_runner'].ensure_started()
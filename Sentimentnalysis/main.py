@@ -10,6 +10,7 @@ Usage Examples:
 
 1. Running the API locally:
    python main.py
+   python main.py serve --asgi    # async server: request I/O on an event loop
 
 2. Testing with curl commands:
    
@@ -36,7 +37,32 @@ Usage Examples:
    python -m pytest tests/
    python tests/test_api.py
 
-4. Deployment:
+4. Exporting an inference backend and checking it against eager PyTorch:
+   python main.py export --backend onnx --output models/finbert.onnx
+   python main.py parity --backend onnx --path models/finbert.onnx
+
+5. Measuring accuracy drift and speed of reduced-precision modes:
+   python main.py drift --precision int8 bf16
+
+6. Baking the model into a local bundle for offline, fast startup:
+   python main.py bundle --output models/finbert
+   SENTIMENT_MODEL=models/finbert python main.py
+
+7. Measuring how throughput scales with the multi-process inference pool:
+   python main.py scaling --workers 1 2 4 8
+
+8. Scoring a file offline, without the HTTP server:
+   python main.py score articles.csv --output scores.jsonl --processes 4 --threads 2
+
+9. Benchmarking the inference pipeline offline and comparing two commits:
+   python main.py bench --output benchmarks/before.json
+   python main.py bench --output benchmarks/after.json --compare benchmarks/before.json
+
+10. Load testing a running server with a mix of headlines and article batches:
+   python main.py load --url http://localhost:5000 --mode closed --concurrency 16 --duration 30
+   python main.py load --url http://localhost:5000 --mode open --qps 50 --duration 30
+
+11. Deployment:
    See README.md for deployment options (Railway, Heroku, Google Cloud Run, etc.)
 
 Features:
@@ -50,19 +76,33 @@ Features:
 - Ready for deployment to various platforms
 """
 
-from src.api import create_app
+import argparse
+import json
 import os
+import tempfile
 
+# Keep in sync with src.benchmark.DEFAULT_STAND_IN, which is not imported here to keep startup light
+DEFAULT_STAND_IN = os.path.join(tempfile.gettempdir(), 'finbert-stand-in')
 
-def main():
-    """Main function to run the Flask application"""
-    app = create_app()
-    
+
+def serve(args):
+    """Run the Flask application, or the ASGI application under uvicorn"""
     # Get configuration from environment variables
     host = os.environ.get('HOST', '0.0.0.0')
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
+    if getattr(args, 'asgi', False):
+        import uvicorn
+        from src.asgi import create_asgi_app
+        
+        uvicorn.run(create_asgi_app(), host=host, port=port)
+        return
+    
+    from src.api import create_app
+    
+    app = create_app()
+    
     print(f"""
 ╔════════════════════════════════════════════════════╗
 ║        Stock Sentiment Analysis API                ║
@@ -76,5 +116,244 @@ def main():
     app.run(host=host, port=port, debug=debug)
 
 
+def export(args):
+    """Export the model to a TorchScript or ONNX graph"""
+    from transformers import BertForSequenceClassification
+    from src.backends import export_onnx, export_torchscript
+    
+    model = BertForSequenceClassification.from_pretrained(args.model).eval()
+    if args.backend == 'onnx':
+        export_onnx(model, args.output)
+    else:
+        export_torchscript(model, args.output)
+    print(f"Exported {args.model} to {args.output} ({args.backend})")
+
+
+def parity(args):
+    """Compare an exported backend with eager PyTorch on the reference texts"""
+    from src.backends import create_backend, parity_report
+    from src.sentiment_analyzer import StockSentimentAnalyzer
+    
+    analyzer = StockSentimentAnalyzer(model_name=args.model)
+    candidate = create_backend(args.backend, analyzer.model, args.path)
+    report = parity_report(analyzer, {args.backend: candidate})
+    print(json.dumps(report, indent=2))
+    
+    if report[args.backend]['max_abs_diff'] > args.tolerance:
+        raise SystemExit(f"Parity check failed: max_abs_diff exceeds {args.tolerance}")
+
+
+def drift(args):
+    """Compare reduced-precision modes with fp32 on the reference texts"""
+    from src.backends import drift_report
+    from src.sentiment_analyzer import StockSentimentAnalyzer
+    
+    report = drift_report(
+        lambda precision: StockSentimentAnalyzer(model_name=args.model, backend=args.backend,
+                                                 precision=precision, cache_size=0),
+        precisions=args.precision
+    )
+    print(json.dumps(report, indent=2))
+
+
+def bundle(args):
+    """Write a self-contained local bundle of the model and tokenizer"""
+    from src.bundle import build_bundle, verify_bundle
+    
+    if args.verify:
+        problems = verify_bundle(args.output)
+        if problems:
+            raise SystemExit(f"Bundle {args.output} is damaged: {', '.join(problems)}")
+        print(f"Bundle {args.output} is intact")
+        return
+    
+    manifest = build_bundle(args.model, args.output)
+    size_mb = sum(entry['bytes'] for entry in manifest['files'].values()) / 2 ** 20
+    print(f"Bundled {args.model} into {args.output} ({size_mb:.1f} MB)")
+
+
+def scaling(args):
+    """Report how inference pool throughput scales with the number of worker processes"""
+    from src.backends import REFERENCE_TEXTS
+    from src.pool import scaling_report
+    from src.sentiment_analyzer import StockSentimentAnalyzer
+    
+    texts = [REFERENCE_TEXTS[i % len(REFERENCE_TEXTS)] for i in range(args.texts)]
+    report = scaling_report(
+        lambda workers: StockSentimentAnalyzer(model_name=args.model, backend='pool', pool_workers=workers,
+                                               precision=args.precision, cache_size=0),
+        args.workers, texts, batch_size=args.batch_size
+    )
+    print(json.dumps(report, indent=2))
+
+
+def score(args):
+    """Score a CSV, JSONL or Parquet file in batches and write the results incrementally"""
+    from src.batch_scoring import score_file
+    
+    summary = score_file(
+        args.input, args.output,
+        analyzer_kwargs={'model_name': args.model, 'batch_size': args.model_batch_size,
+                         'backend': args.backend, 'backend_path': args.backend_path,
+                         'precision': args.precision},
+        chunk_size=args.batch_size, threads=args.threads, processes=args.processes,
+        text_column=args.text_column, keep_text=args.keep_text,
+        input_format=args.input_format, output_format=args.output_format
+    )
+    print(json.dumps(summary, indent=2))
+
+
+def bench(args):
+    """Time analyze_sentiment and get_stock_sentiment and save the results as JSON"""
+    from src.benchmark import compare_results, resolve_model, run_benchmarks, save_results
+    
+    report = run_benchmarks(
+        resolve_model(args.model, args.stand_in_dir),
+        backends=args.backend, threads=args.threads, sequence_lengths=args.sequence_lengths,
+        batch_sizes=args.batch_sizes, precision=args.precision, single_calls=args.single_calls,
+        articles=args.articles, repeats=args.repeats, work_dir=args.work_dir
+    )
+    if args.output:
+        save_results(report, args.output)
+        print(f"Saved {len(report['results'])} results to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if args.compare:
+        with open(args.compare) as f:
+            comparison = compare_results(json.load(f), report, tolerance=args.tolerance)
+        print(json.dumps(comparison, indent=2))
+        if comparison['regressions']:
+            raise SystemExit(f"{len(comparison['regressions'])} metrics regressed by more than {args.tolerance:.0%}")
+
+
+def load(args):
+    """Send a mix of /analyze and /analyze-stock requests to a server and report latency and throughput"""
+    from src.loadgen import TrafficMix, run_load, wait_until_ready
+    
+    if args.wait_ready:
+        wait_until_ready(args.url, timeout=args.wait_ready)
+    mix = TrafficMix(single_fraction=args.single_fraction, article_counts=args.article_counts,
+                     unique=not args.allow_cache_hits, seed=args.seed)
+    report = run_load(args.url, mode=args.mode, duration=args.duration, concurrency=args.concurrency,
+                      qps=args.qps, mix=mix, warmup=args.warmup, timeout=args.timeout)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def build_parser():
+    """Build the command line parser; with no subcommand the API server is started"""
+    parser = argparse.ArgumentParser(description="Stock Sentiment Analysis API")
+    parser.set_defaults(func=serve)
+    subparsers = parser.add_subparsers(title="commands")
+    
+    serve_parser = subparsers.add_parser('serve', help="Run the API server (default)")
+    serve_parser.add_argument('--asgi', action='store_true',
+                              help="Serve the async ASGI app with uvicorn instead of Flask")
+    serve_parser.set_defaults(func=serve)
+    
+    export_parser = subparsers.add_parser('export', help="Export the model for the torchscript or onnx backend")
+    export_parser.add_argument('--backend', choices=['onnx', 'torchscript'], default='onnx')
+    export_parser.add_argument('--model', default='ProsusAI/finbert')
+    export_parser.add_argument('--output', required=True, help="Path of the graph to write")
+    export_parser.set_defaults(func=export)
+    
+    parity_parser = subparsers.add_parser('parity', help="Compare a backend's outputs with eager PyTorch")
+    parity_parser.add_argument('--backend', choices=['onnx', 'torchscript'], default='onnx')
+    parity_parser.add_argument('--model', default='ProsusAI/finbert')
+    parity_parser.add_argument('--path', required=True, help="Exported graph; created if missing")
+    parity_parser.add_argument('--tolerance', type=float, default=1e-4,
+                               help="Largest acceptable absolute difference in probabilities")
+    parity_parser.set_defaults(func=parity)
+    
+    drift_parser = subparsers.add_parser('drift', help="Report accuracy drift and speed of precision modes")
+    drift_parser.add_argument('--model', default='ProsusAI/finbert')
+    drift_parser.add_argument('--backend', choices=['torch', 'torchscript'], default='torch')
+    drift_parser.add_argument('--precision', nargs='+', choices=['fp32', 'int8', 'bf16'], default=['int8', 'bf16'])
+    drift_parser.set_defaults(func=drift)
+    
+    bundle_parser = subparsers.add_parser('bundle', help="Write a local model bundle for offline startup")
+    bundle_parser.add_argument('--model', default='ProsusAI/finbert')
+    bundle_parser.add_argument('--output', required=True, help="Directory of the bundle to write")
+    bundle_parser.add_argument('--verify', action='store_true',
+                               help="Check an existing bundle against its manifest instead of writing one")
+    bundle_parser.set_defaults(func=bundle)
+    
+    scaling_parser = subparsers.add_parser('scaling', help="Report inference pool throughput by number of workers")
+    scaling_parser.add_argument('--model', default='ProsusAI/finbert')
+    scaling_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    scaling_parser.add_argument('--texts', type=int, default=512, help="Number of texts scored per pass")
+    scaling_parser.add_argument('--batch-size', type=int, default=256, help="Rows per call, sharded across workers")
+    scaling_parser.add_argument('--precision', choices=['fp32', 'int8', 'bf16'], default='fp32')
+    scaling_parser.set_defaults(func=scaling)
+    
+    score_parser = subparsers.add_parser('score', help="Score a CSV, JSONL or Parquet file offline")
+    score_parser.add_argument('input', help="File to score")
+    score_parser.add_argument('--output', required=True, help="File to write; format from its extension")
+    score_parser.add_argument('--model', default='ProsusAI/finbert')
+    score_parser.add_argument('--text-column', default='text', help="Field holding the text")
+    score_parser.add_argument('--keep-text', action='store_true', help="Copy the text to the output")
+    score_parser.add_argument('--batch-size', type=int, default=1024,
+                              help="Records read, scored and written at a time")
+    score_parser.add_argument('--model-batch-size', type=int, default=32, help="Texts per forward pass")
+    score_parser.add_argument('--threads', type=int, help="Torch threads per process")
+    score_parser.add_argument('--processes', type=int, default=1, help="Scoring processes")
+    score_parser.add_argument('--backend', choices=['torch', 'torchscript', 'onnx', 'pool'], default='torch')
+    score_parser.add_argument('--backend-path', help="Saved TorchScript/ONNX graph")
+    score_parser.add_argument('--precision', choices=['fp32', 'int8', 'bf16'], default='fp32')
+    score_parser.add_argument('--input-format', choices=['csv', 'jsonl', 'parquet'])
+    score_parser.add_argument('--output-format', choices=['csv', 'jsonl', 'parquet'])
+    score_parser.set_defaults(func=score)
+    
+    bench_parser = subparsers.add_parser('bench', help="Benchmark the inference pipeline offline")
+    bench_parser.add_argument('--model', help="Model or bundle to time; defaults to a random FinBERT-shaped stand-in")
+    bench_parser.add_argument('--stand-in-dir', default=DEFAULT_STAND_IN, help="Where the stand-in bundle is kept")
+    bench_parser.add_argument('--backend', nargs='+', choices=['torch', 'torchscript', 'onnx'], default=['torch'])
+    bench_parser.add_argument('--threads', type=int, nargs='+', default=[1], help="Torch thread counts")
+    bench_parser.add_argument('--sequence-lengths', type=int, nargs='+', default=[16, 64, 128, 512])
+    bench_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32],
+                              help="Forward-pass batch sizes for get_stock_sentiment")
+    bench_parser.add_argument('--precision', choices=['fp32', 'int8', 'bf16'], default='fp32')
+    bench_parser.add_argument('--single-calls', type=int, default=32, help="analyze_sentiment calls per pass")
+    bench_parser.add_argument('--articles', type=int, default=32, help="Articles per get_stock_sentiment call")
+    bench_parser.add_argument('--repeats', type=int, default=3, help="Timed passes per case")
+    bench_parser.add_argument('--work-dir', help="Where exported graphs are kept between runs")
+    bench_parser.add_argument('--output', help="JSON file to write the results to")
+    bench_parser.add_argument('--compare', help="Earlier results to compare with; exits non-zero on regressions")
+    bench_parser.add_argument('--tolerance', type=float, default=0.1, help="Relative change counted as a regression")
+    bench_parser.set_defaults(func=bench)
+    
+    load_parser = subparsers.add_parser('load', help="Load test a running server")
+    load_parser.add_argument('--url', default='http://localhost:5000', help="Base URL of the server")
+    load_parser.add_argument('--mode', choices=['closed', 'open'], default='closed',
+                             help="closed: fixed concurrency; open: fixed arrival rate")
+    load_parser.add_argument('--duration', type=float, default=30.0, help="Seconds of measured load")
+    load_parser.add_argument('--warmup', type=float, default=5.0, help="Seconds of unmeasured load first")
+    load_parser.add_argument('--concurrency', type=int, default=8,
+                             help="Clients (closed) or most requests in flight (open)")
+    load_parser.add_argument('--qps', type=float, default=10.0, help="Target request rate in open mode")
+    load_parser.add_argument('--single-fraction', type=float, default=0.7, help="Share of requests to /analyze")
+    load_parser.add_argument('--article-counts', type=int, nargs='+', default=[2, 5, 10, 20, 50],
+                             help="Article batch sizes of /analyze-stock requests")
+    load_parser.add_argument('--allow-cache-hits', action='store_true',
+                             help="Let texts repeat instead of making every one unique")
+    load_parser.add_argument('--seed', type=int, default=0)
+    load_parser.add_argument('--timeout', type=float, default=60.0, help="Seconds before a request fails")
+    load_parser.add_argument('--wait-ready', type=float, default=120.0,
+                             help="Seconds to wait for /health/ready first; 0 to skip")
+    load_parser.add_argument('--output', help="JSON file to write the report to")
+    load_parser.set_defaults(func=load)
+    
+    return parser
+
+
+def main(argv=None):
+    """Main function: dispatch to the requested command"""
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,206 @@
+"""
+Rolling per-symbol sentiment aggregates
+
+Every article scored for a symbol is folded into that symbol's running state, and
+the current aggregates are read back without touching the model. For each window
+(1 hour, 1 day and 7 days by default) the state keeps:
+
+    count / mean    Articles and their mean scores over the window, from a ring of
+                    time buckets (e.g. 60 one-minute buckets for the hour). Expired
+                    buckets are subtracted from running totals as time moves on, so
+                    the window edge is accurate to one bucket.
+    decayed mean    An exponentially weighted mean with the window as time constant:
+                    an article's weight falls to 1/e after one window.
+
+Recording and reading cost O(1) per window, independent of how many articles a
+symbol has seen; only the bucket rings (a few hundred numbers per symbol) are
+kept, never the articles. The store is in memory and per process: with several
+gunicorn workers each one aggregates the requests it served.
+"""
+
+from collections import OrderedDict
+import math
+import re
+import threading
+import time
+
+
+# Name, span in seconds and number of buckets of each rolling window
+DEFAULT_WINDOWS = (
+    ('1h', 3600, 60),
+    ('1d', 86400, 96),
+    ('7d', 7 * 86400, 168),
+)
+
+# Score fields averaged, as in sentiment_analyzer.LABELS (not imported here to avoid a cycle)
+LABELS = ('positive', 'negative', 'neutral')
+
+# Longest symbol accepted; "BRK.B", "^GSPC", "EURUSD=X" and "7203.T" fit with room to spare
+MAX_SYMBOL_LENGTH = 16
+
+# Letters, digits, '.', '-' and '=', optionally after the '^' of an index
+_SYMBOL = re.compile(r'\^?[A-Z0-9][A-Z0-9.=-]*')
+
+
+def normalize_symbol(symbol):
+    """
+    Returns the key a symbol is stored under, or None if it is not a usable symbol: up to
+    MAX_SYMBOL_LENGTH letters, digits, '.', '-' and '=', optionally after a leading '^'.
+    """
+    if not isinstance(symbol, str):
+        return None
+    key = symbol.strip().upper()
+    if len(key) > MAX_SYMBOL_LENGTH or not _SYMBOL.fullmatch(key):
+        return None
+    return key
+
+
+class _Window:
+    """Bucketed running totals and an exponentially decayed mean over one time window."""
+    def __init__(self, span, buckets):
+        self.span = span
+        self.width = span / buckets
+        self.counts = [0] * buckets
+        self.sums = [[0.0] * len(LABELS) for _ in range(buckets)]
+        self.count = 0
+        self.totals = [0.0] * len(LABELS)
+        self.head = None
+        self.decayed_weight = 0.0
+        self.decayed_sums = [0.0] * len(LABELS)
+        self.decayed_at = None
+
+    def _advance(self, now):
+        """Expires the buckets that have left the window by time now."""
+        bucket = int(now // self.width)
+        if self.head is None:
+            self.head = bucket
+            return
+        for step in range(min(bucket - self.head, len(self.counts))):
+            index = (self.head + 1 + step) % len(self.counts)
+            self.count -= self.counts[index]
+            self.totals = [total - value for total, value in zip(self.totals, self.sums[index])]
+            self.counts[index] = 0
+            self.sums[index] = [0.0] * len(LABELS)
+        if not self.count:
+            # Start over from exact zeros rather than carry subtraction rounding errors
+            self.totals = [0.0] * len(LABELS)
+        self.head = max(self.head, bucket)
+
+    def _decay(self, now):
+        if self.decayed_at is not None and now > self.decayed_at:
+            factor = math.exp(-(now - self.decayed_at) / self.span)
+            self.decayed_weight *= factor
+            self.decayed_sums = [value * factor for value in self.decayed_sums]
+        self.decayed_at = max(now, self.decayed_at or now)
+
+    def add(self, now, count, sums):
+        """Adds count articles whose scores sum to sums, observed at time now."""
+        self._advance(now)
+        index = self.head % len(self.counts)
+        self.counts[index] += count
+        self.sums[index] = [total + value for total, value in zip(self.sums[index], sums)]
+        self.count += count
+        self.totals = [total + value for total, value in zip(self.totals, sums)]
+        self._decay(now)
+        self.decayed_weight += count
+        self.decayed_sums = [total + value for total, value in zip(self.decayed_sums, sums)]
+
+    def read(self, now):
+        self._advance(now)
+        self._decay(now)
+        mean = dict(zip(LABELS, (total / self.count for total in self.totals))) if self.count else None
+        decayed = (dict(zip(LABELS, (total / self.decayed_weight for total in self.decayed_sums)))
+                   if self.decayed_weight else None)
+        return {
+            'count': self.count,
+            'mean': mean,
+            'dominant_sentiment': max(mean, key=mean.get) if mean else None,
+            'decayed_mean': decayed,
+            'decayed_weight': self.decayed_weight
+        }
+
+
+class _SymbolState:
+    def __init__(self, windows):
+        self.windows = {name: _Window(span, buckets) for name, span, buckets in windows}
+        self.total = 0
+        self.first_seen = None
+        self.last_updated = None
+
+
+class SymbolAggregates:
+    """
+    In-memory rolling sentiment aggregates per stock symbol.
+    """
+    def __init__(self, windows=DEFAULT_WINDOWS, max_symbols=10_000, clock=time.time):
+        """
+        Args:
+            windows (tuple): (name, span in seconds, number of buckets) of each window.
+            max_symbols (int): Symbols kept; the least recently updated one is dropped beyond that.
+                With the default windows each symbol takes about 35 KB.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.windows = tuple(windows)
+        self.max_symbols = max_symbols
+        self.clock = clock
+        self._symbols = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def record(self, symbol, sentiments, timestamp=None):
+        """
+        Folds scored articles into a symbol's aggregates.
+
+        Args:
+            symbol (str): The stock symbol; case and surrounding spaces are ignored.
+            sentiments (list): One score dict per article, as returned by analyze_batch.
+            timestamp (float, optional): When the articles were seen; now by default.
+        """
+        key = normalize_symbol(symbol)
+        if key is None or not sentiments:
+            return
+        now = self.clock() if timestamp is None else timestamp
+        sums = [sum(sentiment[label] for sentiment in sentiments) for label in LABELS]
+        with self._lock:
+            state = self._symbols.get(key)
+            if state is None:
+                state = self._symbols[key] = _SymbolState(self.windows)
+                state.first_seen = now
+                if len(self._symbols) > self.max_symbols:
+                    self._symbols.popitem(last=False)
+            else:
+                self._symbols.move_to_end(key)
+            for window in state.windows.values():
+                window.add(now, len(sentiments), sums)
+            state.total += len(sentiments)
+            state.last_updated = max(now, state.last_updated or now)
+
+    def get(self, symbol):
+        """
+        Returns a symbol's current aggregates, or None if it has never been recorded.
+
+        Returns:
+            dict: The symbol, the number of articles ever recorded, when it was first
+            and last updated, and per window the article count, mean scores, dominant
+            sentiment, decayed mean and decayed weight; means are None while a window is empty.
+        """
+        key = normalize_symbol(symbol)
+        now = self.clock()
+        with self._lock:
+            state = self._symbols.get(key)
+            if state is None:
+                return None
+            return {
+                'symbol': key,
+                'articles_recorded': state.total,
+                'first_seen': state.first_seen,
+                'last_updated': state.last_updated,
+                'windows': {name: window.read(now) for name, window in state.windows.items()}
+            }
+
+    def symbols(self):
+        """Returns the tracked symbols, least recently updated first."""
+        with self._lock:
+            return list(self._symbols)
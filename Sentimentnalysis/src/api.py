@@ -2,32 +2,183 @@
 Flask API endpoints for Stock Sentiment Analysis
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, has_request_context, request, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from .batching import MicroBatcher
+from .encoding import GZIP_MIN_BYTES, compress, dumps_json, encode, loads_json
+from .handlers import (
+    METRICS_MIMETYPE, MODEL_ENDPOINTS, NDJSON_MIMETYPE, RequestError, StockStream, analyze_response,
+    history_payload, home_payload, metrics_text, not_loaded_payload, parse_analyze, parse_analyze_portfolio,
+    parse_analyze_stock, parse_history_query, portfolio_response, score_analyze, score_analyze_portfolio,
+    score_analyze_stock, split_stock_request, stats_payload, stock_response, symbol_payload, uses_batcher,
+    wants_stream
+)
+from .jobs import JobRunner, JobStore
+from .lifecycle import ModelState
+from .metrics import RequestMetrics
 from .sentiment_analyzer import StockSentimentAnalyzer
+import os
+import time
+
+
+class EncodingJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider, encoding with orjson when it is installed and answering
+    jsonify in MessagePack to clients that ask for it (see encoding.py). Every
+    response body it encodes is timed.
+    """
+    def dumps(self, obj, **kwargs):
+        return dumps_json(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads_json(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        start = time.perf_counter()
+        accept = request.headers.get('Accept') if has_request_context() else None
+        # Compression is left to the app's after_request hook, which also covers other responses
+        body, mimetype, headers = encode(obj, accept, min_gzip_bytes=None, default=self.default)
+        self._app.extensions['request_metrics'].serialize.observe(time.perf_counter() - start)
+        return self._app.response_class(body, mimetype=mimetype, headers=headers)
+
+
+def _build_analyzer():
+    """Create the analyzer from the SENTIMENT_* environment variables"""
+    return StockSentimentAnalyzer(
+        model_name=os.environ.get('SENTIMENT_MODEL', 'ProsusAI/finbert'),
+        batch_size=int(os.environ.get('SENTIMENT_BATCH_SIZE', 32)),
+        max_batch_tokens=int(os.environ['SENTIMENT_MAX_BATCH_TOKENS']) if os.environ.get('SENTIMENT_MAX_BATCH_TOKENS') else None,
+        cache_size=int(os.environ.get('SENTIMENT_CACHE_SIZE', 4096)),
+        cache_ttl=float(os.environ['SENTIMENT_CACHE_TTL']) if os.environ.get('SENTIMENT_CACHE_TTL') else None,
+        disk_cache_path=os.environ.get('SENTIMENT_DISK_CACHE'),
+        disk_cache_size=int(os.environ.get('SENTIMENT_DISK_CACHE_SIZE', 1_000_000)),
+        backend=os.environ.get('SENTIMENT_BACKEND', 'torch'),
+        backend_path=os.environ.get('SENTIMENT_BACKEND_PATH'),
+        precision=os.environ.get('SENTIMENT_PRECISION', 'fp32'),
+        pool_workers=int(os.environ['SENTIMENT_POOL_WORKERS']) if os.environ.get('SENTIMENT_POOL_WORKERS') else None,
+        history_path=os.environ.get('SENTIMENT_HISTORY_PATH'),
+        near_duplicate_distance=int(os.environ['SENTIMENT_NEAR_DUPLICATE_DISTANCE']) if os.environ.get('SENTIMENT_NEAR_DUPLICATE_DISTANCE') else None,
+        near_duplicate_size=int(os.environ.get('SENTIMENT_NEAR_DUPLICATE_SIZE', 100_000))
+    )
+
+
+def create_model_state():
+    """
+    Create the model state and start loading the analyzer.
+    
+    By default loading happens in the background so the server binds immediately;
+    /health/ready reports when warm-up has finished.
+    """
+    warmup_lengths = os.environ.get('SENTIMENT_WARMUP_LENGTHS', '16,64,128,256,512')
+    state = ModelState(
+        _build_analyzer,
+        warmup_lengths=[int(n) for n in warmup_lengths.split(',') if n.strip()]
+    )
+    print("Loading FinBERT model... This may take a moment.")
+    state.start(os.environ.get('SENTIMENT_LOAD_MODE', 'background'))
+    return state
+
+
+def create_batcher(state):
+    """Create the micro-batcher through which concurrent /analyze requests share forward passes"""
+    return MicroBatcher(
+        lambda texts: state.analyzer.analyze_batch(texts),
+        max_batch_size=int(os.environ.get('SENTIMENT_MAX_BATCH_SIZE', 32)),
+        max_wait_ms=float(os.environ.get('SENTIMENT_MAX_BATCH_WAIT_MS', 5))
+    )
+
+
+def create_job_runner(state):
+    """
+    Create the runner that scores bulk jobs in the background once the analyzer is loaded.
+    
+    It starts right away so that interrupted jobs resume without waiting for a request,
+    except with gunicorn's preload_app, where each worker starts it after the fork.
+    """
+    runner = JobRunner(
+        JobStore(os.environ.get('SENTIMENT_JOB_DIR')),
+        lambda: state.analyzer,
+        batch_size=int(os.environ.get('SENTIMENT_JOB_BATCH_SIZE', 1024))
+    )
+    if os.environ.get('SENTIMENT_LOAD_MODE', 'background') != 'preload':
+        runner.ensure_started()
+    return runner
 
 
 def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
     CORS(app)  # Enable CORS for OpenAI to access your API
+    request_metrics = RequestMetrics()
+    app.extensions['request_metrics'] = request_metrics
+    app.json = EncodingJSONProvider(app)
+    gzip_min_bytes = int(os.environ.get('SENTIMENT_GZIP_MIN_BYTES', GZIP_MIN_BYTES))
     
-    # Initialize the analyzer once when the app starts
-    print("Loading FinBERT model... This may take a moment.")
-    analyzer = StockSentimentAnalyzer()
-    print("Model loaded successfully!")
+    # Load the analyzer once per app
+    state = create_model_state()
+    app.extensions['model_state'] = state
+    batcher = create_batcher(state)
+    runner = create_job_runner(state)
+    app.extensions['job_runner'] = runner
+    
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        """Record the request latency; streamed responses count until their headers are sent"""
+        started = g.get('request_started')
+        if started is not None:
+            request_metrics.observe(request.endpoint or 'not_found', response.status_code,
+                                    time.perf_counter() - started)
+        return response
+
+    # Registered after record_request so that it runs first and its time is included
+    @app.after_request
+    def compress_response(response):
+        """Gzip large bodies for clients that accept it; streamed and file responses are left as they are"""
+        if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+            return response
+        body, headers = compress(response.get_data(), request.headers.get('Accept-Encoding'), gzip_min_bytes)
+        if headers:
+            response.set_data(body)
+            response.headers.update(headers)
+        response.vary.add('Accept-Encoding')
+        return response
+    
+    @app.before_request
+    def require_model():
+        """Answer 503 on model endpoints until the analyzer is loaded"""
+        if request.endpoint in MODEL_ENDPOINTS and state.analyzer is None:
+            return jsonify(not_loaded_payload(state)), 503
     
     @app.route('/', methods=['GET'])
     def home():
         """Health check endpoint"""
-        return jsonify({
-            "status": "active",
-            "message": "Stock Sentiment Analysis API is running",
-            "endpoints": {
-                "/analyze": "POST - Analyze sentiment of a single text",
-                "/analyze-stock": "POST - Analyze sentiment for multiple news articles about a stock"
-            }
-        })
+        return jsonify(home_payload(state))
+
+    @app.route('/health/live', methods=['GET'])
+    def liveness():
+        """Liveness probe: the process is up and serving HTTP"""
+        return jsonify({"status": "alive"})
+
+    @app.route('/health/ready', methods=['GET'])
+    def readiness():
+        """Readiness probe: 200 once the model is loaded and warmed up, 503 before"""
+        return jsonify(state.snapshot()), 200 if state.ready else 503
+
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        """Inference pipeline statistics endpoint"""
+        return jsonify(stats_payload(state.analyzer))
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics endpoint"""
+        return Response(metrics_text(state, batcher, request_metrics), content_type=METRICS_MIMETYPE)
 
     @app.route('/analyze', methods=['POST'])
     def analyze_single():
@@ -38,39 +189,38 @@ def create_app():
         {
             "text": "Your financial text here"
         }
+        
+        Clients that tokenize themselves may send "input_ids" (a list of token ids
+        from the model's tokenizer) instead of "text". Setting "long_document" to true
+        scores the whole text in overlapping windows, combined according to
+        "aggregation" ("mean", "weighted" or "max"). With "compact": true the text is
+        not echoed back.
         """
         try:
-            data = request.get_json()
-            
-            if not data or 'text' not in data:
-                return jsonify({
-                    "error": "Missing 'text' field in request body"
-                }), 400
-            
-            text = data['text']
-            
-            if not text or not isinstance(text, str):
-                return jsonify({
-                    "error": "'text' must be a non-empty string"
-                }), 400
-            
-            sentiment = analyzer.analyze_sentiment(text)
-            
-            # Determine dominant sentiment
-            dominant_sentiment = max(sentiment, key=sentiment.get)
-            
-            return jsonify({
-                "text": text,
-                "sentiment_scores": sentiment,
-                "dominant_sentiment": dominant_sentiment,
-                "confidence": sentiment[dominant_sentiment]
-            })
+            parsed = parse_analyze(request.get_json(), state.analyzer.tokenizer.vocab_size)
+            if uses_batcher(parsed):
+                sentiment = batcher.analyze(parsed['text'])
+            else:
+                sentiment = score_analyze(state.analyzer, parsed)
+            return jsonify(analyze_response(parsed, sentiment))
         
+        except RequestError as e:
+            return jsonify(e.payload()), e.status
         except Exception as e:
             return jsonify({
                 "error": f"An error occurred: {str(e)}"
             }), 500
 
+    def stream_stock(parsed):
+        """Yields the NDJSON lines of a streamed /analyze-stock response, one batch at a time"""
+        stream = StockStream(parsed)
+        try:
+            for start, chunk in split_stock_request(parsed, state.analyzer.batch_size):
+                yield stream.lines(start, score_analyze_stock(state.analyzer, chunk, stream.stats))
+            yield stream.summary()
+        except Exception as e:
+            yield stream.error(e)
+
     @app.route('/analyze-stock', methods=['POST'])
     def analyze_stock():
         """
@@ -84,51 +234,142 @@ def create_app():
                 "Article text 2"
             ]
         }
+        
+        Pre-tokenized articles may be sent as "news_token_ids" (a list of token id
+        lists) instead of "news_articles". "long_document" and "aggregation" work as
+        for /analyze.
+        
+        With "stream": true (or "Accept: application/x-ndjson") the response is
+        streamed as NDJSON: one line per article as soon as its batch is scored,
+        then a summary line with the aggregate sentiment.
+        
+        With SENTIMENT_NEAR_DUPLICATE_DISTANCE set, an article that is a near-duplicate
+        of one scored recently (another byline, a trailing disclaimer) reuses its
+        scores; "near_duplicates" counts them.
+        
+        With "compact": true, the per-article scores come back as one array per label
+        under "scores" instead of "individual_sentiments". Like every JSON response, the
+        body is MessagePack for "Accept: application/msgpack" and gzipped when large
+        and "Accept-Encoding: gzip" is sent.
         """
         try:
             data = request.get_json()
-            
-            if not data or 'news_articles' not in data:
-                return jsonify({
-                    "error": "Missing 'news_articles' field in request body"
-                }), 400
-            
-            symbol = data.get('symbol', 'UNKNOWN')
-            news_articles = data['news_articles']
-            
-            if not isinstance(news_articles, list):
-                return jsonify({
-                    "error": "'news_articles' must be a list of strings"
-                }), 400
-            
-            if not news_articles:
-                return jsonify({
-                    "error": "'news_articles' list cannot be empty"
-                }), 400
-            
-            sentiment_results = analyzer.get_stock_sentiment(symbol, news_articles)
-            
-            # Calculate aggregate sentiment
-            aggregate = {
-                'positive': sum(s['positive'] for s in sentiment_results) / len(sentiment_results),
-                'negative': sum(s['negative'] for s in sentiment_results) / len(sentiment_results),
-                'neutral': sum(s['neutral'] for s in sentiment_results) / len(sentiment_results)
-            }
-            
-            overall_sentiment = max(aggregate, key=aggregate.get)
-            
+            parsed = parse_analyze_stock(data, state.analyzer.tokenizer.vocab_size)
+            if wants_stream(data, request.headers.get('Accept')):
+                return Response(stream_with_context(stream_stock(parsed)), mimetype=NDJSON_MIMETYPE)
+            stats = {}
+            sentiment_results = score_analyze_stock(state.analyzer, parsed, stats)
+            return jsonify(stock_response(parsed, sentiment_results, stats.get('near_duplicates', 0)))
+        
+        except RequestError as e:
+            return jsonify(e.payload()), e.status
+        except Exception as e:
             return jsonify({
-                "symbol": symbol,
-                "articles_analyzed": len(news_articles),
-                "individual_sentiments": sentiment_results,
-                "aggregate_sentiment": aggregate,
-                "overall_sentiment": overall_sentiment,
-                "confidence": aggregate[overall_sentiment]
-            })
+                "error": f"An error occurred: {str(e)}"
+            }), 500
+    
+    @app.route('/analyze-portfolio', methods=['POST'])
+    def analyze_portfolio():
+        """
+        Endpoint to analyze the news of many stocks in one request.
+        
+        Expected JSON body:
+        {
+            "portfolio": [
+                {"symbol": "AAPL", "news_articles": ["Fed raises rates", "Apple beats estimates"]},
+                {"symbol": "MSFT", "news_articles": ["Fed raises rates"]}
+            ]
+        }
+        
+        An article shared by several symbols is scored once: all distinct articles go
+        through the model in one batch and their scores are fanned back out. Each entry
+        of "results" has the same fields as an /analyze-stock response. "long_document"
+        and "aggregation" work as for /analyze.
+        """
+        try:
+            parsed = parse_analyze_portfolio(request.get_json())
+            return jsonify(portfolio_response(parsed, score_analyze_portfolio(state.analyzer, parsed)))
+        
+        except RequestError as e:
+            return jsonify(e.payload()), e.status
+        except Exception as e:
+            return jsonify({
+                "error": f"An error occurred: {str(e)}"
+            }), 500
+
+    @app.route('/sentiment/<symbol>', methods=['GET'])
+    def symbol_sentiment(symbol):
+        """
+        Endpoint to read a symbol's rolling sentiment without running the model.
         
+        Every article analyzed for the symbol through /analyze-stock updates its
+        1h, 1d and 7d windows: article counts, mean scores, the dominant sentiment
+        and an exponentially decayed mean. Each worker process keeps its own store.
+        """
+        try:
+            return jsonify(symbol_payload(state.analyzer, symbol))
+        except RequestError as e:
+            return jsonify(e.payload()), e.status
+
+    @app.route('/history/<symbol>', methods=['GET'])
+    def symbol_history(symbol):
+        """
+        Endpoint to read a symbol's stored sentiment over a time range without running the model.
+        
+        Query parameters:
+            start, end  Unix seconds or ISO 8601; the last 7 days by default
+            interval    1m, 5m, 15m, 1h, 4h, 1d, 1w or seconds; 1h by default
+        
+        Returns one point per interval that has articles, with the article count and
+        mean scores. Requires SENTIMENT_HISTORY_PATH.
+        """
+        try:
+            return jsonify(history_payload(state.analyzer, symbol, parse_history_query(request.args)))
+        except RequestError as e:
+            return jsonify(e.payload()), e.status
         except Exception as e:
             return jsonify({
                 "error": f"An error occurred: {str(e)}"
             }), 500
+
+    @app.route('/jobs', methods=['POST'])
+    def submit_job():
+        """
+        Endpoint to submit a corpus for background scoring.
+        
+        The body is JSONL: one JSON string, or object with a "text" field, per line.
+        The corpus is written to disk as it arrives and queued; poll /jobs/<job_id>
+        for progress and download /jobs/<job_id>/results when it has completed.
+        """
+        try:
+            job = runner.store.create(iter(lambda: request.stream.read(1 << 16), b''))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        runner.wake()
+        return jsonify(runner.store.status(job)), 202, {'Location': f"/jobs/{job['id']}"}
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        """Job status, progress and throughput endpoint"""
+        job = runner.store.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+        return jsonify(runner.store.status(job))
+
+    @app.route('/jobs/<job_id>/results', methods=['GET'])
+    def job_results(job_id):
+        """
+        Endpoint to download a job's results as JSONL, one line per input line in order.
+        
+        Results of a job that is still running are partial; the X-Job-Status header
+        tells whether the job has completed.
+        """
+        job = runner.store.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+        response = send_file(runner.store.path(job_id, 'results.jsonl'), mimetype=NDJSON_MIMETYPE,
+                             download_name=f"{job_id}.jsonl")
+        response.headers['X-Job-Status'] = job['status']
+        return response
     
     return app
@@ -0,0 +1,336 @@
+"""
+ASGI application for Stock Sentiment Analysis with inference offloaded from the event loop
+
+Serves the same routes and payloads as the Flask app in api.py. Request I/O runs
+on the event loop, so thousands of idle or slow connections cost a coroutine each
+rather than a thread. Model calls never run on the loop: single texts go through
+the shared micro-batcher, and everything else runs on a small dedicated inference
+executor sized to keep the cores busy without oversubscribing them.
+
+Run it with uvicorn, or under gunicorn with uvicorn's worker class:
+
+    uvicorn --factory src.asgi:create_asgi_app --port 5000
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "src.asgi:create_asgi_app()"
+
+Environment variables (in addition to those read by api.py):
+    INFERENCE_THREADS    Threads of the inference executor (default 1)
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, unquote
+
+from .api import create_batcher, create_job_runner, create_model_state
+from .encoding import GZIP_MIN_BYTES, encode, loads_json
+from .handlers import (
+    METRICS_MIMETYPE, MODEL_ENDPOINTS, NDJSON_MIMETYPE, RequestError, StockStream, analyze_response,
+    history_payload, home_payload, metrics_text, not_loaded_payload, parse_analyze, parse_analyze_portfolio,
+    parse_analyze_stock, parse_history_query, portfolio_response, score_analyze, score_analyze_portfolio,
+    score_analyze_stock, split_stock_request, stats_payload, stock_response, symbol_payload, uses_batcher,
+    wants_stream
+)
+from .jobs import JobUpload
+from .metrics import RequestMetrics
+
+
+class AsgiApp:
+    """
+    A minimal ASGI application routing JSON requests to the shared handlers.
+    """
+    def __init__(self, state, batcher, runner, inference_threads=1, gzip_min_bytes=GZIP_MIN_BYTES):
+        """
+        Args:
+            state (ModelState): Loads and holds the analyzer.
+            batcher (MicroBatcher): Shares forward passes between concurrent /analyze requests.
+            runner (JobRunner): Scores bulk jobs in the background.
+            inference_threads (int): Threads of the executor that runs the other model calls.
+            gzip_min_bytes (int): Smallest response body gzipped for clients that accept it.
+        """
+        self.state = state
+        self.batcher = batcher
+        self.runner = runner
+        self.inference_threads = inference_threads
+        self.gzip_min_bytes = gzip_min_bytes
+        self.request_metrics = RequestMetrics()
+        # Mirrors Flask's app.extensions so gunicorn's post_fork hook finds the model state
+        self.extensions = {'model_state': state, 'job_runner': runner, 'request_metrics': self.request_metrics}
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.routes = {
+            '/': ('home', 'GET', self.home),
+            '/health/live': ('liveness', 'GET', self.liveness),
+            '/health/ready': ('readiness', 'GET', self.readiness),
+            '/stats': ('stats', 'GET', self.stats),
+            '/metrics': ('metrics', 'GET', self.metrics),
+            '/analyze': ('analyze_single', 'POST', self.analyze_single),
+            '/analyze-stock': ('analyze_stock', 'POST', self.analyze_stock),
+            '/analyze-portfolio': ('analyze_portfolio', 'POST', self.analyze_portfolio),
+        }
+
+    def executor(self):
+        """Returns the inference executor, creating a new one after a fork."""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.inference_threads,
+                                                    thread_name_prefix="inference")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    async def run_model(self, fn, *args):
+        """Runs a blocking model call on the inference executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor(), fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        """Acknowledges startup (the model is already loading) and stops the executor on shutdown."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        if scope['method'] == 'OPTIONS':
+            await self._send(send, 200, None, {
+                'access-control-allow-methods': 'GET, POST, OPTIONS',
+                'access-control-allow-headers': headers.get('access-control-request-headers', '*')
+            })
+            return
+
+        if scope['path'] == '/jobs' or scope['path'].startswith('/jobs/'):
+            await self._jobs(scope, receive, send, headers)
+            return
+
+        started = time.perf_counter()
+        route = self.routes.get(scope['path'])
+        if scope['path'].startswith('/sentiment/') and scope['path'].count('/') == 2:
+            symbol = unquote(scope['path'][len('/sentiment/'):])
+            route = ('symbol_sentiment', 'GET', partial(self.symbol_sentiment, symbol))
+        elif scope['path'].startswith('/history/') and scope['path'].count('/') == 2:
+            symbol = unquote(scope['path'][len('/history/'):])
+            query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+            route = ('symbol_history', 'GET', partial(self.symbol_history, symbol, query))
+        endpoint = route[0] if route is not None else 'not_found'
+        status = await self._route(scope, receive, send, headers, route)
+        # As with Flask, a streamed response counts until its headers are sent
+        self.request_metrics.observe(endpoint, status, time.perf_counter() - started)
+
+    async def _route(self, scope, receive, send, headers, route):
+        """Answers a request to one of the routes and returns the response status."""
+        if route is None:
+            return await self._send(send, 404, {"error": "Not found"}, request_headers=headers)
+        endpoint, method, handler = route
+        if scope['method'] != method:
+            return await self._send(send, 405, {"error": "Method not allowed"}, {'allow': f'{method}, OPTIONS'},
+                                    request_headers=headers)
+        if endpoint in MODEL_ENDPOINTS and self.state.analyzer is None:
+            return await self._send(send, 503, not_loaded_payload(self.state), request_headers=headers)
+
+        data = await self._read_json(receive) if method == 'POST' else None
+        try:
+            status, payload = await handler(data, headers)
+        except RequestError as e:
+            status, payload = e.status, e.payload()
+        except Exception as e:
+            status, payload = 500, {"error": f"An error occurred: {str(e)}"}
+        if isinstance(payload, StockStream):
+            await self._stream(receive, send, payload)
+            return status
+        if isinstance(payload, str):
+            return await self._send_body(send, status, payload.encode(), METRICS_MIMETYPE)
+        return await self._send(send, status, payload, request_headers=headers)
+
+    @staticmethod
+    async def _read_json(receive):
+        """Reads the whole request body and decodes it as JSON; None if it is not valid JSON."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        try:
+            return loads_json(b''.join(chunks))
+        except ValueError:
+            return None
+
+    async def _send(self, send, status, payload, extra_headers=None, request_headers=None):
+        """
+        Sends a JSON response, or MessagePack and gzip if the request headers ask for them, and returns its status.
+        """
+        if payload is None:
+            return await self._send_body(send, status, b'', 'application/json', extra_headers)
+        request_headers = request_headers or {}
+        start = time.perf_counter()
+        body, content_type, headers = encode(payload, request_headers.get('accept'),
+                                             request_headers.get('accept-encoding'), self.gzip_min_bytes)
+        self.request_metrics.serialize.observe(time.perf_counter() - start)
+        headers.update(extra_headers or {})
+        return await self._send_body(send, status, body, content_type, headers)
+
+    @staticmethod
+    async def _send_body(send, status, body, content_type, extra_headers=None):
+        headers = [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode()),
+                   (b'access-control-allow-origin', b'*')]
+        headers += [(name.lower().encode(), value.encode()) for name, value in (extra_headers or {}).items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+
+    async def _stream(self, receive, send, stream):
+        """Sends a streamed /analyze-stock response, scoring one chunk at a time on the executor."""
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', NDJSON_MIMETYPE.encode()), (b'access-control-allow-origin', b'*')]})
+        # Stop scoring if the client goes away mid-stream
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            try:
+                for start, chunk in split_stock_request(stream.parsed, self.state.analyzer.batch_size):
+                    sentiment_results = await self.run_model(score_analyze_stock, self.state.analyzer, chunk,
+                                                            stream.stats)
+                    if disconnected.done():
+                        return
+                    await send({'type': 'http.response.body', 'body': stream.lines(start, sentiment_results).encode(),
+                                'more_body': True})
+                last = stream.summary()
+            except Exception as e:
+                last = stream.error(e)
+            await send({'type': 'http.response.body', 'body': last.encode()})
+        finally:
+            disconnected.cancel()
+
+    async def _jobs(self, scope, receive, send, headers):
+        """Serves the bulk job endpoints: POST /jobs, GET /jobs/<job_id> and GET /jobs/<job_id>/results."""
+        store = self.runner.store
+        parts = scope['path'].strip('/').split('/')
+        if parts == ['jobs'] and scope['method'] == 'POST':
+            # File I/O runs in threads so that a large upload does not stall other requests
+            upload = await asyncio.to_thread(JobUpload, store)
+            job = None
+            try:
+                while True:
+                    message = await receive()
+                    if message['type'] == 'http.disconnect':
+                        return
+                    await asyncio.to_thread(upload.write, message.get('body', b''))
+                    if not message.get('more_body'):
+                        break
+                job = await asyncio.to_thread(upload.close)
+            except ValueError as e:
+                await self._send(send, 400, {"error": str(e)}, request_headers=headers)
+                return
+            finally:
+                if job is None:
+                    # Never leave a half-written job directory behind
+                    upload.abort()
+            self.runner.wake()
+            await self._send(send, 202, store.status(job), {'location': f"/jobs/{job['id']}"},
+                             request_headers=headers)
+            return
+        if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] != 'results'):
+            await self._send(send, 404, {"error": "Not found"}, request_headers=headers)
+            return
+        if scope['method'] != 'GET':
+            await self._send(send, 405, {"error": "Method not allowed"}, {'allow': 'GET, OPTIONS'},
+                             request_headers=headers)
+            return
+        job = await asyncio.to_thread(store.get, parts[1])
+        if job is None:
+            await self._send(send, 404, {"error": f"Unknown job '{parts[1]}'"}, request_headers=headers)
+            return
+        if len(parts) == 2:
+            await self._send(send, 200, store.status(job), request_headers=headers)
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', NDJSON_MIMETYPE.encode()), (b'access-control-allow-origin', b'*'),
+            (b'x-job-status', job['status'].encode())
+        ]})
+        f = await asyncio.to_thread(open, store.path(job['id'], 'results.jsonl'), 'rb')
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, 1 << 16)
+                if not chunk:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            f.close()
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def home(self, data, headers):
+        """Health check endpoint"""
+        return 200, home_payload(self.state)
+
+    async def liveness(self, data, headers):
+        """Liveness probe: the process is up and serving HTTP"""
+        return 200, {"status": "alive"}
+
+    async def readiness(self, data, headers):
+        """Readiness probe: 200 once the model is loaded and warmed up, 503 before"""
+        return (200 if self.state.ready else 503), self.state.snapshot()
+
+    async def stats(self, data, headers):
+        """Inference pipeline statistics endpoint"""
+        return 200, stats_payload(self.state.analyzer)
+
+    async def metrics(self, data, headers):
+        """Prometheus metrics endpoint"""
+        return 200, metrics_text(self.state, self.batcher, self.request_metrics)
+
+    async def analyze_portfolio(self, data, headers):
+        """Scores the distinct articles of many symbols in one batch on the inference executor"""
+        parsed = parse_analyze_portfolio(data)
+        scored = await self.run_model(score_analyze_portfolio, self.state.analyzer, parsed)
+        return 200, portfolio_response(parsed, scored)
+
+    async def symbol_sentiment(self, symbol, data, headers):
+        """Rolling sentiment of a symbol (GET /sentiment/<symbol>), read without running the model"""
+        return 200, symbol_payload(self.state.analyzer, symbol)
+
+    async def symbol_history(self, symbol, query, data, headers):
+        """Stored sentiment of a symbol over a time range (GET /history/<symbol>), read without running the model"""
+        # A long range scans many index entries, so keep it off the event loop
+        return 200, await asyncio.to_thread(history_payload, self.state.analyzer, symbol, parse_history_query(query))
+
+    async def analyze_single(self, data, headers):
+        """Scores one text; plain texts wait on the micro-batcher without holding a thread"""
+        parsed = parse_analyze(data, self.state.analyzer.tokenizer.vocab_size)
+        if uses_batcher(parsed):
+            sentiment = await asyncio.wrap_future(self.batcher.submit(parsed['text']))
+        else:
+            sentiment = await self.run_model(score_analyze, self.state.analyzer, parsed)
+        return 200, analyze_response(parsed, sentiment)
+
+    async def analyze_stock(self, data, headers):
+        """Scores the articles of one stock on the inference executor, or streams them as NDJSON"""
+        parsed = parse_analyze_stock(data, self.state.analyzer.tokenizer.vocab_size)
+        if wants_stream(data, headers.get('accept')):
+            return 200, StockStream(parsed)
+        stats = {}
+        sentiment_results = await self.run_model(score_analyze_stock, self.state.analyzer, parsed, stats)
+        return 200, stock_response(parsed, sentiment_results, stats.get('near_duplicates', 0))
+
+
+def create_asgi_app():
+    """Create the ASGI application, loading the analyzer as create_app does"""
+    state = create_model_state()
+    return AsgiApp(state, create_batcher(state), create_job_runner(state),
+                   inference_threads=int(os.environ.get('INFERENCE_THREADS', 1)),
+                   gzip_min_bytes=int(os.environ.get('SENTIMENT_GZIP_MIN_BYTES', GZIP_MIN_BYTES)))
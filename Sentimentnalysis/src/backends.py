@@ -0,0 +1,325 @@
+"""
+Inference backends for the FinBERT classifier
+
+Every backend is a callable that takes the padded model inputs built by
+StockSentimentAnalyzer (input_ids, attention_mask and token_type_ids tensors)
+and returns a float tensor of logits with one row per input.
+"""
+
+import contextlib
+import io
+import os
+import time
+
+import torch
+
+
+BACKENDS = ('torch', 'torchscript', 'onnx', 'pool')
+
+# Numeric precision modes for the torch-based backends
+PRECISIONS = ('fp32', 'int8', 'bf16')
+
+# Input names shared by the traced and exported graphs
+INPUT_NAMES = ('input_ids', 'attention_mask', 'token_type_ids')
+
+# Financial headlines used to compare backends and precision modes against fp32 eager torch
+REFERENCE_TEXTS = [
+    "Apple reports record quarterly revenue and raises its dividend.",
+    "Shares of the bank plunged after it disclosed a multibillion-dollar loss.",
+    "The company will hold its annual shareholder meeting in May.",
+    "Analysts downgraded the stock citing weakening demand in China.",
+    "Net sales increased 12% year over year, beating consensus estimates.",
+    "The Federal Reserve left interest rates unchanged on Wednesday.",
+    "The retailer warned that margins will shrink due to rising freight costs.",
+    "Operating profit rose to EUR 13.1 mn from EUR 8.7 mn in the corresponding period.",
+    "The firm announced layoffs affecting roughly 10% of its workforce.",
+    "The board approved a new share buyback program worth $5 billion.",
+    "Trading volume was in line with the 30-day average.",
+    "Regulators opened an investigation into the company's accounting practices.",
+    "The merger is expected to close in the second half of the year, pending approvals.",
+    "Revenue guidance for the full year was cut for the second time.",
+    "The chipmaker's new plant will create about 3,000 jobs.",
+    "Oil prices were little changed as traders awaited the OPEC decision.",
+]
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wraps a Hugging Face classifier so tracing and export see plain tensors in and out."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                          token_type_ids=token_type_ids, return_dict=False)[0]
+
+
+def _example_inputs(batch_size=2, seq_len=16):
+    """Builds dummy inputs for tracing and export."""
+    input_ids = torch.ones((batch_size, seq_len), dtype=torch.long)
+    return input_ids, torch.ones_like(input_ids), torch.zeros_like(input_ids)
+
+
+def bf16_supported():
+    """Returns True if this CPU has native bfloat16 support for oneDNN kernels."""
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def apply_precision(model, precision):
+    """
+    Prepares a model for the requested precision.
+
+    'int8' replaces the Linear layers in place with dynamically quantized ones, so the
+    fp32 weights are released. 'bf16' leaves the weights alone and is applied as
+    autocast at call time; on CPUs without bfloat16 support it falls back to fp32.
+
+    Returns:
+        tuple: The model and the precision that will actually be used.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(PRECISIONS)}")
+    if precision == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif precision == 'bf16' and not bf16_supported():
+        print("bfloat16 is not supported on this CPU, using fp32")
+        precision = 'fp32'
+    return model, precision
+
+
+def _autocast(precision):
+    """Returns the autocast context for a precision mode."""
+    if precision == 'bf16':
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+class TorchBackend:
+    """
+    Runs the eager PyTorch model.
+    """
+    name = 'torch'
+
+    def __init__(self, model, precision='fp32'):
+        self.model, self.precision = apply_precision(model, precision)
+
+    def __call__(self, inputs):
+        with torch.no_grad(), _autocast(self.precision):
+            return self.model(**inputs).logits
+
+
+class TorchScriptBackend:
+    """
+    Runs a traced TorchScript graph of the model.
+    """
+    name = 'torchscript'
+
+    def __init__(self, module, precision='fp32'):
+        self.module = module
+        self.precision = precision
+
+    @classmethod
+    def from_model(cls, model, path=None, precision='fp32'):
+        """Traces the model at the given precision, optionally saving the graph to path."""
+        model, precision = apply_precision(model, precision)
+        with torch.no_grad(), _autocast(precision):
+            traced = torch.jit.trace(_LogitsOnly(model).eval(), _example_inputs(), strict=False)
+        traced = torch.jit.freeze(traced)
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            torch.jit.save(traced, path)
+        return cls(traced, precision)
+
+    @classmethod
+    def load(cls, path, precision='fp32'):
+        """Loads a graph previously saved by from_model or export_torchscript."""
+        if precision == 'bf16' and not bf16_supported():
+            precision = 'fp32'
+        return cls(torch.jit.load(path, map_location='cpu'), precision)
+
+    def __call__(self, inputs):
+        with torch.no_grad(), _autocast(self.precision):
+            return self.module(*(inputs[name] for name in INPUT_NAMES))
+
+
+class OnnxBackend:
+    """
+    Runs an exported ONNX graph with onnxruntime on CPU.
+    """
+    name = 'onnx'
+    precision = 'fp32'
+
+    def __init__(self, path, num_threads=None):
+        """
+        Args:
+            path (str): Location of the .onnx file written by export_onnx.
+            num_threads (int, optional): Intra-op threads; defaults to torch's setting.
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx backend requires onnxruntime (pip install onnxruntime)") from e
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, inputs):
+        feed = {name: inputs[name].numpy() for name in INPUT_NAMES}
+        (logits,) = self.session.run(['logits'], feed)
+        return torch.from_numpy(logits)
+
+
+def export_onnx(model, path, opset_version=14):
+    """
+    Exports the classifier to an ONNX graph with dynamic batch and sequence axes.
+
+    Args:
+        model: A BertForSequenceClassification model.
+        path (str): Where to write the .onnx file.
+        opset_version (int): ONNX opset to target.
+
+    Returns:
+        str: The path written.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in INPUT_NAMES}
+    dynamic_axes['logits'] = {0: 'batch'}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model).eval(), _example_inputs(), path,
+            input_names=list(INPUT_NAMES), output_names=['logits'],
+            dynamic_axes=dynamic_axes, opset_version=opset_version
+        )
+    return path
+
+
+def export_torchscript(model, path, precision='fp32'):
+    """Traces the classifier and saves the TorchScript graph to path."""
+    TorchScriptBackend.from_model(model, path, precision)
+    return path
+
+
+def create_backend(name, model=None, path=None, num_threads=None, precision='fp32', model_name=None, workers=None):
+    """
+    Builds the named backend.
+
+    Args:
+        name (str): One of BACKENDS.
+        model: The eager model; needed unless a saved graph exists at path, or for the pool.
+        path (str, optional): Saved TorchScript or ONNX graph. It is created from the
+            model when missing.
+        num_threads (int, optional): Intra-op threads for onnxruntime, or per pool worker.
+        precision (str): One of PRECISIONS; the onnx backend only supports 'fp32'.
+        model_name (str, optional): Where the pool's worker processes load the model from.
+        workers (int, optional): Number of pool processes; defaults to one per core divided by WEB_CONCURRENCY.
+
+    Returns:
+        callable: The backend.
+    """
+    if name == 'torch':
+        return TorchBackend(model, precision)
+    if name == 'torchscript':
+        if path and os.path.exists(path):
+            return TorchScriptBackend.load(path, precision)
+        return TorchScriptBackend.from_model(model, path, precision)
+    if name == 'onnx':
+        if precision != 'fp32':
+            raise ValueError("The onnx backend only supports fp32 precision")
+        if not path:
+            raise ValueError("The onnx backend needs a path for the exported graph")
+        if not os.path.exists(path):
+            export_onnx(model, path)
+        return OnnxBackend(path, num_threads=num_threads)
+    if name == 'pool':
+        from .pool import PoolBackend
+
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {', '.join(PRECISIONS)}")
+        if not model_name:
+            raise ValueError("The pool backend needs the model name to load in its workers")
+        return PoolBackend(model_name, workers=workers, threads_per_worker=num_threads, precision=precision)
+    raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+
+
+def compare_outputs(reference, candidate):
+    """
+    Compares two probability tensors row by row.
+
+    Returns:
+        dict: The largest and mean absolute difference, and the share of rows whose
+        predicted label agrees.
+    """
+    diff = (reference - candidate).abs()
+    return {
+        'max_abs_diff': diff.max().item(),
+        'mean_abs_diff': diff.mean().item(),
+        'label_agreement': (reference.argmax(dim=1) == candidate.argmax(dim=1)).float().mean().item()
+    }
+
+
+def parity_report(analyzer, backends, texts=REFERENCE_TEXTS):
+    """
+    Checks that other backends reproduce the analyzer's own backend on the same inputs.
+
+    Args:
+        analyzer (StockSentimentAnalyzer): Provides the tokenizer and the reference backend.
+        backends (dict): Candidate backends keyed by name.
+        texts (list): Texts to score.
+
+    Returns:
+        dict: compare_outputs results keyed by backend name.
+    """
+    inputs = analyzer.prepare_inputs(texts)
+    reference = torch.softmax(analyzer.backend(inputs).float(), dim=1)
+    return {
+        name: compare_outputs(reference, torch.softmax(backend(inputs).float(), dim=1))
+        for name, backend in backends.items()
+    }
+
+
+def model_size_mb(model):
+    """Returns the serialized size of a model's weights in megabytes."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def drift_report(make_analyzer, precisions=PRECISIONS, texts=REFERENCE_TEXTS, repeats=3):
+    """
+    Measures how far each precision mode drifts from fp32, and what it costs.
+
+    Args:
+        make_analyzer (callable): Builds a StockSentimentAnalyzer for a precision mode.
+        precisions (iterable): Modes to compare; fp32 is always the reference.
+        texts (list): Texts to score.
+        repeats (int): Timed passes over texts per mode, after one warm-up pass.
+
+    Returns:
+        dict: For each mode, compare_outputs against fp32 plus the mean seconds per
+        pass and the model size in megabytes.
+    """
+    report = {}
+    reference = None
+    for precision in ['fp32'] + [p for p in precisions if p != 'fp32']:
+        analyzer = make_analyzer(precision)
+        inputs = analyzer.prepare_inputs(texts)
+        analyzer.backend(inputs)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            logits = analyzer.backend(inputs)
+        elapsed = (time.perf_counter() - start) / repeats
+        probabilities = torch.softmax(logits.float(), dim=1)
+        if reference is None:
+            reference = probabilities
+        report[precision] = dict(
+            compare_outputs(reference, probabilities),
+            effective_precision=analyzer.backend.precision,
+            seconds_per_pass=elapsed,
+            model_size_mb=model_size_mb(analyzer.model) if analyzer.model is not None else None
+        )
+    return report
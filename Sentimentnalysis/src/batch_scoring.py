@@ -0,0 +1,254 @@
+"""
+Offline batch scoring of CSV, JSONL and Parquet files
+
+Records are read in chunks, scored with StockSentimentAnalyzer.analyze_batch and
+written out before the next chunk is read, so memory stays flat however large the
+input is. With several processes each one loads its own analyzer and at most two
+chunks per process are in flight; results are still written in input order.
+
+Every output record carries the input fields (without the text unless asked to keep
+it) plus 'positive', 'negative', 'neutral' and 'dominant_sentiment', or 'error' if
+the record has no usable text.
+
+Parquet support requires pyarrow (pip install pyarrow).
+"""
+
+import collections
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .sentiment_analyzer import LABELS, StockSentimentAnalyzer
+
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+SCORE_FIELDS = list(LABELS) + ['dominant_sentiment', 'error']
+
+
+def detect_format(path):
+    """Returns the file format implied by a path's extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('json', 'ndjson'):
+        extension = 'jsonl'
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the format of {path}; use one of {', '.join(FORMATS)}")
+    return extension
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet files require pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def read_chunks(path, fmt, chunk_size):
+    """
+    Streams the records of a file in chunks.
+
+    Yields:
+        list: Up to chunk_size records, each a dict (a bare JSONL string becomes {'text': ...}).
+    """
+    if fmt == 'parquet':
+        pyarrow = _import_pyarrow()
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+        if fmt == 'csv':
+            records = csv.DictReader(f)
+        else:
+            records = (_parse_jsonl(line) for line in f if line.strip())
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _parse_jsonl(line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {'error': "Line is not valid JSON"}
+    if isinstance(record, str):
+        return {'text': record}
+    if not isinstance(record, dict):
+        return {'error': "Each line must be a string or an object"}
+    return record
+
+
+class RecordWriter:
+    """
+    Writes scored records incrementally as CSV, JSONL or Parquet.
+
+    The CSV columns and the types of the Parquet input columns are fixed by the first
+    chunk written; the score columns always have the same types.
+    """
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self._file = None
+        self._writer = None
+
+    def write(self, rows):
+        if self.fmt == 'jsonl':
+            if self._file is None:
+                self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write(''.join(json.dumps(row) + '\n' for row in rows))
+        elif self.fmt == 'csv':
+            if self._writer is None:
+                self._file = open(self.path, 'w', newline='', encoding='utf-8')
+                fields = list(dict.fromkeys(key for row in rows for key in row if key not in SCORE_FIELDS))
+                self._writer = csv.DictWriter(self._file, fieldnames=fields + SCORE_FIELDS, extrasaction='ignore')
+                self._writer.writeheader()
+            self._writer.writerows(rows)
+        else:
+            pyarrow = _import_pyarrow()
+            if self._writer is None:
+                self._writer = pyarrow.parquet.ParquetWriter(self.path, self._parquet_schema(pyarrow, rows))
+            self._writer.write_table(pyarrow.Table.from_pylist(rows, schema=self._writer.schema))
+
+    @staticmethod
+    def _parquet_schema(pyarrow, rows):
+        """Infers the input columns from the first chunk and appends the score columns."""
+        inferred = pyarrow.Table.from_pylist([
+            {key: value for key, value in row.items() if key not in SCORE_FIELDS} for row in rows
+        ]).schema
+        # A column that is empty throughout the first chunk has no type to infer
+        fields = [pyarrow.field(field.name, pyarrow.string()) if pyarrow.types.is_null(field.type) else field
+                  for field in inferred]
+        fields += [pyarrow.field(label, pyarrow.float64()) for label in LABELS]
+        fields += [pyarrow.field('dominant_sentiment', pyarrow.string()), pyarrow.field('error', pyarrow.string())]
+        return pyarrow.schema(fields)
+
+    def close(self):
+        if self.fmt == 'parquet' and self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def score_chunk(analyzer, records, text_column='text', keep_text=False):
+    """
+    Scores one chunk of records.
+
+    Returns:
+        list: One output record per input record, in order.
+    """
+    texts = [record.get(text_column) for record in records]
+    valid = [text for text in texts if isinstance(text, str) and text]
+    scores = iter(analyzer.analyze_batch(valid) if valid else [])
+    rows = []
+    for record, text in zip(records, texts):
+        row = {key: value for key, value in record.items() if keep_text or key != text_column}
+        if isinstance(text, str) and text:
+            sentiment = next(scores)
+            row.update(sentiment)
+            row['dominant_sentiment'] = max(sentiment, key=sentiment.get)
+        elif 'error' not in row:
+            row['error'] = f"Missing or empty '{text_column}' field"
+        rows.append(row)
+    return rows
+
+
+# Per-process state of the worker pool
+_worker = {}
+
+
+def _init_worker(analyzer_kwargs, threads, text_column, keep_text):
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    _worker.update(analyzer=StockSentimentAnalyzer(**analyzer_kwargs), text_column=text_column, keep_text=keep_text)
+
+
+def _score_in_worker(records):
+    return score_chunk(_worker['analyzer'], records, _worker['text_column'], _worker['keep_text'])
+
+
+class _Progress:
+    """Prints the number of scored records and the throughput every few seconds."""
+    def __init__(self, interval=5.0, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.count = 0
+        self.started = self._last = time.monotonic()
+
+    def update(self, count):
+        self.count += count
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        print(f"Scored {self.count} records in {elapsed:.1f}s ({self.count / elapsed:.1f} records/s)",
+              file=self.stream, flush=True)
+
+
+def score_file(input_path, output_path, analyzer_kwargs=None, chunk_size=1024, threads=None, processes=1,
+               text_column='text', keep_text=False, input_format=None, output_format=None, progress_interval=5.0):
+    """
+    Scores every record of a file and writes the results to another file.
+
+    Args:
+        input_path (str): CSV, JSONL or Parquet file to read.
+        output_path (str): CSV, JSONL or Parquet file to write.
+        analyzer_kwargs (dict, optional): Arguments for StockSentimentAnalyzer.
+        chunk_size (int): Records read, scored and written at a time.
+        threads (int, optional): Intra-op torch threads per process.
+        processes (int): Scoring processes; 1 scores in the calling process.
+        text_column (str): Field holding the text to score.
+        keep_text (bool): Copy the text to the output records.
+        input_format (str, optional): One of FORMATS; detected from the extension by default.
+        output_format (str, optional): One of FORMATS; detected from the extension by default.
+        progress_interval (float): Seconds between progress lines on stderr.
+
+    Returns:
+        dict: The number of records scored, the elapsed seconds and the throughput.
+    """
+    analyzer_kwargs = analyzer_kwargs or {}
+    chunks = read_chunks(input_path, input_format or detect_format(input_path), chunk_size)
+    writer = RecordWriter(output_path, output_format or detect_format(output_path))
+    progress = _Progress(progress_interval)
+    try:
+        if processes <= 1:
+            _init_worker(analyzer_kwargs, threads, text_column, keep_text)
+            for records in chunks:
+                rows = _score_in_worker(records)
+                writer.write(rows)
+                progress.update(len(rows))
+        else:
+            # Each worker loads its own model; spawn avoids forking a process with live torch threads
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(processes, _init_worker, (analyzer_kwargs, threads, text_column, keep_text)) as pool:
+                in_flight = collections.deque()
+                for records in chunks:
+                    in_flight.append(pool.apply_async(_score_in_worker, (records,)))
+                    if len(in_flight) >= 2 * processes:
+                        rows = in_flight.popleft().get()
+                        writer.write(rows)
+                        progress.update(len(rows))
+                while in_flight:
+                    rows = in_flight.popleft().get()
+                    writer.write(rows)
+                    progress.update(len(rows))
+    finally:
+        writer.close()
+        _worker.clear()
+    progress.report()
+    elapsed = time.monotonic() - progress.started
+    return {'records': progress.count, 'seconds': elapsed, 'records_per_second': progress.count / max(elapsed, 1e-9)}
@@ -0,0 +1,92 @@
+"""
+Dynamic micro-batching for concurrent single-text requests
+"""
+
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
+
+
+class MicroBatcher:
+    """
+    Gathers texts submitted from many request threads into shared forward passes.
+
+    A single worker thread owns the model: it waits for the first pending text, keeps
+    collecting until either max_batch_size texts are queued or max_wait_ms has passed,
+    scores the whole batch in one call and hands each caller its own row.
+    """
+    def __init__(self, score_fn, max_batch_size=32, max_wait_ms=5):
+        """
+        Args:
+            score_fn (callable): Scores a list of texts and returns one result per text, in order.
+            max_batch_size (int): Upper bound on the number of texts scored together.
+            max_wait_ms (float): How long the first text in a batch may wait for company.
+        """
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def _ensure_worker(self):
+        """Starts the worker thread, again after a fork since threads do not survive it."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive() or self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, args=(self._queue,),
+                                                name="micro-batcher", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, text):
+        """
+        Queues a text for scoring.
+
+        Returns:
+            Future: Resolves to the score_fn result for this text.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def analyze(self, text, timeout=None):
+        """Scores a text through the shared batch and blocks until its result is ready."""
+        return self.submit(text).result(timeout=timeout)
+
+    def queue_depth(self):
+        """Returns the number of texts waiting for the next batch."""
+        return self._queue.qsize()
+
+    def _collect(self, pending):
+        """Blocks for the first text, then gathers more until the batch is full or the wait expires."""
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = [(text, future) for text, future in self._collect(pending)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.score_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
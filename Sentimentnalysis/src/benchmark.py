@@ -0,0 +1,307 @@
+"""
+Reproducible, offline inference benchmarks
+
+The unit tests mock the model away, so they say nothing about speed. This module
+times the real pipeline (tokenization, collation, forward pass, post-processing)
+through analyze_sentiment and get_stock_sentiment, across backends, thread counts,
+sequence lengths and batch sizes, and writes the results as JSON so two commits
+can be compared with compare_results.
+
+It never touches the network: it runs against a local model or bundle, or against
+a stand-in built by build_stand_in_model, a randomly initialized BERT with
+FinBERT's exact shape. The stand-in's scores are meaningless but it does the same
+work per token as FinBERT, and a fixed seed makes its weights and the generated
+texts identical on every machine.
+"""
+
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+
+import torch
+import transformers
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+from .backends import REFERENCE_TEXTS
+from .bundle import MANIFEST_FILE, WEIGHTS_FILE, build_bundle, is_bundle
+from .metrics import percentile
+from .sentiment_analyzer import LABELS, StockSentimentAnalyzer
+
+
+# ProsusAI/finbert: bert-base-uncased with a three-label classification head
+FINBERT_SHAPE = {
+    'vocab_size': 30522,
+    'hidden_size': 768,
+    'num_hidden_layers': 12,
+    'num_attention_heads': 12,
+    'intermediate_size': 3072,
+    'max_position_embeddings': 512,
+    'type_vocab_size': 2,
+}
+
+# Where main.py bench keeps the stand-in between runs
+DEFAULT_STAND_IN = os.path.join(tempfile.gettempdir(), 'finbert-stand-in')
+
+# Backends the suite can time; the pool has its own scaling report (see pool.py)
+BENCHMARK_BACKENDS = ('torch', 'torchscript', 'onnx')
+
+# Metrics where a larger value is better; for the others (latencies) smaller is better
+HIGHER_IS_BETTER = ('texts_per_second',)
+
+# Fields that identify a benchmark case across runs
+CASE_KEYS = ('benchmark', 'backend', 'precision', 'threads', 'sequence_length', 'batch_size')
+
+
+def _stand_in_vocab(size):
+    """Builds a WordPiece vocabulary that can spell any lowercase ASCII text."""
+    specials = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+    characters = [chr(c) for c in range(33, 127) if not chr(c).isupper()]
+    words = sorted({word for text in REFERENCE_TEXTS for word in re.findall(r'[a-z0-9]+', text.lower())})
+    vocab = list(dict.fromkeys(specials + characters + ['##' + c for c in characters] + words))
+    vocab += [f'[unused{i}]' for i in range(size - len(vocab))]
+    return vocab[:size]
+
+
+def build_stand_in_model(output_dir, seed=0, **config_overrides):
+    """
+    Writes a bundle of a randomly initialized BERT classifier with FinBERT's shape.
+
+    Args:
+        output_dir (str): Directory of the bundle to write.
+        seed (int): Seed of the weight initialization.
+        **config_overrides: BertConfig fields to change, e.g. a smaller shape for tests.
+
+    Returns:
+        dict: The bundle manifest.
+    """
+    shape = dict(FINBERT_SHAPE, **config_overrides)
+    with tempfile.TemporaryDirectory() as source:
+        vocab_path = os.path.join(source, 'vocab.txt')
+        with open(vocab_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(_stand_in_vocab(shape['vocab_size'])) + '\n')
+        BertTokenizerFast(vocab_file=vocab_path, do_lower_case=True).save_pretrained(source)
+
+        config = BertConfig(num_labels=len(LABELS), id2label=dict(enumerate(LABELS)),
+                            label2id={label: i for i, label in enumerate(LABELS)}, **shape)
+        torch.manual_seed(seed)
+        BertForSequenceClassification(config).eval().save_pretrained(source)
+        return build_bundle(source, output_dir)
+
+
+def resolve_model(model=None, stand_in_dir=DEFAULT_STAND_IN):
+    """
+    Returns the model to benchmark: model if given, otherwise the stand-in, built on first use.
+    """
+    if model:
+        return model
+    if not is_bundle(stand_in_dir):
+        print(f"Building the FinBERT-shaped stand-in model in {stand_in_dir}")
+        build_stand_in_model(stand_in_dir)
+    return stand_in_dir
+
+
+def make_texts(tokenizer, count, sequence_length, seed=0):
+    """
+    Generates distinct financial-sounding texts of a given tokenized length.
+
+    Args:
+        tokenizer: The analyzer's tokenizer.
+        count (int): Number of texts.
+        sequence_length (int): Tokens per text including [CLS] and [SEP].
+        seed (int): Seed of the word choice.
+
+    Returns:
+        list: The texts.
+    """
+    rng = random.Random(f"{seed}-{sequence_length}")
+    words = [word for text in REFERENCE_TEXTS for word in text.split()]
+    lengths = {}
+    texts = []
+    for _ in range(count):
+        chosen, tokens = [], 2
+        while tokens < sequence_length:
+            word = rng.choice(words)
+            if word not in lengths:
+                lengths[word] = len(tokenizer.tokenize(word))
+            # Words that would overshoot are skipped; single-token words always fit eventually
+            if tokens + lengths[word] <= sequence_length:
+                chosen.append(word)
+                tokens += lengths[word]
+        texts.append(' '.join(chosen))
+    return texts
+
+
+def _summarize(latencies, texts_per_call):
+    """Returns throughput and latency percentiles, in milliseconds, of a list of call durations."""
+    ordered = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'calls': len(latencies),
+        'texts_per_second': len(latencies) * texts_per_call / total if total else 0.0,
+        'mean_ms': 1000.0 * total / len(latencies),
+        'p50_ms': 1000.0 * percentile(ordered, 50),
+        'p95_ms': 1000.0 * percentile(ordered, 95),
+        'p99_ms': 1000.0 * percentile(ordered, 99),
+    }
+
+
+def _time_calls(fn, inputs, repeats):
+    """Calls fn once per input (one untimed warm-up call first), repeats times over, and returns the durations."""
+    fn(inputs[0])
+    latencies = []
+    for _ in range(repeats):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def environment(model):
+    """Describes the machine, libraries, commit and model a run was measured with."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    weights = None
+    if is_bundle(model):
+        with open(os.path.join(model, MANIFEST_FILE)) as f:
+            weights = json.load(f)['files'][WEIGHTS_FILE]['sha256']
+    return {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python_version': platform.python_version(),
+        'torch_version': torch.__version__,
+        'transformers_version': transformers.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'model': model,
+        'model_weights_sha256': weights,
+    }
+
+
+def run_benchmarks(model, backends=('torch',), threads=(1,), sequence_lengths=(16, 64, 128, 512),
+                   batch_sizes=(1, 8, 32), precision='fp32', single_calls=32, articles=32, repeats=3,
+                   work_dir=None, seed=0, progress=print):
+    """
+    Times analyze_sentiment and get_stock_sentiment over a grid of cases.
+
+    Result and token caches are disabled so every call runs the whole pipeline.
+
+    Args:
+        model (str): Model name, local directory or bundle (see resolve_model).
+        backends (iterable): Backends from BENCHMARK_BACKENDS.
+        threads (iterable): Torch intra-op thread counts (onnxruntime follows them).
+        sequence_lengths (iterable): Tokens per text.
+        batch_sizes (iterable): Forward-pass batch sizes for get_stock_sentiment.
+        precision (str): Precision mode of the backends.
+        single_calls (int): Distinct texts sent one at a time to analyze_sentiment per pass.
+        articles (int): Articles per get_stock_sentiment call.
+        repeats (int): Timed passes per case.
+        work_dir (str, optional): Where exported graphs are kept; a temporary directory by default.
+        seed (int): Seed of the generated texts.
+        progress (callable, optional): Receives a line per finished case.
+
+    Returns:
+        dict: 'environment', 'config' and 'results', one entry per case.
+    """
+    config = {
+        'backends': list(backends), 'threads': list(threads), 'sequence_lengths': list(sequence_lengths),
+        'batch_sizes': list(batch_sizes), 'precision': precision, 'single_calls': single_calls,
+        'articles': articles, 'repeats': repeats, 'seed': seed,
+    }
+    results = []
+    previous_threads = torch.get_num_threads()
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = work_dir or tmp
+        try:
+            for backend in backends:
+                if backend not in BENCHMARK_BACKENDS:
+                    raise ValueError(f"backend must be one of {', '.join(BENCHMARK_BACKENDS)}")
+                for thread_count in threads:
+                    torch.set_num_threads(thread_count)
+                    backend_path = (os.path.join(work_dir, f"{backend}-{precision}.{'onnx' if backend == 'onnx' else 'pt'}")
+                                    if backend != 'torch' else None)
+                    analyzer = StockSentimentAnalyzer(model_name=model, backend=backend, backend_path=backend_path,
+                                                      precision=precision, cache_size=0, token_cache_size=0)
+                    # Warm up like ModelState does in the server, then once more per case
+                    analyzer.warmup(lengths=sequence_lengths, batch_sizes=sorted({1, *batch_sizes}))
+                    case = {'backend': backend, 'precision': analyzer.backend.precision, 'threads': thread_count}
+                    for length in sequence_lengths:
+                        texts = make_texts(analyzer.tokenizer, max(single_calls, articles), length, seed)
+                        tokens = sum(len(ids) for ids in analyzer._encode(texts)) / len(texts)
+
+                        latencies = _time_calls(analyzer.analyze_sentiment, texts[:single_calls], repeats)
+                        results.append(dict(case, benchmark='analyze_sentiment', sequence_length=length,
+                                            batch_size=1, mean_tokens=tokens, **_summarize(latencies, 1)))
+
+                        for batch_size in batch_sizes:
+                            analyzer.batch_size = batch_size
+                            latencies = _time_calls(lambda news: analyzer.get_stock_sentiment('BENCH', news),
+                                                    [texts[:articles]], repeats)
+                            results.append(dict(case, benchmark='get_stock_sentiment', sequence_length=length,
+                                                batch_size=batch_size, mean_tokens=tokens,
+                                                **_summarize(latencies, articles)))
+                        if progress is not None:
+                            progress(f"{backend} {case['precision']} threads={thread_count} length={length}: "
+                                     f"{results[-1]['texts_per_second']:.1f} texts/s")
+        finally:
+            torch.set_num_threads(previous_threads)
+    return {'environment': environment(model), 'config': config, 'results': results}
+
+
+def save_results(report, path):
+    """Writes a run_benchmarks report as JSON."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare_results(baseline, current, tolerance=0.1, metrics=('texts_per_second', 'p50_ms', 'p95_ms')):
+    """
+    Compares two run_benchmarks reports case by case.
+
+    Args:
+        baseline (dict): The reference report, e.g. from the previous commit.
+        current (dict): The report to check.
+        tolerance (float): Relative change beyond which a metric counts as regressed or improved.
+        metrics (iterable): Result fields to compare.
+
+    Returns:
+        dict: 'regressions' and 'improvements' (one entry per case and metric, with the
+        relative change), the number of cases compared, and warnings about differences
+        between the two environments that make the comparison less meaningful.
+    """
+    def key(result):
+        return tuple(result.get(name) for name in CASE_KEYS)
+
+    reference = {key(result): result for result in baseline['results']}
+    regressions, improvements, compared = [], [], 0
+    for result in current['results']:
+        before = reference.get(key(result))
+        if before is None:
+            continue
+        compared += 1
+        for metric in metrics:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            better = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+            if abs(change) > tolerance:
+                entry = dict({name: result.get(name) for name in CASE_KEYS},
+                             metric=metric, baseline=old, current=new, change=round(change, 4))
+                (improvements if better else regressions).append(entry)
+
+    warnings = [f"{name} differs: {baseline['environment'].get(name)} vs {current['environment'].get(name)}"
+                for name in ('model_weights_sha256', 'cpu_count', 'processor', 'torch_version')
+                if baseline['environment'].get(name) != current['environment'].get(name)]
+    return {'compared': compared, 'regressions': regressions, 'improvements': improvements, 'warnings': warnings}
@@ -0,0 +1,137 @@
+"""
+Self-contained local model bundles for fast, network-free startup
+
+A bundle is a directory holding everything StockSentimentAnalyzer needs:
+
+    bundle.json         Manifest: source model, library versions, file sizes and hashes
+    config.json         The model configuration
+    tokenizer.json      The fast tokenizer, already converted (plus vocab.txt for the slow one)
+    weights.safetensors Every parameter and buffer, contiguous fp32, keyed by module path
+
+Loading builds the model on the meta device (no memory, no random initialization)
+and assigns tensors memory-mapped straight from weights.safetensors. The weights
+stay file-backed pages, shared through the page cache by every process that maps
+the same bundle, and nothing is resolved against the Hugging Face hub.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import torch
+import transformers
+from safetensors import safe_open
+from safetensors.torch import save_file
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+
+MANIFEST_FILE = 'bundle.json'
+WEIGHTS_FILE = 'weights.safetensors'
+BUNDLE_FORMAT = 1
+
+
+def _sha256(path, chunk_size=2 ** 20):
+    """Returns the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_bundle(path):
+    """Returns True if path is a directory written by build_bundle."""
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def build_bundle(model_name, output_dir):
+    """
+    Writes a self-contained bundle of a FinBERT-style model.
+
+    Args:
+        model_name (str): Hub name or local directory of the source model.
+        output_dir (str): Directory to write the bundle to; created if missing.
+
+    Returns:
+        dict: The manifest written to bundle.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = BertTokenizerFast.from_pretrained(model_name)
+    model = BertForSequenceClassification.from_pretrained(model_name).eval()
+
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    # Non-persistent buffers (position ids) are included so nothing is left on the meta device
+    tensors = {name: buffer for name, buffer in model.named_buffers()}
+    tensors.update(model.state_dict())
+    save_file({name: tensor.detach().float().contiguous() if tensor.is_floating_point() else tensor.contiguous()
+               for name, tensor in tensors.items()},
+              os.path.join(output_dir, WEIGHTS_FILE))
+
+    files = sorted(name for name in os.listdir(output_dir) if name != MANIFEST_FILE)
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'source': model_name,
+        'model_class': type(model).__name__,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'torch_version': torch.__version__,
+        'transformers_version': transformers.__version__,
+        'files': {
+            name: {'bytes': os.path.getsize(os.path.join(output_dir, name)),
+                   'sha256': _sha256(os.path.join(output_dir, name))}
+            for name in files
+        }
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify_bundle(path):
+    """
+    Checks the bundle's files against the sizes and hashes in its manifest.
+
+    Returns:
+        list: Names of missing or modified files; empty if the bundle is intact.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    problems = []
+    for name, expected in manifest['files'].items():
+        file_path = os.path.join(path, name)
+        if (not os.path.isfile(file_path) or os.path.getsize(file_path) != expected['bytes']
+                or _sha256(file_path) != expected['sha256']):
+            problems.append(name)
+    return problems
+
+
+def load_bundle_model(path):
+    """
+    Loads the classifier from a bundle with memory-mapped weights.
+
+    Args:
+        path (str): A directory written by build_bundle.
+
+    Returns:
+        BertForSequenceClassification: The model in evaluation mode.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')} in {path}")
+
+    config = BertConfig.from_pretrained(path)
+    with torch.device('meta'):
+        model = BertForSequenceClassification(config)
+
+    with safe_open(os.path.join(path, WEIGHTS_FILE), framework='pt') as f:
+        tensors = {name: f.get_tensor(name) for name in f.keys()}
+    persistent = set(model.state_dict())
+    model.load_state_dict({name: tensor for name, tensor in tensors.items() if name in persistent},
+                          strict=True, assign=True)
+    for name, tensor in tensors.items():
+        if name not in persistent:
+            module_name, _, buffer_name = name.rpartition('.')
+            model.get_submodule(module_name)._buffers[buffer_name] = tensor
+    return model.eval()
@@ -0,0 +1,211 @@
+"""
+Caching of sentiment results, in memory and on local disk
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# SQLite's default limit on bound parameters per statement
+_SQLITE_MAX_PARAMS = 999
+
+# Number of rows written between eviction passes on the disk store
+_EVICTION_INTERVAL = 1000
+
+
+def normalize_text(text):
+    """Collapses runs of whitespace, which the tokenizer ignores anyway."""
+    return ' '.join(text.split())
+
+
+def make_cache_key(text, model_name, max_length, variant=''):
+    """
+    Builds the cache key for a text scored by a given model configuration.
+
+    Args:
+        text (str): The text being scored.
+        model_name (str): The model that produces the scores.
+        max_length (int): The truncation length used when tokenizing.
+        variant (str): Distinguishes other scoring modes, such as windowed long documents.
+
+    Returns:
+        str: A hex digest identifying the (text, model, max_length, variant) combination.
+    """
+    payload = f"{model_name}\0{max_length}\0{variant}\0{normalize_text(text)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    A thread-safe LRU cache with an optional time-to-live per entry.
+    """
+    def __init__(self, max_entries=4096, ttl=None):
+        """
+        Args:
+            max_entries (int): Maximum number of results kept; the least recently used are evicted.
+            ttl (float, optional): Seconds after which an entry expires. None keeps entries until evicted.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Stores value under key, evicting the least recently used entries if full."""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+
+class DiskResultCache:
+    """
+    A result store in a local SQLite database shared by every worker process.
+
+    The database runs in WAL mode so readers never block the writer, and each
+    thread and process opens its own connection. When the store grows past
+    max_entries the oldest results are evicted.
+    """
+    def __init__(self, path, max_entries=1_000_000, timeout=30.0):
+        """
+        Args:
+            path (str): Location of the SQLite database file; parent directories are created.
+            max_entries (int): Maximum number of results kept on disk.
+            timeout (float): Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+
+    def _connect(self):
+        """Returns this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, keys):
+        """
+        Looks up several keys in one query.
+
+        Returns:
+            dict: The stored value for every key that was found.
+        """
+        found = {}
+        keys = list(keys)
+        try:
+            conn = self._connect()
+            for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                chunk = keys[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        except sqlite3.Error:
+            # A busy or damaged store only costs a recomputation
+            found = {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        """Stores a mapping of keys to JSON-serializable values, then evicts if over capacity."""
+        if not items or self.max_entries <= 0:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(value), now) for key, value in items.items()]
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)", rows)
+            self._writes += len(rows)
+            if self._writes >= min(_EVICTION_INTERVAL, self.max_entries):
+                self._writes = 0
+                self.evict()
+        except sqlite3.Error:
+            pass
+
+    def evict(self):
+        """Deletes the oldest results until the store is back under max_entries."""
+        with self._connect() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY created LIMIT ?)", (excess,)
+                )
+
+    def __len__(self):
+        (count,) = self._connect().execute("SELECT COUNT(*) FROM results").fetchone()
+        return count
+
+    def stats(self):
+        """Returns this process's hit/miss counters and the shared store size."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+            'max_entries': self.max_entries
+        }
@@ -0,0 +1,221 @@
+"""
+Near-duplicate detection of articles with SimHash fingerprints
+
+Syndicated stories come back lightly edited: another byline, a trailing
+disclaimer, different punctuation or case. The exact result cache misses them,
+so each copy would go through the model again. A 64-bit SimHash of a text's
+word 3-grams changes only a few bits under such edits, so two texts whose
+fingerprints differ in at most max_distance bits are treated as the same
+article and share its scores.
+
+Only content words are hashed: stopwords, the vocabulary of newswire bylines
+and disclaimers ("Reuters", "reporting by", "not investment advice") and words
+of fewer than three letters carry little of what an article says, and hashing
+them would let boilerplate move the fingerprint as much as the story does.
+
+Closeness alone cannot tell a new byline from a changed verdict: turning
+"raises its dividend" into "cuts its dividend" changes fewer shingles than a
+byline does. The fingerprint therefore also identifies the text's sentiment
+words (SENTIMENT_WORDS, such as "raises", "cuts", "record" or "weak") in its
+bits above the 64th; texts that use different ones never match, however close
+their SimHashes are.
+
+The expected distance is 64 * angle / pi, where cos(angle) is the cosine
+similarity of the two texts' shingle sets: the default of 10 bits matches
+texts about 88% similar. An edit therefore moves a short text further than a
+long one. On 85-word articles a byline, a trailing disclaimer or both move the
+fingerprint by 10 bits or less in 95% of cases; articles sharing half their
+sentences are typically 15 or more apart.
+
+NearDuplicateIndex keeps the fingerprints of recently scored texts. Each one is
+split into max_distance + 1 bands: two fingerprints within max_distance bits of
+each other agree exactly on at least one band, so a lookup only compares
+against the fingerprints with the same sentiment words filed under one of its
+own band values rather than the whole index.
+
+Texts with few words are never fingerprinted: in a headline one changed word is
+a large share of the text and may well flip its sentiment.
+"""
+
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+
+import numpy as np
+
+
+FINGERPRINT_BITS = 64
+
+# Words per shingle hashed into the fingerprint
+SHINGLE_WORDS = 3
+
+_WORD = re.compile(r'\w+')
+
+# Shorter words are not hashed, except numbers
+MIN_WORD_LENGTH = 3
+
+# Words that say little about what an article reports, including the vocabulary of newswire
+# bylines, credits and disclaimers; negations are kept
+STOPWORDS = frozenset("""
+    about above after again against all also and any are because been before being below between
+    both but can could did does doing during each few for from further had has have having her
+    here hers him his how into its itself just may might more most much must off once only other our
+    ours out over own said same says she should some such than that the their theirs them then there
+    these they this those through too under until upon very was were what when where which while who
+    whom why will with would you your yours
+    according advice afp agency article associated author bloomberg contributed contributing copyright
+    correspondent dow editing editor informational investment jones mentioned news newsroom newswire
+    position positions press purposes reported reporter reporting reserved reuters rights staff
+    stocks story writer writing
+""".split())
+
+# Words that carry the sentiment of a financial text. Two texts only match if they use the same
+# ones, so that a near-duplicate never differs in the words that decide its scores
+SENTIMENT_WORDS = frozenset("""
+    up down higher lower high low record strong stronger weak weaker weakness weakening robust solid
+    raise raises raised raising rise rises rose risen rising gain gains gained gaining jump jumps
+    jumped jumping soar soars soared soaring surge surges surged surging climb climbs climbed climbing
+    rally rallies rallied rallying beat beats beating exceed exceeds exceeded exceeding outperform
+    outperforms outperformed increase increases increased increasing grow grows grew growing growth
+    expand expands expanded expanding boost boosts boosted boosting improve improves improved
+    improving upgrade upgrades upgraded upgrading profit profits profitable bullish optimistic upbeat
+    cut cuts cutting fall falls fell fallen falling drop drops dropped dropping decline declines
+    declined declining plunge plunges plunged plunging slump slumps slumped slumping sink sinks sank
+    sinking tumble tumbles tumbled tumbling slide slides slid sliding lose loses lost losing loss
+    losses miss misses missed missing decrease decreases decreased decreasing shrink shrinks shrank
+    shrinking reduce reduces reduced reducing downgrade downgrades downgraded downgrading warn warns
+    warned warning slash slashes slashed slashing suspend suspends suspended bearish pessimistic
+    disappointing layoffs bankruptcy default defaults defaulted unchanged flat steady
+""".split())
+
+
+def hamming_distance(a, b):
+    """Returns the number of bits in which two fingerprints differ."""
+    return bin(a ^ b).count('1')
+
+
+def simhash(text, shingle_words=SHINGLE_WORDS, min_words=None):
+    """
+    Computes the 64-bit SimHash of a text's lowercased content word shingles.
+
+    Args:
+        text (str): The text to fingerprint; case, punctuation and spacing are ignored.
+        shingle_words (int): Words per shingle.
+        min_words (int, optional): Texts with fewer words get no fingerprint.
+
+    Returns:
+        int: The fingerprint, with a digest of the text's SENTIMENT_WORDS in the bits above
+        the 64th, or None if the text is too short.
+    """
+    words = _WORD.findall(text.lower())
+    if not words or (min_words and len(words) < min_words):
+        return None
+    sentiment = ' '.join(sorted(SENTIMENT_WORDS.intersection(words)))
+    words = [word for word in words
+             if word not in STOPWORDS and (len(word) >= MIN_WORD_LENGTH or word.isdigit())] or words
+    shingles = {' '.join(words[i:i + shingle_words]) for i in range(max(1, len(words) - shingle_words + 1))}
+    digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    # Every shingle votes on every bit; a bit is set where most shingles have it set
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(shingles), 8), axis=1)
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    fingerprint = int.from_bytes(np.packbits(majority).tobytes(), 'big')
+    return fingerprint | _digest(sentiment) << FINGERPRINT_BITS
+
+
+def _digest(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class NearDuplicateIndex:
+    """
+    A bounded, thread-safe index of recent fingerprints and the scores of their texts.
+    """
+    def __init__(self, max_distance=10, max_entries=100_000, min_words=20):
+        """
+        Args:
+            max_distance (int): Most differing fingerprint bits for two texts to count as
+                near-duplicates, from 0 (identical word shingles) to 15.
+            max_entries (int): Fingerprints kept; the least recently used are evicted.
+            min_words (int): Texts with fewer words are never matched.
+        """
+        if not 0 <= max_distance < 16:
+            raise ValueError("max_distance must be between 0 and 15 bits")
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.min_words = min_words
+        bands = max_distance + 1
+        edges = [FINGERPRINT_BITS * i // bands for i in range(bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def fingerprint(self, text):
+        """Returns the text's fingerprint, or None if it is too short to be matched."""
+        return simhash(text, min_words=self.min_words)
+
+    def _band_keys(self, namespace, fingerprint):
+        sentiment = fingerprint >> FINGERPRINT_BITS
+        return [(namespace, sentiment, band, (fingerprint >> shift) & mask)
+                for band, (shift, mask) in enumerate(self._bands)]
+
+    def find(self, fingerprint, namespace=''):
+        """
+        Looks up the closest indexed near-duplicate of a fingerprint.
+
+        Args:
+            fingerprint (int): The fingerprint of the text being scored.
+            namespace (str): Keeps values of different scoring modes apart.
+
+        Returns:
+            The value stored with the closest fingerprint within max_distance bits, or None.
+        """
+        with self._lock:
+            best = None
+            for key in self._band_keys(namespace, fingerprint):
+                for candidate in self._buckets.get(key, ()):
+                    distance = hamming_distance(fingerprint, candidate)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, candidate)
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end((namespace, best[1]))
+            return self._entries[(namespace, best[1])]
+
+    def add(self, fingerprint, value, namespace=''):
+        """Indexes a fingerprint with its value, evicting the least recently used entries if full."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            entry = (namespace, fingerprint)
+            if entry not in self._entries:
+                for key in self._band_keys(namespace, fingerprint):
+                    self._buckets.setdefault(key, set()).add(fingerprint)
+            self._entries[entry] = value
+            self._entries.move_to_end(entry)
+            while len(self._entries) > self.max_entries:
+                (old_namespace, old), _ = self._entries.popitem(last=False)
+                for key in self._band_keys(old_namespace, old):
+                    bucket = self._buckets[key]
+                    bucket.discard(old)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_distance': self.max_distance
+            }
@@ -0,0 +1,542 @@
+"""
+Request validation and response building shared by the Flask and ASGI apps
+
+Each endpoint is split into a parse step, which validates the JSON body and
+raises RequestError with the message and status to return, a score step,
+which runs the model and may block, and a response step, which builds the
+JSON payload. The apps only differ in how they run the score step.
+"""
+
+from datetime import datetime, timezone
+import json
+import math
+import time
+
+from .aggregates import MAX_SYMBOL_LENGTH, normalize_symbol
+from .cache import normalize_text
+from .metrics import PrometheusWriter
+from .sentiment_analyzer import AGGREGATIONS, LABELS
+
+
+# Content type of streamed /analyze-stock responses: one JSON document per line
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Content type of the /metrics response (Prometheus text exposition format)
+METRICS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Endpoints that can only answer once the model is loaded
+MODEL_ENDPOINTS = {'analyze_single', 'analyze_stock', 'analyze_portfolio', 'stats', 'symbol_sentiment',
+                   'symbol_history'}
+
+# Named downsampling intervals of /history/<symbol>, in seconds
+HISTORY_INTERVALS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '4h': 14400, '1d': 86400, '1w': 604800}
+
+# Most points one /history/<symbol> query may return
+MAX_HISTORY_POINTS = 10000
+
+ENDPOINTS = {
+    "/analyze": "POST - Analyze sentiment of a single text",
+    "/analyze-stock": "POST - Analyze sentiment for multiple news articles about a stock",
+    "/analyze-portfolio": "POST - Analyze the news of many symbols at once, scoring shared articles only once",
+    "/sentiment/<symbol>": "GET - Rolling 1h, 1d and 7d sentiment of a symbol from the articles analyzed so far",
+    "/history/<symbol>": "GET - Stored sentiment of a symbol downsampled over a time range (?start=&end=&interval=)",
+    "/stats": "GET - Per-stage timings and cache statistics",
+    "/metrics": "GET - Latency histograms, batch shapes, cache and queue gauges in Prometheus format",
+    "/health/live": "GET - Liveness probe",
+    "/health/ready": "GET - Readiness probe with model warm-up progress",
+    "/jobs": "POST - Submit a JSONL corpus for background scoring",
+    "/jobs/<job_id>": "GET - Job status, progress and throughput",
+    "/jobs/<job_id>/results": "GET - Download job results as JSONL"
+}
+
+
+class RequestError(Exception):
+    """A request that cannot be served, with the error message and HTTP status to answer with."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def payload(self):
+        return {"error": self.message}
+
+
+def is_token_ids(value, vocab_size=None):
+    """Checks that a request field is a non-empty list of integer token ids, below vocab_size if given."""
+    return (isinstance(value, list) and bool(value)
+            and all(isinstance(i, int) and not isinstance(i, bool) for i in value)
+            and (vocab_size is None or all(0 <= i < vocab_size for i in value)))
+
+
+def _token_ids_range(vocab_size):
+    return f" from 0 to {vocab_size - 1}" if vocab_size else ""
+
+
+_SYMBOL_ERROR = (f"must be up to {MAX_SYMBOL_LENGTH} letters, digits, '.', '-' or '=', "
+                "optionally after a leading '^'")
+
+
+def _parse_symbol(data):
+    symbol = data.get('symbol', 'UNKNOWN')
+    if normalize_symbol(symbol) is None:
+        raise RequestError(f"'symbol' {_SYMBOL_ERROR}")
+    return symbol
+
+
+def _parse_aggregation(data):
+    aggregation = data.get('aggregation', 'mean')
+    if aggregation not in AGGREGATIONS:
+        raise RequestError(f"'aggregation' must be one of: {', '.join(AGGREGATIONS)}")
+    return aggregation
+
+
+def not_loaded_payload(state):
+    """Returns the 503 body sent while the analyzer is loading."""
+    return {
+        "error": "The model is not loaded yet",
+        "model_status": state.status
+    }
+
+
+def home_payload(state):
+    """Returns the health check body."""
+    return {
+        "status": "active",
+        "model_status": state.status,
+        "message": "Stock Sentiment Analysis API is running",
+        "endpoints": ENDPOINTS
+    }
+
+
+def stats_payload(analyzer):
+    """Returns per-stage timings and cache statistics."""
+    return {
+        "stage_timings": analyzer.get_stage_timings(),
+        "cache": analyzer.cache.stats(),
+        "token_cache": analyzer.token_cache.stats(),
+        "disk_cache": analyzer.disk_cache.stats() if analyzer.disk_cache is not None else None,
+        "near_duplicates": analyzer.near_duplicates.stats() if analyzer.near_duplicates is not None else None
+    }
+
+
+def metrics_text(state, batcher, request_metrics):
+    """
+    Renders the Prometheus /metrics body.
+
+    Everything except the histograms, which are updated as requests are served, is
+    read here, so the instrumentation costs next to nothing between scrapes.
+
+    Args:
+        state (ModelState): Holds the analyzer; its metrics are omitted while it is loading.
+        batcher (MicroBatcher): Reports the number of texts waiting for a batch.
+        request_metrics (RequestMetrics): Request latencies and serialization times of the app.
+    """
+    writer = PrometheusWriter()
+    writer.gauge('sentiment_model_ready', "1 once the model is loaded and warmed up",
+                 [({}, 1 if state.ready else 0)])
+    writer.histogram('sentiment_request_seconds', "Time to answer a request, by endpoint",
+                     [({'endpoint': endpoint}, histogram)
+                      for endpoint, histogram in sorted(request_metrics.latency.histograms().items())])
+    writer.counter('sentiment_responses_total', "Responses sent, by endpoint and status",
+                   [({'endpoint': endpoint, 'status': status}, count)
+                    for (endpoint, status), count in sorted(request_metrics.responses().items())])
+    writer.histogram('sentiment_serialize_seconds', "Time to encode a JSON response body",
+                     [({}, request_metrics.serialize)])
+    writer.gauge('sentiment_batcher_queue_depth', "Texts waiting for the next micro-batch",
+                 [({}, batcher.queue_depth())])
+
+    analyzer = state.analyzer
+    if analyzer is not None:
+        writer.histogram('sentiment_stage_seconds', "Time per call of each inference stage",
+                         [({'stage': stage}, histogram)
+                          for stage, histogram in sorted(analyzer.timer.histograms().items())])
+        writer.histogram('sentiment_batch_size', "Texts per forward pass", [({}, analyzer.batch_sizes)])
+        writer.histogram('sentiment_sequence_length_tokens', "Tokens per scored text",
+                         [({}, analyzer.sequence_lengths)])
+        caches = [('result', analyzer.cache), ('token', analyzer.token_cache)]
+        if analyzer.disk_cache is not None:
+            caches.append(('disk', analyzer.disk_cache))
+        if analyzer.near_duplicates is not None:
+            caches.append(('near_duplicate', analyzer.near_duplicates))
+        stats = [(name, cache.stats()) for name, cache in caches]
+        writer.counter('sentiment_cache_hits_total', "Cache lookups that found a result",
+                       [({'cache': name}, s['hits']) for name, s in stats])
+        writer.counter('sentiment_cache_misses_total', "Cache lookups that found nothing",
+                       [({'cache': name}, s['misses']) for name, s in stats])
+        writer.gauge('sentiment_cache_hit_ratio', "Share of cache lookups that found a result",
+                     [({'cache': name}, s['hits'] / (s['hits'] + s['misses']) if s['hits'] + s['misses'] else 0.0)
+                      for name, s in stats])
+        writer.gauge('sentiment_cache_entries', "Results currently cached",
+                     [({'cache': name}, s['size']) for name, s in stats])
+    return writer.render()
+
+
+def parse_analyze(data, vocab_size=None):
+    """
+    Validates an /analyze body.
+
+    Args:
+        data (dict): The request body.
+        vocab_size (int, optional): The tokenizer's vocabulary size; token ids must be below it.
+
+    Returns:
+        dict: 'text' or 'input_ids', plus 'long_document', 'aggregation' and 'compact'.
+    """
+    if data and 'input_ids' in data and 'text' not in data:
+        if not is_token_ids(data['input_ids'], vocab_size):
+            raise RequestError(f"'input_ids' must be a non-empty list of integers{_token_ids_range(vocab_size)}")
+        return {'text': None, 'input_ids': data['input_ids'], 'long_document': False, 'aggregation': 'mean',
+                'compact': bool(data.get('compact'))}
+
+    if not data or 'text' not in data:
+        raise RequestError("Missing 'text' field in request body")
+    text = data['text']
+    if not text or not isinstance(text, str):
+        raise RequestError("'text' must be a non-empty string")
+    long_document = bool(data.get('long_document'))
+    aggregation = _parse_aggregation(data) if long_document else 'mean'
+    return {'text': text, 'input_ids': None, 'long_document': long_document, 'aggregation': aggregation,
+            'compact': bool(data.get('compact'))}
+
+
+def uses_batcher(parsed):
+    """Returns True if a parsed /analyze request is plain text scored through the micro-batcher."""
+    return parsed['input_ids'] is None and not parsed['long_document']
+
+
+def score_analyze(analyzer, parsed):
+    """Scores a parsed /analyze request that does not go through the micro-batcher."""
+    if parsed['input_ids'] is not None:
+        return analyzer.analyze_token_ids([parsed['input_ids']])[0]
+    return analyzer.analyze_long_documents([parsed['text']], aggregation=parsed['aggregation'])[0]
+
+
+def analyze_response(parsed, sentiment):
+    """Builds the /analyze response body; a compact one, or one for token ids, does not echo the text."""
+    dominant_sentiment = max(sentiment, key=sentiment.get)
+    response = {} if parsed['compact'] or parsed['input_ids'] is not None else {"text": parsed['text']}
+    response.update({
+        "sentiment_scores": sentiment,
+        "dominant_sentiment": dominant_sentiment,
+        "confidence": sentiment[dominant_sentiment]
+    })
+    return response
+
+
+def parse_analyze_stock(data, vocab_size=None):
+    """
+    Validates an /analyze-stock body.
+
+    Args:
+        data (dict): The request body.
+        vocab_size (int, optional): The tokenizer's vocabulary size; token ids must be below it.
+
+    Returns:
+        dict: 'symbol', 'news_articles' or 'news_token_ids', 'long_document', 'aggregation' and 'compact'.
+    """
+    if data and 'news_token_ids' in data and 'news_articles' not in data:
+        news_token_ids = data['news_token_ids']
+        if not isinstance(news_token_ids, list) or not news_token_ids:
+            raise RequestError("'news_token_ids' must be a non-empty list")
+        if not all(is_token_ids(ids, vocab_size) for ids in news_token_ids):
+            raise RequestError("Each entry of 'news_token_ids' must be a non-empty list of integers"
+                               + _token_ids_range(vocab_size))
+        return {'symbol': _parse_symbol(data), 'news_articles': None,
+                'news_token_ids': news_token_ids, 'long_document': False, 'aggregation': 'mean',
+                'compact': bool(data.get('compact'))}
+
+    if not data or 'news_articles' not in data:
+        raise RequestError("Missing 'news_articles' field in request body")
+    news_articles = data['news_articles']
+    if not isinstance(news_articles, list):
+        raise RequestError("'news_articles' must be a list of strings")
+    if not news_articles:
+        raise RequestError("'news_articles' list cannot be empty")
+    return {'symbol': _parse_symbol(data), 'news_articles': news_articles, 'news_token_ids': None,
+            'long_document': bool(data.get('long_document')), 'aggregation': _parse_aggregation(data),
+            'compact': bool(data.get('compact'))}
+
+
+def score_analyze_stock(analyzer, parsed, stats=None):
+    """
+    Scores the articles of a parsed /analyze-stock request.
+
+    Args:
+        stats (dict, optional): Receives the number of articles that reused the scores of a
+            near-duplicate under 'near_duplicates' (see StockSentimentAnalyzer.analyze_batch).
+    """
+    if parsed['news_token_ids'] is not None:
+        results = analyzer.analyze_token_ids(parsed['news_token_ids'])
+        analyzer.record_results(parsed['symbol'], parsed['news_token_ids'], results)
+        return results
+    return analyzer.get_stock_sentiment(
+        parsed['symbol'], parsed['news_articles'],
+        long_document=parsed['long_document'],
+        aggregation=parsed['aggregation'],
+        stats=stats
+    )
+
+
+def stock_response(parsed, sentiment_results, near_duplicates=None):
+    """
+    Builds the /analyze-stock response body with the aggregate sentiment.
+
+    A compact body replaces the per-article score dicts of "individual_sentiments" with
+    "scores": one array per label, in article order.
+
+    Args:
+        near_duplicates (int, optional): Articles whose scores were reused from a near-duplicate;
+            reported as "near_duplicates" when given.
+    """
+    aggregate = {
+        'positive': sum(s['positive'] for s in sentiment_results) / len(sentiment_results),
+        'negative': sum(s['negative'] for s in sentiment_results) / len(sentiment_results),
+        'neutral': sum(s['neutral'] for s in sentiment_results) / len(sentiment_results)
+    }
+    overall_sentiment = max(aggregate, key=aggregate.get)
+    response = {
+        "symbol": parsed['symbol'],
+        "articles_analyzed": len(sentiment_results)
+    }
+    if parsed['compact']:
+        response["scores"] = {label: [s[label] for s in sentiment_results] for label in LABELS}
+    else:
+        response["individual_sentiments"] = sentiment_results
+    response.update({
+        "aggregate_sentiment": aggregate,
+        "overall_sentiment": overall_sentiment,
+        "confidence": aggregate[overall_sentiment]
+    })
+    if near_duplicates is not None:
+        response["near_duplicates"] = near_duplicates
+    return response
+
+
+def parse_analyze_portfolio(data):
+    """
+    Validates an /analyze-portfolio body.
+
+    Returns:
+        dict: 'portfolio' (a list of {'symbol', 'news_articles'}), 'long_document', 'aggregation' and 'compact'.
+    """
+    portfolio = data.get('portfolio') if isinstance(data, dict) else None
+    if not isinstance(portfolio, list) or not portfolio:
+        raise RequestError("'portfolio' must be a non-empty list of {\"symbol\", \"news_articles\"} objects")
+    seen = set()
+    for entry in portfolio:
+        symbol = normalize_symbol(entry.get('symbol')) if isinstance(entry, dict) else None
+        if symbol is None:
+            raise RequestError(f"The 'symbol' of each portfolio entry {_SYMBOL_ERROR}")
+        if symbol in seen:
+            raise RequestError(f"Symbol '{symbol}' appears more than once in the portfolio")
+        seen.add(symbol)
+        articles = entry.get('news_articles')
+        if not isinstance(articles, list) or not articles or not all(isinstance(a, str) and a.strip() for a in articles):
+            raise RequestError(f"'news_articles' of '{entry['symbol']}' must be a non-empty list of non-empty strings")
+    return {
+        'portfolio': [{'symbol': entry['symbol'], 'news_articles': entry['news_articles']} for entry in portfolio],
+        'long_document': bool(data.get('long_document')),
+        'aggregation': _parse_aggregation(data),
+        'compact': bool(data.get('compact'))
+    }
+
+
+def score_analyze_portfolio(analyzer, parsed):
+    """
+    Scores every distinct article of a portfolio once, in one shared batch, and fans the scores back out.
+
+    Articles that differ only in whitespace count as the same article. Each symbol's
+    scores are recorded under that symbol as /analyze-stock would.
+
+    Returns:
+        tuple: Per portfolio entry, the list of its article scores; the number of distinct articles;
+        and how many of those reused the scores of a near-duplicate.
+    """
+    unique = list(dict.fromkeys(normalize_text(article)
+                                for entry in parsed['portfolio'] for article in entry['news_articles']))
+    stats = {}
+    if parsed['long_document']:
+        scores = analyzer.analyze_long_documents(unique, aggregation=parsed['aggregation'], stats=stats)
+    else:
+        scores = analyzer.analyze_batch(unique, stats=stats)
+    by_text = dict(zip(unique, scores))
+
+    results = []
+    for entry in parsed['portfolio']:
+        sentiments = [dict(by_text[normalize_text(article)]) for article in entry['news_articles']]
+        analyzer.record_results(entry['symbol'], entry['news_articles'], sentiments)
+        results.append(sentiments)
+    return results, len(unique), stats.get('near_duplicates', 0)
+
+
+def portfolio_response(parsed, scored):
+    """Builds the /analyze-portfolio response: an /analyze-stock body per symbol plus portfolio totals."""
+    results, unique, near_duplicates = scored
+    symbols = [stock_response(dict(entry, compact=parsed['compact']), sentiments)
+               for entry, sentiments in zip(parsed['portfolio'], results)]
+    total = sum(len(sentiments) for sentiments in results)
+    return {
+        "symbols_analyzed": len(symbols),
+        "articles_analyzed": total,
+        "unique_articles_scored": unique,
+        "duplicate_articles_skipped": total - unique,
+        "near_duplicates": near_duplicates,
+        "results": symbols
+    }
+
+
+def symbol_payload(analyzer, symbol):
+    """
+    Returns the rolling aggregates of a symbol; nothing is scored.
+
+    Raises:
+        RequestError: 400 for an invalid symbol, 404 if no article has been analyzed for it.
+    """
+    if normalize_symbol(symbol) is None:
+        raise RequestError(f"The symbol {_SYMBOL_ERROR}")
+    aggregates = analyzer.aggregates.get(symbol)
+    if aggregates is None:
+        raise RequestError(f"No sentiment recorded for '{symbol}'", status=404)
+    return aggregates
+
+
+def _parse_time(value, name):
+    """Reads a query time given as Unix seconds or ISO 8601 (UTC unless it has an offset)."""
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        if not math.isfinite(seconds):
+            raise RequestError(f"'{name}' must be a finite number of Unix seconds")
+        return seconds
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise RequestError(f"'{name}' must be Unix seconds or an ISO 8601 date or time")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def parse_history_query(args):
+    """
+    Validates the query string of /history/<symbol>.
+
+    Args:
+        args (dict): The query parameters: 'start' and 'end' (default: the last 7 days, or
+            MAX_HISTORY_POINTS intervals if fewer) and 'interval' (a HISTORY_INTERVALS name or
+            seconds; default '1h').
+
+    Returns:
+        dict: 'start', 'end' and 'interval' in seconds.
+    """
+    end = _parse_time(args['end'], 'end') if args.get('end') else time.time()
+    interval = args.get('interval') or '1h'
+    if interval in HISTORY_INTERVALS:
+        interval = HISTORY_INTERVALS[interval]
+    else:
+        try:
+            interval = float(interval)
+        except ValueError:
+            interval = 0
+        if not math.isfinite(interval) or interval < 1:
+            raise RequestError(f"'interval' must be one of {', '.join(HISTORY_INTERVALS)} or at least 1 second")
+    if not args.get('start'):
+        # The last week, or as much of it as MAX_HISTORY_POINTS intervals cover
+        return {'start': end - min(HISTORY_INTERVALS['1w'], interval * MAX_HISTORY_POINTS), 'end': end,
+                'interval': interval}
+    start = _parse_time(args['start'], 'start')
+    if end <= start:
+        raise RequestError("'end' must be after 'start'")
+    if (end - start) / interval > MAX_HISTORY_POINTS:
+        raise RequestError(f"The range spans more than {MAX_HISTORY_POINTS} intervals; use a longer 'interval'")
+    return {'start': start, 'end': end, 'interval': interval}
+
+
+def history_payload(analyzer, symbol, query):
+    """
+    Returns a symbol's stored sentiment downsampled over a time range; nothing is scored.
+
+    Raises:
+        RequestError: 404 if the history is not enabled, 400 for an invalid symbol.
+    """
+    if analyzer.history is None:
+        raise RequestError("Sentiment history is not enabled (set SENTIMENT_HISTORY_PATH)", status=404)
+    if normalize_symbol(symbol) is None:
+        raise RequestError(f"The symbol {_SYMBOL_ERROR}")
+    points = analyzer.history.series(symbol, query['start'], query['end'], query['interval'])
+    for point in points:
+        point['dominant_sentiment'] = max(point['mean'], key=point['mean'].get)
+    return {
+        "symbol": normalize_symbol(symbol),
+        "start": query['start'],
+        "end": query['end'],
+        "interval_seconds": query['interval'],
+        "articles": sum(point['count'] for point in points),
+        "points": points
+    }
+
+
+def wants_stream(data, accept=None):
+    """Returns True if an /analyze-stock request asks for a streamed NDJSON response."""
+    return bool(data and data.get('stream')) or NDJSON_MIMETYPE in (accept or '')
+
+
+def split_stock_request(parsed, chunk_size):
+    """
+    Splits a parsed /analyze-stock request into consecutive chunks of articles.
+
+    Yields:
+        tuple: The index of the chunk's first article and a parsed request for the chunk.
+    """
+    field = 'news_token_ids' if parsed['news_token_ids'] is not None else 'news_articles'
+    items = parsed[field]
+    for start in range(0, len(items), chunk_size):
+        yield start, dict(parsed, **{field: items[start:start + chunk_size]})
+
+
+class StockStream:
+    """
+    Renders a streamed /analyze-stock response chunk by chunk.
+
+    Each article becomes one line as soon as its chunk is scored; only running sums
+    are kept, so memory does not grow with the number of articles. The last line
+    carries the same aggregate fields as the non-streamed response.
+    """
+    def __init__(self, parsed):
+        self.parsed = parsed
+        self.symbol = parsed['symbol']
+        self.count = 0
+        self.totals = {'positive': 0.0, 'negative': 0.0, 'neutral': 0.0}
+        # Passed to score_analyze_stock for every chunk, to report near-duplicates in the summary
+        self.stats = {}
+
+    def lines(self, start, sentiment_results):
+        """Returns the NDJSON lines for one scored chunk, starting at article index start."""
+        out = []
+        for index, sentiment in enumerate(sentiment_results, start):
+            for label in self.totals:
+                self.totals[label] += sentiment[label]
+            out.append(json.dumps({"type": "article", "index": index, "sentiment_scores": sentiment}) + "\n")
+        self.count += len(sentiment_results)
+        return ''.join(out)
+
+    def summary(self):
+        """Returns the final line with the aggregate sentiment."""
+        aggregate = {label: total / self.count for label, total in self.totals.items()}
+        overall_sentiment = max(aggregate, key=aggregate.get)
+        return json.dumps({
+            "type": "summary",
+            "symbol": self.symbol,
+            "articles_analyzed": self.count,
+            "aggregate_sentiment": aggregate,
+            "overall_sentiment": overall_sentiment,
+            "confidence": aggregate[overall_sentiment],
+            "near_duplicates": self.stats.get('near_duplicates', 0)
+        }) + "\n"
+
+    def error(self, error):
+        """Returns the line that ends a stream which failed part-way."""
+        return json.dumps({"type": "error", "error": f"An error occurred: {str(error)}",
+                           "articles_analyzed": self.count}) + "\n"
@@ -0,0 +1,118 @@
+"""
+Persistent history of scored articles for trend and backtest queries
+
+Each article scored for a symbol is appended to a local SQLite table with the
+time it was scored, a hash of its text and its three scores:
+
+    history(symbol, ts, text_hash, positive, negative, neutral)
+
+An index on (symbol, ts) that also covers the score columns answers a symbol's
+time-range query from the index alone, and series() downsamples it into fixed
+intervals in SQL, so trends over months of articles never re-run the model.
+As with the disk cache, the database is in WAL mode and shared by every worker
+process.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from .aggregates import LABELS, normalize_symbol
+from .cache import normalize_text
+
+
+def text_hash(item):
+    """Returns the SHA-256 hex digest identifying an article's text, or its token ids."""
+    payload = normalize_text(item) if isinstance(item, str) else json.dumps(item)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SentimentHistory:
+    """
+    An append-only, time-indexed store of article scores per symbol.
+    """
+    def __init__(self, path, timeout=30.0):
+        """
+        Args:
+            path (str): Location of the SQLite database file; parent directories are created.
+            timeout (float): Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history (symbol TEXT NOT NULL, ts REAL NOT NULL, "
+                "text_hash TEXT NOT NULL, positive REAL NOT NULL, negative REAL NOT NULL, neutral REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS history_symbol_ts "
+                         "ON history (symbol, ts, positive, negative, neutral)")
+
+    def _connect(self):
+        """Returns this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def append(self, symbol, items, sentiments, timestamp):
+        """
+        Appends scored articles in one transaction.
+
+        Args:
+            symbol (str): The stock symbol; case and surrounding spaces are ignored.
+            items (list): The article texts (or token id lists) that were scored.
+            sentiments (list): Their score dicts, in the same order.
+            timestamp (float): Unix time the articles were scored.
+
+        Returns:
+            int: The number of rows written; 0 for an unusable symbol or if the store is unavailable.
+        """
+        key = normalize_symbol(symbol)
+        if key is None or not sentiments:
+            return 0
+        rows = [(key, timestamp, text_hash(item), *(sentiment[label] for label in LABELS))
+                for item, sentiment in zip(items, sentiments)]
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            # Losing history must not fail the request that produced the scores
+            print(f"Could not append to sentiment history: {e}")
+            return 0
+        return len(rows)
+
+    def series(self, symbol, start, end, interval):
+        """
+        Downsamples a symbol's articles in [start, end) into fixed intervals.
+
+        Args:
+            symbol (str): The stock symbol.
+            start (float): Unix time of the first interval; intervals are aligned to multiples of interval.
+            end (float): Unix time the range ends, exclusive.
+            interval (float): Seconds per point.
+
+        Returns:
+            list: One dict per non-empty interval, in time order: its start time, the
+            article count and the mean scores.
+        """
+        rows = self._connect().execute(
+            "SELECT CAST(ts / ? AS INTEGER) AS bucket, COUNT(*), AVG(positive), AVG(negative), AVG(neutral) "
+            "FROM history WHERE symbol = ? AND ts >= ? AND ts < ? GROUP BY bucket ORDER BY bucket",
+            (interval, normalize_symbol(symbol), start, end)
+        ).fetchall()
+        return [
+            {'start': bucket * interval, 'count': count, 'mean': dict(zip(LABELS, means))}
+            for bucket, count, *means in rows
+        ]
+
+    def __len__(self):
+        (count,) = self._connect().execute("SELECT COUNT(*) FROM history").fetchone()
+        return count
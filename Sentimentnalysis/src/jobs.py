@@ -0,0 +1,322 @@
+"""
+Bulk sentiment jobs for large corpora
+
+A job is a JSONL corpus uploaded once and scored in the background. Each job lives
+in its own directory under the job root:
+
+    input.jsonl     The submitted records, one per line (blank lines dropped)
+    results.jsonl   One result line per input line, in input order, appended per batch
+    job.json        Status, progress and throughput, replaced atomically
+
+Progress is defined by results.jsonl: after a crash the runner truncates any partial
+last line and continues from the next unscored record, so a job resumes where it
+stopped. Only one process scores jobs at a time; with several gunicorn workers the
+first to take the runner lock does the work and the others only accept uploads and
+answer status requests.
+
+Each input line is either a JSON string or an object with a "text" field; any other
+fields of the object except "text" (e.g. "id" or "symbol") are copied to its result.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where a single process is assumed
+    fcntl = None
+
+
+class JobStore:
+    """
+    Keeps job files on disk.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    def __init__(self, root=None):
+        """
+        Args:
+            root (str, optional): Directory holding the jobs; defaults to sentiment-jobs in the temp directory.
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), 'sentiment-jobs')
+
+    def path(self, job_id, name=''):
+        return os.path.join(self.root, job_id, name)
+
+    def create(self, chunks):
+        """
+        Stores an uploaded corpus as a new queued job.
+
+        Args:
+            chunks (iterable): The JSONL body as bytes chunks; it is never held in memory whole.
+
+        Returns:
+            dict: The new job.
+        """
+        upload = JobUpload(self)
+        try:
+            for chunk in chunks:
+                upload.write(chunk)
+        except BaseException:
+            upload.abort()
+            raise
+        return upload.close()
+
+    def get(self, job_id):
+        """Returns a job's metadata, or None if there is no such job."""
+        if not isinstance(job_id, str) or len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self.path(job_id, 'job.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, job):
+        """Atomically replaces a job's metadata."""
+        tmp_path = self.path(job['id'], 'job.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self.path(job['id'], 'job.json'))
+
+    def pending(self):
+        """Returns the jobs that are queued or were running when their runner stopped, oldest first."""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        jobs = [self.get(name) for name in names]
+        jobs = [job for job in jobs if job and job['status'] in (self.QUEUED, self.RUNNING)]
+        return sorted(jobs, key=lambda job: job['created'])
+
+    def status(self, job):
+        """Returns the job as reported to clients, with progress and throughput."""
+        report = dict(job)
+        report['progress'] = {'done': job['done'], 'total': job['total'],
+                              'percent': round(100.0 * job['done'] / job['total'], 2) if job['total'] else 100.0}
+        remaining = job['total'] - job['done']
+        rate = job.get('items_per_second')
+        report['eta_seconds'] = round(remaining / rate, 1) if rate and job['status'] == self.RUNNING else None
+        return report
+
+
+class JobUpload:
+    """
+    Writes an uploaded JSONL corpus to disk chunk by chunk.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.job_id = uuid.uuid4().hex
+        os.makedirs(store.path(self.job_id), exist_ok=True)
+        self._file = open(store.path(self.job_id, 'input.jsonl'), 'wb')
+        self._partial = b''
+        self.total = 0
+
+    def _write_lines(self, lines):
+        for line in lines:
+            line = line.strip()
+            if line:
+                self._file.write(line + b'\n')
+                self.total += 1
+
+    def write(self, chunk):
+        """Appends a chunk of the body; lines may span chunks."""
+        lines = (self._partial + chunk).split(b'\n')
+        self._partial = lines.pop()
+        self._write_lines(lines)
+
+    def close(self):
+        """
+        Finishes the upload and queues the job.
+
+        Raises:
+            ValueError: If the corpus has no records.
+        """
+        self._write_lines([self._partial])
+        self._file.close()
+        if not self.total:
+            shutil.rmtree(self.store.path(self.job_id), ignore_errors=True)
+            raise ValueError("The corpus has no records")
+        open(self.store.path(self.job_id, 'results.jsonl'), 'wb').close()
+        job = {
+            'id': self.job_id,
+            'status': JobStore.QUEUED,
+            'total': self.total,
+            'done': 0,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'items_per_second': None,
+            'error': None
+        }
+        self.store.save(job)
+        return job
+
+    def abort(self):
+        """Discards an unfinished upload and its job directory."""
+        self._file.close()
+        shutil.rmtree(self.store.path(self.job_id), ignore_errors=True)
+
+
+def _parse_record(line):
+    """
+    Reads one input line.
+
+    Returns:
+        tuple: The text (None if the line is invalid), the extra fields to echo and an error message.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None, {}, "Line is not valid JSON"
+    if isinstance(record, str):
+        record = {'text': record}
+    if not isinstance(record, dict) or not isinstance(record.get('text'), str) or not record['text']:
+        return None, {}, "Each line must be a non-empty string or an object with a non-empty 'text' field"
+    extra = {key: value for key, value in record.items() if key != 'text'}
+    return record['text'], extra, None
+
+
+def _resume_offset(results_path, chunk_size=1 << 20):
+    """Drops a partially written last line from results.jsonl and returns the number of complete lines."""
+    lines, complete, position = 0, 0, 0
+    with open(results_path, 'rb+') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            count = chunk.count(b'\n')
+            if count:
+                lines += count
+                complete = position + chunk.rfind(b'\n') + 1
+            position += len(chunk)
+        if complete != position:
+            f.truncate(complete)
+    return lines
+
+
+class JobRunner:
+    """
+    Scores queued jobs in a background thread, in large batches.
+
+    The thread starts on first use in each process and only works while it holds the
+    runner lock, so exactly one process scores jobs while the others stand by and
+    take over if it dies.
+    """
+    def __init__(self, store, get_analyzer, batch_size=1024, poll_interval=1.0):
+        """
+        Args:
+            store (JobStore): Where jobs are kept.
+            get_analyzer (callable): Returns the loaded StockSentimentAnalyzer, or None while it is loading.
+            batch_size (int): Records read and passed to analyze_batch at a time; the analyzer
+                splits them further into length-bucketed forward passes.
+            poll_interval (float): Seconds between checks for new jobs.
+        """
+        self.store = store
+        self.get_analyzer = get_analyzer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._lock_file = None
+        self._wakeup = threading.Event()
+
+    def wake(self):
+        """Makes the runner check for new jobs now rather than at its next poll."""
+        self._wakeup.set()
+
+    def ensure_started(self):
+        """Starts the runner thread, again after a fork since threads do not survive it."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._thread_pid != os.getpid():
+                self._lock_file = None
+                self._thread = threading.Thread(target=self._loop, name="job-runner", daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _acquire(self):
+        """Takes the runner lock without blocking; returns True if this process now owns the jobs."""
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.store.root, exist_ok=True)
+        lock_file = open(os.path.join(self.store.root, 'runner.lock'), 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._lock_file = lock_file
+        return True
+
+    def _loop(self):
+        while True:
+            try:
+                if self.get_analyzer() is not None and self._acquire():
+                    self.run_pending()
+            except Exception as e:
+                print(f"Job runner error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def run_pending(self):
+        """Runs every pending job to completion in the calling thread."""
+        for job in self.store.pending():
+            self.run(job)
+
+    def run(self, job):
+        """Scores the unscored records of a job, resuming after the last complete result line."""
+        analyzer = self.get_analyzer()
+        results_path = self.store.path(job['id'], 'results.jsonl')
+        done = _resume_offset(results_path)
+        job.update(status=JobStore.RUNNING, done=done, started=job['started'] or time.time())
+        self.store.save(job)
+
+        run_started, run_done = time.monotonic(), 0
+        try:
+            with open(self.store.path(job['id'], 'input.jsonl'), 'rb') as source, open(results_path, 'ab') as sink:
+                for _ in range(done):
+                    source.readline()
+                while True:
+                    lines = [line for line in (source.readline() for _ in range(self.batch_size)) if line]
+                    if not lines:
+                        break
+                    sink.write(self._score_lines(analyzer, lines, done).encode())
+                    sink.flush()
+                    os.fsync(sink.fileno())
+                    done += len(lines)
+                    run_done += len(lines)
+                    job.update(done=done, items_per_second=round(run_done / (time.monotonic() - run_started), 2))
+                    self.store.save(job)
+        except Exception as e:
+            job.update(status=JobStore.FAILED, error=f"{type(e).__name__}: {e}", finished=time.time())
+            self.store.save(job)
+            return job
+
+        job.update(status=JobStore.COMPLETED, finished=time.time())
+        self.store.save(job)
+        return job
+
+    @staticmethod
+    def _score_lines(analyzer, lines, start):
+        """Scores one batch of input lines and returns their result lines."""
+        records = [_parse_record(line) for line in lines]
+        texts = [text for text, _, _ in records if text is not None]
+        scores = iter(analyzer.analyze_batch(texts) if texts else [])
+        out = []
+        for index, (text, extra, error) in enumerate(records, start):
+            result = dict(extra, index=index)
+            if error:
+                result['error'] = error
+            else:
+                sentiment = next(scores)
+                result['sentiment_scores'] = sentiment
+                result['dominant_sentiment'] = max(sentiment, key=sentiment.get)
+            out.append(json.dumps(result) + '\n')
+        return ''.join(out)
@@ -0,0 +1,138 @@
+"""
+Model loading and warm-up state for liveness and readiness probes
+"""
+
+import os
+import threading
+import time
+import traceback
+
+
+# How create_app brings up the model; see ModelState.start
+LOAD_MODES = ('background', 'eager', 'preload')
+
+
+class ModelState:
+    """
+    Loads the analyzer and warms it up, optionally in the background, and reports progress.
+
+    The status moves from 'loading' through 'warming' to 'ready', or to 'failed' if
+    either step raises. Requests can be served as soon as the analyzer is loaded;
+    readiness additionally waits for warm-up so the first real request is fast.
+    """
+    LOADING = 'loading'
+    WARMING = 'warming'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, factory, warmup_lengths=(16, 64, 128, 256, 512), warmup_batch_sizes=(1, 8)):
+        """
+        Args:
+            factory (callable): Builds the StockSentimentAnalyzer.
+            warmup_lengths (tuple): Sequence lengths of the dummy warm-up batches; empty skips warm-up.
+            warmup_batch_sizes (tuple): Batch sizes of the dummy warm-up batches.
+        """
+        self.factory = factory
+        self.warmup_lengths = tuple(warmup_lengths)
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.analyzer = None
+        self.status = self.LOADING
+        self.error = None
+        self.warmup_done = 0
+        self.warmup_total = 0
+        self._started_at = time.monotonic()
+        self._ready_at = None
+        self._warmup_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.status == self.READY and self.backend_health().get('healthy', True)
+
+    def backend_health(self):
+        """Returns the health report of backends that have one (the inference pool), else {}."""
+        health = getattr(getattr(self.analyzer, 'backend', None), 'health', None)
+        return health() if callable(health) else {}
+
+    def load(self):
+        """Builds the analyzer in the calling thread."""
+        try:
+            self.analyzer = self.factory()
+        except Exception as e:
+            self._fail(e)
+            raise
+        self.status = self.WARMING
+
+    def warm_up(self):
+        """Runs the warm-up batches in the calling thread, then marks the model ready."""
+        def progress(done, total):
+            self.warmup_done, self.warmup_total = done, total
+
+        try:
+            if self.warmup_lengths:
+                self.analyzer.warmup(self.warmup_lengths, self.warmup_batch_sizes, callback=progress)
+        except Exception as e:
+            self._fail(e)
+            return
+        self.status = self.READY
+        self._ready_at = time.monotonic()
+
+    def start(self, mode='background'):
+        """
+        Loads the model and, depending on mode, warms it up.
+
+        Args:
+            mode (str): 'background' loads and warms up in a daemon thread so the server
+                binds immediately; 'eager' does both before returning; 'preload' only loads,
+                leaving warm-up to start_warmup in each forked worker.
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(f"mode must be one of {', '.join(LOAD_MODES)}")
+        if mode != 'background':
+            self.load()
+            if mode == 'eager':
+                self.start_warmup(background=False)
+            return
+
+        def run():
+            try:
+                self.load()
+            except Exception:
+                return
+            self.start_warmup(background=False)
+
+        threading.Thread(target=run, name="model-loader", daemon=True).start()
+
+    def start_warmup(self, background=True):
+        """
+        Warms up an already loaded model once per process.
+
+        With gunicorn's preload_app the model is loaded in the master and each forked
+        worker calls this, since warm-up threads do not survive the fork.
+        """
+        with self._lock:
+            if self.analyzer is None or self._warmup_pid == os.getpid():
+                return
+            self._warmup_pid = os.getpid()
+            self.status = self.WARMING
+        if background:
+            threading.Thread(target=self.warm_up, name="model-warmup", daemon=True).start()
+        else:
+            self.warm_up()
+
+    def _fail(self, error):
+        self.status = self.FAILED
+        self.error = f"{type(error).__name__}: {error}"
+        traceback.print_exc()
+
+    def snapshot(self):
+        """Returns the status, warm-up progress and timing for the readiness probe."""
+        return {
+            "status": self.status,
+            "model_loaded": self.analyzer is not None,
+            "warmup_progress": {"done": self.warmup_done, "total": self.warmup_total},
+            "seconds_since_start": round(time.monotonic() - self._started_at, 3),
+            "seconds_to_ready": round(self._ready_at - self._started_at, 3) if self._ready_at else None,
+            "backend": self.backend_health() or None,
+            "error": self.error
+        }
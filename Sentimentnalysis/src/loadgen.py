@@ -0,0 +1,250 @@
+"""
+HTTP load generator for the API
+
+Replays a mix of /analyze headlines and /analyze-stock article batches of varied
+sizes against a running server and reports latency percentiles, error rate and
+throughput, overall and per endpoint.
+
+Two modes are supported:
+
+    closed   A fixed number of clients, each sending its next request as soon as the
+             previous one is answered. Measures the capacity of a configuration.
+    open     Requests start on a Poisson schedule at a target rate, whether or not
+             earlier ones have finished. Latency is measured from the scheduled start,
+             so time spent waiting for a free client connection is included and an
+             overloaded server shows up as growing latency rather than a lower rate.
+
+Only the standard library is used for HTTP, with one keep-alive connection per
+client thread.
+"""
+
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .backends import REFERENCE_TEXTS
+from .metrics import percentile
+
+
+MODES = ('closed', 'open')
+
+# Tickers the generated requests are about
+SYMBOLS = ('AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOGL', 'META', 'TSLA', 'JPM', 'XOM', 'KO')
+
+
+class TrafficMix:
+    """
+    Generates request bodies: single headlines for /analyze and article batches for /analyze-stock.
+    """
+    def __init__(self, single_fraction=0.7, article_counts=(2, 5, 10, 20, 50), unique=True, seed=0):
+        """
+        Args:
+            single_fraction (float): Share of requests sent to /analyze; the rest go to /analyze-stock.
+            article_counts (tuple): Batch sizes of /analyze-stock requests, picked uniformly.
+            unique (bool): Make every text distinct so the server's result cache cannot answer it.
+            seed (int): Seed of the generated traffic.
+        """
+        self.single_fraction = single_fraction
+        self.article_counts = tuple(article_counts)
+        self.unique = unique
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def _headline(self):
+        text = f"{self._rng.choice(SYMBOLS)}: {self._rng.choice(REFERENCE_TEXTS)}"
+        if self.unique:
+            self._sequence += 1
+            text += f" (update {self._sequence})"
+        return text
+
+    def _article(self):
+        sentences = self._rng.sample(REFERENCE_TEXTS, self._rng.randint(1, 4))
+        return ' '.join([self._headline()] + sentences)
+
+    def next_request(self):
+        """
+        Returns:
+            tuple: The endpoint name, path, JSON body as bytes and number of texts in the request.
+        """
+        with self._lock:
+            if self._rng.random() < self.single_fraction:
+                return 'analyze', '/analyze', json.dumps({"text": self._headline()}).encode(), 1
+            count = self._rng.choice(self.article_counts)
+            body = {"symbol": self._rng.choice(SYMBOLS), "news_articles": [self._article() for _ in range(count)]}
+            return 'analyze_stock', '/analyze-stock', json.dumps(body).encode(), count
+
+
+class _Client:
+    """One keep-alive connection, reopened after a failure."""
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip('/')
+        self._timeout = timeout
+        self._connection = None
+
+    def request(self, method, path, body=None):
+        """Sends a request and reads the whole response; returns the status, or raises."""
+        if self._connection is None:
+            self._connection = self._connection_class(self._netloc, timeout=self._timeout)
+        try:
+            self._connection.request(method, self._prefix + path, body=body,
+                                     headers={'Content-Type': 'application/json'} if body else {})
+            response = self._connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def wait_until_ready(url, timeout=60.0, interval=0.5):
+    """
+    Polls /health/ready until the server answers 200.
+
+    Raises:
+        TimeoutError: If the server is not ready within timeout seconds.
+    """
+    client = _Client(url, timeout=interval * 4)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                if client.request('GET', '/health/ready') == 200:
+                    return
+            except (OSError, http.client.HTTPException):
+                pass
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{url} was not ready after {timeout:.0f}s")
+            time.sleep(interval)
+    finally:
+        client.close()
+
+
+def _summarize(samples, elapsed):
+    """Returns counts, error rate, throughput and latency percentiles of (latency, ok, status, texts) samples."""
+    latencies = sorted(latency for latency, _, _, _ in samples)
+    errors = sum(1 for _, ok, _, _ in samples if not ok)
+    statuses = {}
+    for _, _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'throughput_rps': (len(samples) - errors) / elapsed if elapsed else 0.0,
+        'texts_per_second': sum(texts for _, ok, _, texts in samples if ok) / elapsed if elapsed else 0.0,
+        'status_codes': statuses,
+        'latency_ms': None
+    }
+    if latencies:
+        summary['latency_ms'] = {
+            'mean': 1000.0 * sum(latencies) / len(latencies),
+            'p50': 1000.0 * percentile(latencies, 50),
+            'p95': 1000.0 * percentile(latencies, 95),
+            'p99': 1000.0 * percentile(latencies, 99),
+            'max': 1000.0 * latencies[-1]
+        }
+    return summary
+
+
+def run_load(url, mode='closed', duration=30.0, concurrency=8, qps=10.0, mix=None, warmup=0.0, timeout=60.0):
+    """
+    Sends load to a running server and measures it.
+
+    Args:
+        url (str): Base URL of the server, e.g. http://localhost:5000.
+        mode (str): 'closed' or 'open', see the module docstring.
+        duration (float): Seconds during which requests are started, after the warm-up.
+        concurrency (int): Clients in closed mode; in open mode, the most requests in flight at once.
+        qps (float): Target request rate in open mode.
+        mix (TrafficMix, optional): The traffic to send; a default mix if omitted.
+        warmup (float): Seconds of load sent first and left out of the report.
+        timeout (float): Seconds before a request counts as failed.
+
+    Returns:
+        dict: The settings and the summary of all measured requests, overall and per endpoint.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    mix = mix or TrafficMix()
+    local = threading.local()
+    clients = []
+    samples = []
+    samples_lock = threading.Lock()
+    start = time.monotonic()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = _Client(url, timeout)
+            with samples_lock:
+                clients.append(local.client)
+        return local.client
+
+    def send(scheduled):
+        endpoint, path, body, texts = mix.next_request()
+        try:
+            status = client().request('POST', path, body)
+            ok = 200 <= status < 300
+        except (OSError, http.client.HTTPException) as e:
+            status, ok = type(e).__name__, False
+        if scheduled >= measure_from:
+            with samples_lock:
+                samples.append((endpoint, time.monotonic() - scheduled, ok, status, texts))
+
+    if mode == 'closed':
+        def closed_loop():
+            while True:
+                scheduled = time.monotonic()
+                if scheduled >= stop_at:
+                    return
+                send(scheduled)
+
+        threads = [threading.Thread(target=closed_loop, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        rng = random.Random(0)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            scheduled = start
+            while scheduled < stop_at:
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, scheduled)
+                scheduled += rng.expovariate(qps)
+    elapsed = time.monotonic() - measure_from
+    for each in clients:
+        each.close()
+
+    report = {
+        'url': url,
+        'mode': mode,
+        'concurrency': concurrency,
+        'target_qps': qps if mode == 'open' else None,
+        'duration_seconds': duration,
+        'elapsed_seconds': elapsed,
+        'single_fraction': mix.single_fraction,
+        'article_counts': list(mix.article_counts)
+    }
+    report.update(_summarize([sample[1:] for sample in samples], elapsed))
+    report['endpoints'] = {
+        endpoint: _summarize([sample[1:] for sample in samples if sample[0] == endpoint], elapsed)
+        for endpoint in sorted({sample[0] for sample in samples})
+    }
+    return report
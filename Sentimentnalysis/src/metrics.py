@@ -0,0 +1,204 @@
+"""
+Lightweight timing instrumentation for the inference pipeline
+
+Recording a value is one bisect and a few additions under a lock, once per
+batch or request rather than per item. Everything else, including cache and
+queue statistics, is only computed when /metrics is scraped.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+
+# Upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the batch size (texts per forward pass) histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Upper bounds of the sequence length (tokens per text) histogram
+SEQUENCE_LENGTH_BUCKETS = (8, 16, 32, 64, 128, 256, 384, 512)
+
+
+def percentile(sorted_values, percent):
+    """Returns the nearest-rank percentile of an ascending, non-empty list."""
+    rank = max(1, round(percent / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, Prometheus style.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value, count=1):
+        """Records value, count times."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += count
+            self._sum += value * count
+
+    def observe_many(self, values):
+        """Records each of values, taking the lock once."""
+        indexes = [bisect_left(self.buckets, value) for value in values]
+        with self._lock:
+            for index in indexes:
+                self._counts[index] += 1
+            self._sum += sum(values)
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: Cumulative counts per bucket (the last one is +Inf), the sum and the count.
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+
+
+class StageTimer:
+    """
+    Accumulates call counts and wall-clock time per named pipeline stage.
+    """
+    def __init__(self):
+        self._totals = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, items=1):
+        """Adds one timed call covering the given number of items to a stage."""
+        with self._lock:
+            calls, total, count = self._totals.get(stage, (0, 0.0, 0))
+            self._totals[stage] = (calls + 1, total + seconds, count + items)
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def histograms(self):
+        """Returns the per-call latency histogram of each stage."""
+        with self._lock:
+            return dict(self._histograms)
+
+    @contextmanager
+    def time(self, stage, items=1):
+        """Context manager that records the duration of its body under stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, items)
+
+    def snapshot(self):
+        """
+        Returns the accumulated timings.
+
+        Returns:
+            dict: For each stage, the number of calls, items, total seconds and mean milliseconds per item.
+        """
+        with self._lock:
+            totals = dict(self._totals)
+        return {
+            stage: {
+                'calls': calls,
+                'items': count,
+                'total_seconds': total,
+                'mean_ms_per_item': 1000.0 * total / count if count else 0.0
+            }
+            for stage, (calls, total, count) in totals.items()
+        }
+
+    def reset(self):
+        """Clears every stage."""
+        with self._lock:
+            self._totals.clear()
+            self._histograms.clear()
+
+
+class RequestMetrics:
+    """
+    Per-endpoint request latency, response counts and JSON serialization time of an app.
+    """
+    def __init__(self):
+        self.latency = StageTimer()
+        self.serialize = Histogram(LATENCY_BUCKETS)
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, status, seconds):
+        """Records one answered request."""
+        self.latency.record(endpoint, seconds)
+        with self._lock:
+            key = (endpoint, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def responses(self):
+        """Returns the number of responses per (endpoint, status)."""
+        with self._lock:
+            return dict(self._responses)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PrometheusWriter:
+    """
+    Renders metric families in the Prometheus text exposition format.
+
+    Each series is given as a (labels dict, value) pair; histograms take Histogram values.
+    """
+    def __init__(self):
+        self._lines = []
+
+    def _header(self, name, help_text, kind):
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {kind}")
+
+    def gauge(self, name, help_text, series):
+        self._header(name, help_text, 'gauge')
+        for labels, value in series:
+            self._lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def counter(self, name, help_text, series):
+        self._header(name, help_text, 'counter')
+        for labels, value in series:
+            self._lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name, help_text, series):
+        self._header(name, help_text, 'histogram')
+        for labels, histogram in series:
+            cumulative, total, count = histogram.snapshot()
+            for bound, running in zip(histogram.buckets + (float('inf'),), cumulative):
+                bucket_labels = dict(labels, le=_format_value(float(bound)))
+                self._lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {running}")
+            self._lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            self._lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    def render(self):
+        return '\n'.join(self._lines) + '\n'
@@ -0,0 +1,405 @@
+"""
+Multi-process inference pool with shared-memory tensor handoff
+
+One torch process does not scale linearly across many cores. PoolBackend runs N
+worker processes instead, each pinned to its own slice of cores with a matching
+torch.set_num_threads, and shards every batch across the idle workers by rows.
+Input ids and logits travel through per-worker shared-memory tensors; only
+(rows, width) tuples and acknowledgements go through the pipes.
+
+PoolBackend is an ordinary backend (see backends.py), so the analyzer, the Flask
+app (SENTIMENT_BACKEND=pool) and the offline tools use it unchanged.
+
+Every web server process builds its own pool, and each pool process holds a full
+copy of the model. The default pool size is therefore the cores divided by
+WEB_CONCURRENCY, the number of gunicorn workers sharing the machine, and
+gunicorn.conf.py starts a single web worker by default when the pool backend is
+selected: the pool provides the parallelism.
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+from .backends import INPUT_NAMES, TorchBackend, bf16_supported
+
+
+# Seconds a worker may take to load the model, and to answer one shard, before it is
+# treated as wedged and replaced
+START_TIMEOUT = 600
+REPLY_TIMEOUT = 120
+
+# Longest wait between attempts to restart a worker that failed to start; the wait
+# doubles from one second with every failed attempt
+MAX_RESTART_DELAY = 60
+
+
+def _available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def _load_model(model_name):
+    from transformers import BertForSequenceClassification
+
+    from .bundle import is_bundle, load_bundle_model
+
+    if is_bundle(model_name):
+        return load_bundle_model(model_name)
+    return BertForSequenceClassification.from_pretrained(model_name).eval()
+
+
+def _worker_main(conn, inputs, outputs, model_name, precision, cores, threads):
+    """Loads the model, then scores whatever the parent writes into the shared inputs."""
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    try:
+        backend = TorchBackend(_load_model(model_name), precision)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            # The parent is gone
+            return
+        if message is None:
+            return
+        rows, width = message
+        size = rows * width
+        batch = {name: inputs[i, :size].view(rows, width) for i, name in enumerate(INPUT_NAMES)}
+        try:
+            logits = backend(batch).float()
+            outputs[:logits.numel()].copy_(logits.reshape(-1))
+            conn.send(('ok', logits.shape[1]))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """Parent-side handle of one pool process and its shared buffers."""
+    def __init__(self, context, index, model_name, precision, cores, threads, capacity, num_labels):
+        self.index = index
+        self.capacity = capacity
+        # Set once the pipe is unusable or its state unknown; the pool then replaces the worker
+        self.broken = False
+        self.inputs = torch.zeros((len(INPUT_NAMES), capacity), dtype=torch.long).share_memory_()
+        self.outputs = torch.zeros(capacity * num_labels, dtype=torch.float32).share_memory_()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, name=f"inference-pool-{index}", daemon=True,
+            args=(child_conn, self.inputs, self.outputs, model_name, precision, cores, threads)
+        )
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout=START_TIMEOUT):
+        status, error = self._recv(timeout)
+        if status != 'ready':
+            raise RuntimeError(f"Inference pool worker {self.index} failed to start: {error}")
+
+    def submit(self, inputs, start, end):
+        """Copies rows start:end of the batch into shared memory and starts scoring them."""
+        rows, width = end - start, inputs['input_ids'].shape[1]
+        size = rows * width
+        for i, name in enumerate(INPUT_NAMES):
+            self.inputs[i, :size].view(rows, width).copy_(inputs[name][start:end])
+        try:
+            self.conn.send((rows, width))
+        except (BrokenPipeError, OSError) as e:
+            self.broken = True
+            raise RuntimeError(f"Inference pool worker {self.index} is unreachable: {e}")
+        return rows
+
+    def result(self, rows, timeout=REPLY_TIMEOUT):
+        """Waits for the submitted rows and returns their logits."""
+        status, value = self._recv(timeout)
+        if status != 'ok':
+            raise RuntimeError(f"Inference pool worker {self.index} failed: {value}")
+        return self.outputs[:rows * value].view(rows, value).clone()
+
+    def _recv(self, timeout):
+        try:
+            if not self.conn.poll(timeout):
+                self.broken = True
+                raise RuntimeError(f"Inference pool worker {self.index} did not answer within {timeout:.0f}s")
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.broken = True
+            raise RuntimeError(f"Inference pool worker {self.index} exited (code {self.process.exitcode})")
+
+    def stop(self):
+        if self.broken:
+            # A wedged worker may not react to anything short of SIGKILL
+            self.process.kill()
+            self.process.join()
+            return
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class PoolBackend:
+    """
+    Shards batches across a pool of pinned worker processes.
+
+    Workers start on first use in each process, so an app preloaded in a gunicorn
+    master gets its own pool in every worker rather than sharing pipes across forks.
+
+    A worker that exits or does not answer within reply_timeout is replaced. If its
+    replacement fails to start, the slot is retried with exponential backoff on later
+    calls; while no worker is running, calls fail at once and health() reports the
+    pool unhealthy.
+    """
+    name = 'pool'
+
+    def __init__(self, model_name, workers=None, threads_per_worker=None, precision='fp32', capacity=64 * 512,
+                 reply_timeout=REPLY_TIMEOUT):
+        """
+        Args:
+            model_name (str): Hub name, local directory or bundle the workers load the model from.
+            workers (int, optional): Number of processes; defaults to this process's share of
+                the cores, one per core divided by WEB_CONCURRENCY.
+            threads_per_worker (int, optional): Torch threads per process; defaults to its share of the cores.
+            precision (str): Precision mode of the workers' torch backends.
+            capacity (int): Tokens (rows x width) one worker scores per round trip; at least max_length.
+            reply_timeout (float): Seconds to wait for a worker's reply, and for an idle worker.
+        """
+        from transformers import BertConfig
+
+        cores = _available_cores()
+        self.model_name = model_name
+        self.workers = workers or max(1, len(cores) // max(1, int(os.environ.get('WEB_CONCURRENCY') or 1)))
+        self.threads_per_worker = threads_per_worker or max(1, len(cores) // self.workers)
+        # The workers' TorchBackend falls back from bf16 the same way
+        self.precision = 'fp32' if precision == 'bf16' and not bf16_supported() else precision
+        self.capacity = capacity
+        self.reply_timeout = reply_timeout
+        self.num_labels = BertConfig.from_pretrained(model_name).num_labels
+        self._cores = cores
+        self._context = None
+        self._lock = threading.Lock()
+        self._handles = []
+        self._idle = None
+        self._pid = None
+        # Slots without a running worker: index -> (failed attempts, monotonic time of the next attempt)
+        self._restarts = {}
+
+    def _core_slice(self, index):
+        """Pins workers to disjoint core slices when there are enough cores, otherwise leaves them unpinned."""
+        if self.workers * self.threads_per_worker > len(self._cores):
+            return None
+        start = index * self.threads_per_worker
+        return self._cores[start:start + self.threads_per_worker]
+
+    def start(self):
+        """Starts the worker processes and waits until every one has loaded the model."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._context = mp.get_context('spawn')
+            handles = [self._spawn(i) for i in range(self.workers)]
+            try:
+                for handle in handles:
+                    handle.wait_ready()
+            except RuntimeError:
+                for handle in handles:
+                    handle.stop()
+                raise
+            self._handles = handles
+            self._restarts = {}
+            self._idle = queue.Queue()
+            for handle in handles:
+                self._idle.put(handle)
+            self._pid = os.getpid()
+
+    def _spawn(self, index):
+        return _Worker(self._context, index, self.model_name, self.precision, self._core_slice(index),
+                       self.threads_per_worker, self.capacity, self.num_labels)
+
+    def _replace(self, worker):
+        """Starts a new process in place of a broken worker; returns it, or None if it fails to start."""
+        worker.stop()
+        with self._lock:
+            self._handles = [handle for handle in self._handles if handle is not worker]
+        return self._restart(worker.index, 0)
+
+    def _restart(self, index, attempts):
+        """Starts a worker in a free slot; on failure schedules the next attempt and returns None."""
+        fresh = None
+        try:
+            fresh = self._spawn(index)
+            fresh.wait_ready()
+        except RuntimeError as e:
+            if fresh is not None:
+                fresh.stop()
+            delay = min(MAX_RESTART_DELAY, 2 ** attempts)
+            print(f"Could not restart inference pool worker {index}, retrying in {delay}s: {e}")
+            with self._lock:
+                self._restarts[index] = (attempts + 1, time.monotonic() + delay)
+            return None
+        with self._lock:
+            self._restarts.pop(index, None)
+            self._handles.append(fresh)
+        return fresh
+
+    def _retry_restarts(self):
+        """Tries again to start the workers of slots whose backoff has expired."""
+        now = time.monotonic()
+        with self._lock:
+            due = [(index, attempts) for index, (attempts, at) in self._restarts.items() if at <= now]
+            # Claim the slots so that concurrent calls do not restart them too
+            for index, attempts in due:
+                self._restarts[index] = (attempts, math.inf)
+        for index, attempts in due:
+            fresh = self._restart(index, attempts)
+            if fresh is not None:
+                self._idle.put(fresh)
+
+    def _release(self, workers):
+        """Returns workers to the idle queue, replacing those whose pipe can no longer be trusted."""
+        for worker in workers:
+            if worker.broken:
+                worker = self._replace(worker)
+            if worker is not None:
+                self._idle.put(worker)
+
+    def health(self):
+        """
+        Reports the state of the pool in this process.
+
+        Returns:
+            dict: 'healthy' (False once every worker has failed and none could be restarted),
+            and the numbers of configured, running and restarting workers.
+        """
+        with self._lock:
+            started = self._pid == os.getpid()
+            running = len(self._handles) if started else 0
+            restarting = len(self._restarts) if started else 0
+        return {
+            'healthy': not started or running > 0,
+            'workers': self.workers,
+            'running': running,
+            'restarting': restarting
+        }
+
+    def close(self):
+        """Stops the worker processes."""
+        with self._lock:
+            if self._pid == os.getpid():
+                for handle in self._handles:
+                    handle.stop()
+            self._handles, self._idle, self._pid = [], None, None
+            self._restarts = {}
+
+    def _acquire(self, wanted):
+        """
+        Waits for one idle worker, then takes up to wanted - 1 more without waiting.
+
+        Raises:
+            RuntimeError: If no worker is running, or none becomes idle within reply_timeout.
+        """
+        self._retry_restarts()
+        deadline = time.monotonic() + self.reply_timeout
+        while True:
+            if not self._handles:
+                raise RuntimeError(f"No inference pool workers are running ({len(self._restarts)} restarting)")
+            try:
+                # Wake up now and then to notice a pool that has lost its last worker
+                taken = [self._idle.get(timeout=min(1.0, max(deadline - time.monotonic(), 0.01)))]
+                break
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"No inference pool worker became idle within {self.reply_timeout:.0f}s")
+        while len(taken) < wanted:
+            try:
+                taken.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        return taken
+
+    def __call__(self, inputs):
+        if self._pid != os.getpid():
+            self.start()
+        rows, width = inputs['input_ids'].shape
+        if width > self.capacity:
+            raise ValueError(f"Sequence length {width} exceeds the pool capacity of {self.capacity} tokens")
+        max_rows = self.capacity // width
+
+        workers = self._acquire(min(self.workers, rows))
+        try:
+            shard = min(max_rows, math.ceil(rows / len(workers)))
+            shards = [(start, min(start + shard, rows)) for start in range(0, rows, shard)]
+            logits = torch.empty((rows, self.num_labels), dtype=torch.float32)
+            while shards:
+                running = [(worker, shards.pop(0)) for worker in workers[:len(shards)]]
+                sent = []
+                error = None
+                try:
+                    for worker, (start, end) in running:
+                        worker.submit(inputs, start, end)
+                        sent.append((worker, start, end))
+                finally:
+                    # Read every reply that was asked for, even after a failure, so that no
+                    # worker goes back to the idle queue with a stale reply in its pipe
+                    for worker, start, end in sent:
+                        try:
+                            logits[start:end] = worker.result(end - start, self.reply_timeout)
+                        except RuntimeError as e:
+                            error = error or e
+                if error is not None:
+                    raise error
+            return logits
+        finally:
+            self._release(workers)
+
+
+def scaling_report(make_analyzer, worker_counts, texts, batch_size=256, repeats=3):
+    """
+    Measures pool throughput as the number of workers grows.
+
+    Args:
+        make_analyzer (callable): Builds a StockSentimentAnalyzer using a pool of the given size.
+        worker_counts (iterable): Pool sizes to measure.
+        texts (list): Texts scored in batches of batch_size.
+        batch_size (int): Rows per backend call, sharded across the workers.
+        repeats (int): Timed passes over texts, after one warm-up pass.
+
+    Returns:
+        dict: For each pool size, texts per second and the speedup over the first size.
+    """
+    report = {}
+    baseline = None
+    for workers in worker_counts:
+        analyzer = make_analyzer(workers)
+        batches = [analyzer.prepare_inputs(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        for batch in batches:
+            analyzer.backend(batch)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for batch in batches:
+                analyzer.backend(batch)
+        rate = len(texts) * repeats / (time.perf_counter() - start)
+        analyzer.backend.close()
+        baseline = baseline or rate
+        report[workers] = {
+            'texts_per_second': rate,
+            'speedup': rate / baseline,
+            'threads_per_worker': analyzer.backend.threads_per_worker
+        }
+    return report
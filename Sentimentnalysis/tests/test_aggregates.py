@@ -0,0 +1,98 @@
+"""
+Unit tests for the rolling per-symbol aggregates
+"""
+
+import math
+import unittest
+
+from src.aggregates import SymbolAggregates, normalize_symbol
+
+
+POSITIVE = {'positive': 0.8, 'negative': 0.1, 'neutral': 0.1}
+NEGATIVE = {'positive': 0.1, 'negative': 0.7, 'neutral': 0.2}
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSymbolAggregates(unittest.TestCase):
+    """Test cases for SymbolAggregates"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = SymbolAggregates(windows=(('1h', 3600, 60), ('1d', 86400, 96)), clock=self.clock)
+
+    def test_window_means(self):
+        """Test counts and means across windows, and symbol normalization"""
+        self.store.record('aapl ', [POSITIVE, NEGATIVE])
+        self.store.record('AAPL', [POSITIVE])
+
+        result = self.store.get('Aapl')
+
+        self.assertEqual(result['symbol'], 'AAPL')
+        self.assertEqual(result['articles_recorded'], 3)
+        hour = result['windows']['1h']
+        self.assertEqual(hour['count'], 3)
+        self.assertAlmostEqual(hour['mean']['positive'], 1.7 / 3)
+        self.assertEqual(hour['dominant_sentiment'], 'positive')
+        self.assertAlmostEqual(hour['decayed_mean']['negative'], 0.9 / 3)
+        self.assertIsNone(self.store.get('MSFT'))
+
+    def test_expiry(self):
+        """Test that articles leave a window once it has moved past their bucket"""
+        self.store.record('AAPL', [NEGATIVE])
+        self.clock.now += 1800
+        self.store.record('AAPL', [POSITIVE])
+        self.clock.now += 1860
+
+        result = self.store.get('AAPL')
+
+        self.assertEqual(result['windows']['1h']['count'], 1)
+        self.assertAlmostEqual(result['windows']['1h']['mean']['negative'], POSITIVE['negative'])
+        self.assertEqual(result['windows']['1d']['count'], 2)
+
+        self.clock.now += 10 * 86400
+        result = self.store.get('AAPL')
+        self.assertEqual(result['windows']['1d']['count'], 0)
+        self.assertIsNone(result['windows']['1d']['mean'])
+        self.assertEqual(result['articles_recorded'], 2)
+
+    def test_exponential_decay(self):
+        """Test that older articles weigh less in the decayed mean, with the window as time constant"""
+        self.store.record('AAPL', [NEGATIVE])
+        self.clock.now += 3600
+        self.store.record('AAPL', [POSITIVE])
+
+        decayed = self.store.get('AAPL')['windows']['1h']
+        old_weight = math.exp(-1)
+
+        self.assertAlmostEqual(decayed['decayed_weight'], 1 + old_weight)
+        self.assertAlmostEqual(decayed['decayed_mean']['positive'], (0.8 + 0.1 * old_weight) / (1 + old_weight))
+
+    def test_max_symbols(self):
+        """Test that the least recently updated symbol is dropped beyond max_symbols"""
+        store = SymbolAggregates(max_symbols=2, clock=self.clock)
+        store.record('A', [POSITIVE])
+        store.record('B', [POSITIVE])
+        store.record('A', [POSITIVE])
+        store.record('C', [POSITIVE])
+        store.record('', [POSITIVE])
+
+        self.assertEqual(store.symbols(), ['A', 'C'])
+
+    def test_normalize_symbol(self):
+        """Test that only short ticker-like symbols are accepted"""
+        for symbol, key in [(' brk.b ', 'BRK.B'), ('^gspc', '^GSPC'), ('EURUSD=X', 'EURUSD=X'), ('7203.T', '7203.T'),
+                            ('btc-usd', 'BTC-USD'), ('A' * 16, 'A' * 16)]:
+            self.assertEqual(normalize_symbol(symbol), key)
+        for symbol in ('', '  ', 'A' * 17, 'AAPL MSFT', 'AA\nPL', '<script>', '.A', '^', 'ÅPL', None, 42):
+            self.assertIsNone(normalize_symbol(symbol), symbol)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,375 @@
+"""
+In-process tests for the Flask application, with the FinBERT model mocked out
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from src.aggregates import SymbolAggregates
+from src.api import create_app
+from src.cache import ResultCache
+from src.history import SentimentHistory
+from src.metrics import Histogram, StageTimer
+from src.sentiment_analyzer import StockSentimentAnalyzer
+
+
+class FakeAnalyzer:
+    """Stands in for StockSentimentAnalyzer; scores depend only on input length"""
+
+    def __init__(self, **kwargs):
+        self.calls = []
+        self.batch_size = 2
+        self.tokenizer = SimpleNamespace(vocab_size=30522)
+        self.timer = StageTimer()
+        self.batch_sizes = Histogram()
+        self.sequence_lengths = Histogram()
+        self.cache = ResultCache()
+        self.token_cache = ResultCache()
+        self.disk_cache = None
+        self.near_duplicates = None
+        self.aggregates = SymbolAggregates()
+        self.history = None
+
+    @staticmethod
+    def _scores(size):
+        positive = 0.6 if size % 2 else 0.2
+        return {'positive': positive, 'negative': 0.1, 'neutral': round(0.9 - positive, 6)}
+
+    def analyze_batch(self, texts, batch_size=None, stats=None):
+        self.calls.append(('analyze_batch', list(texts)))
+        return [self._scores(len(text)) for text in texts]
+
+    def analyze_token_ids(self, id_lists, batch_size=None):
+        self.calls.append(('analyze_token_ids', id_lists))
+        return [self._scores(len(ids)) for ids in id_lists]
+
+    def analyze_long_documents(self, texts, stride=128, aggregation='mean', batch_size=None, stats=None):
+        self.calls.append(('analyze_long_documents', list(texts), aggregation))
+        return [self._scores(len(text)) for text in texts]
+
+    def warmup(self, lengths, batch_sizes, callback=None):
+        total = len(lengths) * len(batch_sizes)
+        for done in range(1, total + 1):
+            callback(done, total)
+
+    def get_stock_sentiment(self, symbol, news_articles, long_document=False, aggregation='mean', stats=None):
+        if long_document:
+            results = self.analyze_long_documents(news_articles, aggregation=aggregation)
+        else:
+            results = self.analyze_batch(news_articles)
+        self.record_results(symbol, news_articles, results)
+        return results
+
+    record_results = StockSentimentAnalyzer.record_results
+
+
+class TestFlaskApp(unittest.TestCase):
+    """Test cases for the Flask routes"""
+
+    def setUp(self):
+        """Create an app whose analyzer is a FakeAnalyzer"""
+        self.analyzer = FakeAnalyzer()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for patcher in (patch('src.api.StockSentimentAnalyzer', return_value=self.analyzer),
+                        patch.dict(os.environ, {'SENTIMENT_LOAD_MODE': 'eager', 'SENTIMENT_JOB_DIR': self.tmpdir.name})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    def test_analyze_text(self):
+        """Test that /analyze scores a text through the batcher"""
+        response = self.client.post('/analyze', json={"text": "Apple beats"})
+
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result["text"], "Apple beats")
+        self.assertEqual(result["dominant_sentiment"], "positive")
+
+    def test_symbol_sentiment(self):
+        """Test that /sentiment/<symbol> reads the aggregates of earlier /analyze-stock requests"""
+        self.assertEqual(self.client.get('/sentiment/AAPL').status_code, 404)
+        self.client.post('/analyze-stock', json={"symbol": "AAPL", "news_articles": ["odd", "even"]})
+        self.client.post('/analyze-stock', json={"symbol": "aapl", "news_token_ids": [[101, 102]]})
+        self.analyzer.calls.clear()
+
+        response = self.client.get('/sentiment/aapl')
+
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result["symbol"], "AAPL")
+        self.assertEqual(result["articles_recorded"], 3)
+        self.assertEqual(result["windows"]["1h"]["count"], 3)
+        self.assertAlmostEqual(result["windows"]["7d"]["mean"]["positive"], (0.6 + 0.2 + 0.2) / 3)
+        self.assertEqual(self.analyzer.calls, [])
+
+    def test_rejects_junk_symbols(self):
+        """Test that symbols that cannot be tickers are rejected before anything is scored or stored"""
+        for symbol in ("x" * 17, "AAPL; DROP", "", 42):
+            response = self.client.post('/analyze-stock', json={"symbol": symbol, "news_articles": ["odd"]})
+            self.assertEqual(response.status_code, 400, symbol)
+            self.assertIn("'symbol' must be up to 16", response.get_json()["error"])
+            response = self.client.post('/analyze-stock', json={"symbol": symbol, "news_token_ids": [[101, 102]]})
+            self.assertEqual(response.status_code, 400, symbol)
+        self.assertEqual(self.analyzer.calls, [])
+        self.assertEqual(len(self.analyzer.aggregates), 0)
+
+        self.assertEqual(self.client.get('/sentiment/' + 'x' * 17).status_code, 400)
+        self.assertEqual(self.client.post('/analyze-stock', json={"news_articles": ["odd"]}).status_code, 200)
+        self.assertEqual(self.analyzer.aggregates.symbols(), ['UNKNOWN'])
+
+    def test_symbol_history(self):
+        """Test that /history/<symbol> downsamples stored articles without running the model"""
+        self.assertEqual(self.client.get('/history/AAPL').status_code, 404)
+        self.analyzer.history = SentimentHistory(os.path.join(self.tmpdir.name, 'history.db'))
+        self.client.post('/analyze-stock', json={"symbol": "AAPL", "news_articles": ["odd", "even", "odd"]})
+        self.analyzer.calls.clear()
+
+        now = time.time()
+        response = self.client.get(f'/history/aapl?start={now - 600}&interval=1d')
+
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result["symbol"], "AAPL")
+        self.assertEqual(result["interval_seconds"], 86400)
+        self.assertEqual([point["count"] for point in result["points"]], [3])
+        self.assertEqual(result["points"][0]["dominant_sentiment"], "positive")
+        self.assertEqual(self.analyzer.calls, [])
+
+        response = self.client.get('/history/AAPL?start=2024-01-01T00:00:00Z&end=2024-01-02&interval=1m')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["points"], [])
+        self.assertEqual(self.client.get('/history/AAPL?start=2024-01-01&end=2025-01-01&interval=1m').status_code, 400)
+        response = self.client.get('/history/AAPL?interval=1m')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([point["count"] for point in response.get_json()["points"]], [3])
+        self.assertEqual(self.client.get('/history/AAPL?interval=soon').status_code, 400)
+        self.assertEqual(self.client.get('/history/AAPL$').status_code, 400)
+        for query in ('interval=nan', 'interval=inf', 'start=nan', 'end=inf', 'start=-inf'):
+            response = self.client.get(f'/history/AAPL?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("error", response.get_json())
+
+    def test_metrics(self):
+        """Test that /metrics exposes request, stage and cache metrics in Prometheus format"""
+        self.analyzer.timer.record('forward', 0.02, items=4)
+        self.client.post('/analyze', json={"text": "Apple beats"})
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('sentiment_model_ready 1', text)
+        self.assertIn('sentiment_request_seconds_count{endpoint="analyze_single"} 1', text)
+        self.assertIn('sentiment_responses_total{endpoint="analyze_single",status="200"} 1', text)
+        self.assertIn('sentiment_stage_seconds_bucket{stage="forward",le="0.025"} 1', text)
+        self.assertIn('sentiment_cache_hit_ratio{cache="result"} 0.0', text)
+        self.assertIn('sentiment_batcher_queue_depth 0', text)
+        self.assertRegex(text, r'sentiment_serialize_seconds_count [1-9]')
+
+    def test_analyze_token_ids(self):
+        """Test that /analyze accepts pre-tokenized input"""
+        response = self.client.post('/analyze', json={"input_ids": [101, 2000, 102]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.get_json()), {"sentiment_scores", "dominant_sentiment", "confidence"})
+
+        response = self.client.post('/analyze', json={"input_ids": ["101"]})
+        self.assertEqual(response.status_code, 400)
+
+        for ids in ([101, 30522, 102], [101, -1, 102]):
+            response = self.client.post('/analyze', json={"input_ids": ids})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("from 0 to 30521", response.get_json()["error"])
+
+    def test_analyze_stock_token_ids(self):
+        """Test that /analyze-stock accepts pre-tokenized articles"""
+        response = self.client.post('/analyze-stock', json={
+            "symbol": "AAPL",
+            "news_token_ids": [[101, 102], [101, 7, 102]]
+        })
+
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result["articles_analyzed"], 2)
+        self.assertEqual(len(result["individual_sentiments"]), 2)
+
+        response = self.client.post('/analyze-stock', json={"news_token_ids": [[]]})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/analyze-stock', json={"news_token_ids": [[101, 102], [101, 10 ** 6, 102]]})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(('analyze_token_ids', [[101, 102], [101, 10 ** 6, 102]]), self.analyzer.calls)
+
+    def test_analyze_stock_stream(self):
+        """Test that a streamed /analyze-stock emits one line per article and a matching summary"""
+        articles = ["first article", "second", "third one", "4th", "fifth"]
+        expected = self.client.post('/analyze-stock', json={"symbol": "AAPL", "news_articles": articles}).get_json()
+        self.analyzer.calls.clear()
+
+        response = self.client.post('/analyze-stock', json={"symbol": "AAPL", "news_articles": articles, "stream": True})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([line["index"] for line in lines[:-1]], [0, 1, 2, 3, 4])
+        self.assertEqual([line["sentiment_scores"] for line in lines[:-1]], expected["individual_sentiments"])
+        summary = lines[-1]
+        self.assertEqual(summary["type"], "summary")
+        self.assertEqual(summary["aggregate_sentiment"], expected["aggregate_sentiment"])
+        self.assertEqual(summary["articles_analyzed"], 5)
+        # Scored in batches of the analyzer's batch size
+        self.assertEqual([len(call[1]) for call in self.analyzer.calls], [2, 2, 1])
+
+        response = self.client.post('/analyze-stock', json={"news_articles": ["x"]},
+                                    headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(self.client.post('/analyze-stock', json={"news_articles": [], "stream": True}).status_code, 400)
+
+    def test_bulk_job(self):
+        """Test submitting a JSONL corpus, polling the job and downloading its results"""
+        corpus = '\n'.join(json.dumps({"id": i, "text": f"article {i}"}) for i in range(5))
+        response = self.client.post('/jobs', data=corpus, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["id"]
+        self.assertEqual(response.headers["Location"], f"/jobs/{job_id}")
+
+        deadline = time.monotonic() + 10
+        while self.client.get(f'/jobs/{job_id}').get_json()["status"] != "completed":
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.02)
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status["progress"], {"done": 5, "total": 5, "percent": 100.0})
+
+        response = self.client.get(f'/jobs/{job_id}/results')
+        self.assertEqual(response.headers["X-Job-Status"], "completed")
+        results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([r["id"] for r in results], [0, 1, 2, 3, 4])
+        response.close()
+
+        self.assertEqual(self.client.get('/jobs/0123').status_code, 404)
+        self.assertEqual(self.client.post('/jobs', data='').status_code, 400)
+
+    def test_analyze_portfolio(self):
+        """Test that an article shared across symbols is scored once and credited to each symbol"""
+        response = self.client.post('/analyze-portfolio', json={"portfolio": [
+            {"symbol": "AAPL", "news_articles": ["Fed raises rates", "Apple beats"]},
+            {"symbol": "MSFT", "news_articles": ["Fed  raises rates ", "Azure grows"]}
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.analyzer.calls, [('analyze_batch', ["Fed raises rates", "Apple beats", "Azure grows"])])
+        result = response.get_json()
+        self.assertEqual(result["symbols_analyzed"], 2)
+        self.assertEqual(result["articles_analyzed"], 4)
+        self.assertEqual(result["unique_articles_scored"], 3)
+        self.assertEqual(result["duplicate_articles_skipped"], 1)
+        self.assertEqual(result["near_duplicates"], 0)
+        self.assertEqual([r["symbol"] for r in result["results"]], ["AAPL", "MSFT"])
+        aapl, msft = result["results"]
+        self.assertEqual(aapl["individual_sentiments"][0], msft["individual_sentiments"][0])
+        self.assertEqual(aapl["individual_sentiments"][1]["positive"], 0.6)
+        self.assertEqual(self.analyzer.aggregates.get('MSFT')["articles_recorded"], 2)
+
+        for body in ({}, {"portfolio": []}, {"portfolio": [{"news_articles": ["x"]}]},
+                     {"portfolio": [{"symbol": "A", "news_articles": ["x"]}, {"symbol": "a", "news_articles": ["y"]}]},
+                     {"portfolio": [{"symbol": "A", "news_articles": ["x", " "]}]},
+                     {"portfolio": [{"symbol": "A" * 17, "news_articles": ["x"]}]}):
+            self.assertEqual(self.client.post('/analyze-portfolio', json=body).status_code, 400)
+
+    def test_compact_responses(self):
+        """Test that compact responses drop the echoed text and return scores as parallel arrays"""
+        result = self.client.post('/analyze', json={"text": "Apple beats", "compact": True}).get_json()
+        self.assertNotIn("text", result)
+        self.assertEqual(result["dominant_sentiment"], "positive")
+
+        result = self.client.post('/analyze-stock', json={
+            "symbol": "AAPL", "news_articles": ["odd", "even", "x"], "compact": True
+        }).get_json()
+        self.assertNotIn("individual_sentiments", result)
+        self.assertEqual(result["scores"], {"positive": [0.6, 0.2, 0.6], "negative": [0.1, 0.1, 0.1],
+                                            "neutral": [0.3, 0.7, 0.3]})
+        self.assertAlmostEqual(result["aggregate_sentiment"]["positive"], 1.4 / 3)
+
+        result = self.client.post('/analyze-portfolio', json={
+            "portfolio": [{"symbol": "AAPL", "news_articles": ["odd"]}], "compact": True
+        }).get_json()
+        self.assertEqual(result["results"][0]["scores"]["positive"], [0.6])
+
+    def test_gzip_large_responses(self):
+        """Test that large bodies are gzipped only for clients that accept it"""
+        body = {"symbol": "AAPL", "news_articles": [f"article {i}" for i in range(100)]}
+        response = self.client.post('/analyze-stock', json=body, headers={'Accept-Encoding': 'gzip, br'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.data))["articles_analyzed"], 100)
+
+        response = self.client.post('/analyze-stock', json=body)
+        self.assertNotIn('Content-Encoding', response.headers)
+        response = self.client.post('/analyze', json={"text": "short"}, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_long_document_mode(self):
+        """Test that long_document routes articles to windowed scoring"""
+        response = self.client.post('/analyze-stock', json={
+            "news_articles": ["first article", "second"],
+            "long_document": True,
+            "aggregation": "weighted"
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.analyzer.calls[-1], ('analyze_long_documents', ["first article", "second"], 'weighted'))
+        self.assertEqual(response.get_json()["near_duplicates"], 0)
+
+        response = self.client.post('/analyze', json={"text": "x", "long_document": True, "aggregation": "median"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_health_probes(self):
+        """Test liveness and readiness once warm-up has completed"""
+        self.assertEqual(self.client.get('/health/live').status_code, 200)
+
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result["status"], "ready")
+        self.assertEqual(result["warmup_progress"], {"done": 10, "total": 10})
+        self.assertIsNone(result["backend"])
+        self.assertEqual(self.client.get('/').get_json()["model_status"], "ready")
+
+        # A pool that has lost all its workers is not ready
+        self.analyzer.backend = SimpleNamespace(health=lambda: {'healthy': False, 'workers': 2, 'running': 0})
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()["backend"]["running"], 0)
+
+    def test_not_ready_before_model_loads(self):
+        """Test that model endpoints answer 503 while the model is loading"""
+        state = self.app.extensions['model_state']
+        state.analyzer, state.status = None, state.LOADING
+
+        self.assertEqual(self.client.get('/health/live').status_code, 200)
+        self.assertEqual(self.client.get('/health/ready').status_code, 503)
+        self.assertEqual(self.client.post('/analyze', json={"text": "Apple beats"}).status_code, 503)
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_error_handling(self):
+        """Test the validation errors of both analysis endpoints"""
+        self.assertEqual(self.client.post('/analyze', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/analyze', json={"text": 123}).status_code, 400)
+        self.assertEqual(self.client.post('/analyze-stock', json={"symbol": "AAPL"}).status_code, 400)
+        self.assertEqual(self.client.post('/analyze-stock', json={"news_articles": []}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
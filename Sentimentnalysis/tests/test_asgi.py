@@ -0,0 +1,228 @@
+"""
+In-process tests for the ASGI application, with the FinBERT model mocked out
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.asgi import create_asgi_app
+from src.history import SentimentHistory
+from tests.test_app import FakeAnalyzer
+
+
+def call(app, method, path, payload=None, headers=None, response_headers=None):
+    """
+    Sends one HTTP request through the ASGI app and returns the status and decoded body.
+
+    Extra request headers are given as a dict; the response headers are copied into
+    response_headers if it is given.
+    """
+    body = json.dumps(payload).encode() if payload is not None else b''
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(b'content-type', b'application/json')] +
+                        [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+    messages = [{'type': 'http.request', 'body': body[:5], 'more_body': True},
+                {'type': 'http.request', 'body': body[5:], 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if not messages:
+            # The client stays connected
+            await asyncio.Future()
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *chunks = sent
+    headers = dict(start['headers'])
+    assert headers[b'access-control-allow-origin'] == b'*'
+    body = b''.join(chunk['body'] for chunk in chunks)
+    if response_headers is not None:
+        response_headers.update((name.decode(), value.decode()) for name, value in start['headers'])
+    if headers.get(b'content-encoding') == b'gzip':
+        body = gzip.decompress(body)
+    if headers[b'content-type'].startswith(b'text/plain'):
+        return start['status'], body.decode()
+    if headers[b'content-type'] == b'application/x-ndjson':
+        return start['status'], [json.loads(line) for line in body.splitlines()]
+    return start['status'], json.loads(body) if body else None
+
+
+class TestAsgiApp(unittest.TestCase):
+    """Test cases for the ASGI routes"""
+
+    def setUp(self):
+        """Create an app whose analyzer is a FakeAnalyzer"""
+        self.analyzer = FakeAnalyzer()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for patcher in (patch('src.api.StockSentimentAnalyzer', return_value=self.analyzer),
+                        patch.dict(os.environ, {'SENTIMENT_LOAD_MODE': 'eager', 'SENTIMENT_JOB_DIR': self.tmpdir.name})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = create_asgi_app()
+
+    def test_analyze_text(self):
+        """Test that /analyze scores a text through the batcher"""
+        status, result = call(self.app, 'POST', '/analyze', {"text": "Apple beats"})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(result["dominant_sentiment"], "positive")
+        self.assertEqual(self.analyzer.calls, [('analyze_batch', ["Apple beats"])])
+
+    def test_symbol_sentiment(self):
+        """Test that /sentiment/<symbol> answers from the rolling aggregates"""
+        call(self.app, 'POST', '/analyze-stock', {"symbol": "MSFT", "news_articles": ["odd"]})
+
+        status, result = call(self.app, 'GET', '/sentiment/msft')
+        self.assertEqual(status, 200)
+        self.assertEqual(result["windows"]["1d"]["dominant_sentiment"], "positive")
+        self.assertEqual(call(self.app, 'GET', '/sentiment/NONE')[0], 404)
+
+    def test_symbol_history(self):
+        """Test that /history/<symbol> reads the query string and the stored articles"""
+        self.analyzer.history = SentimentHistory(os.path.join(self.tmpdir.name, 'history.db'))
+        call(self.app, 'POST', '/analyze-stock', {"symbol": "MSFT", "news_articles": ["odd", "even"]})
+
+        status, result = call(self.app, 'GET', '/history/MSFT?interval=1w')
+        self.assertEqual(status, 200)
+        self.assertEqual(result["interval_seconds"], 604800)
+        self.assertEqual(result["articles"], 2)
+        self.assertEqual(call(self.app, 'GET', '/history/MSFT?start=10&end=5')[0], 400)
+
+    def test_metrics(self):
+        """Test that /metrics is served as Prometheus text and counts requests"""
+        call(self.app, 'POST', '/analyze', {"text": "Apple beats"})
+        status, text = call(self.app, 'GET', '/metrics')
+
+        self.assertEqual(status, 200)
+        self.assertIn('sentiment_request_seconds_count{endpoint="analyze_single"} 1', text)
+        self.assertIn('# TYPE sentiment_batch_size histogram', text)
+
+    def test_analyze_stock_runs_on_executor(self):
+        """Test that /analyze-stock answers like the Flask app, with the model call off the loop"""
+        status, result = call(self.app, 'POST', '/analyze-stock', {
+            "symbol": "AAPL",
+            "news_articles": ["first article", "second"],
+            "long_document": True
+        })
+
+        self.assertEqual(status, 200)
+        self.assertEqual(result["articles_analyzed"], 2)
+        self.assertEqual(self.analyzer.calls[-1][0], 'analyze_long_documents')
+        self.assertIsNotNone(self.app._executor)
+
+    def test_analyze_portfolio(self):
+        """Test that /analyze-portfolio scores the distinct articles of all symbols in one model call"""
+        status, result = call(self.app, 'POST', '/analyze-portfolio', {"portfolio": [
+            {"symbol": "AAPL", "news_articles": ["shared", "first"]},
+            {"symbol": "MSFT", "news_articles": ["shared"]}
+        ]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(result["unique_articles_scored"], 2)
+        self.assertEqual(self.analyzer.calls[-1], ('analyze_batch', ["shared", "first"]))
+        self.assertEqual(call(self.app, 'POST', '/analyze-portfolio', {"portfolio": {}})[0], 400)
+
+    def test_compact_gzip_response(self):
+        """Test that a compact /analyze-stock body is gzipped for a client that accepts it"""
+        response_headers = {}
+        status, result = call(self.app, 'POST', '/analyze-stock', {
+            "symbol": "AAPL",
+            "news_articles": [f"article {i}" for i in range(400)],
+            "compact": True
+        }, headers={'Accept-Encoding': 'gzip'}, response_headers=response_headers)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(response_headers['content-encoding'], 'gzip')
+        self.assertEqual(response_headers['vary'], 'Accept, Accept-Encoding')
+        self.assertEqual(len(result["scores"]["neutral"]), 400)
+        self.assertNotIn("individual_sentiments", result)
+
+        status, result = call(self.app, 'POST', '/analyze', {"text": "Apple beats", "compact": True})
+        self.assertNotIn("text", result)
+
+    def test_analyze_stock_stream(self):
+        """Test that a streamed /analyze-stock sends each batch as it is scored"""
+        status, lines = call(self.app, 'POST', '/analyze-stock', {
+            "symbol": "AAPL",
+            "news_articles": ["first article", "second", "third"],
+            "stream": True
+        })
+
+        self.assertEqual(status, 200)
+        self.assertEqual([line["type"] for line in lines], ["article"] * 3 + ["summary"])
+        self.assertEqual(lines[-1]["articles_analyzed"], 3)
+        self.assertEqual(len(self.analyzer.calls), 2)
+
+    def test_errors_and_routing(self):
+        """Test validation errors, unknown routes and wrong methods"""
+        self.assertEqual(call(self.app, 'POST', '/analyze', {}),
+                         (400, {"error": "Missing 'text' field in request body"}))
+        self.assertEqual(call(self.app, 'POST', '/analyze-stock', {"news_articles": []})[0], 400)
+        self.assertEqual(call(self.app, 'POST', '/analyze', {"input_ids": [101, 30522, 102]})[0], 400)
+        self.assertEqual(call(self.app, 'POST', '/analyze-stock', {"news_token_ids": [[101, -5, 102]]})[0], 400)
+        self.assertEqual(call(self.app, 'GET', '/missing')[0], 404)
+        self.assertEqual(call(self.app, 'GET', '/analyze')[0], 405)
+        self.assertEqual(call(self.app, 'OPTIONS', '/analyze')[0], 200)
+
+    def upload(self, chunks, disconnect=False):
+        """Streams a job corpus to POST /jobs in chunks; returns the sent messages"""
+        scope = {'type': 'http', 'method': 'POST', 'path': '/jobs', 'query_string': b'', 'headers': []}
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+        messages.append({'type': 'http.disconnect'} if disconnect else {'type': 'http.request', 'body': b''})
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.app(scope, receive, send))
+        return sent
+
+    def job_dirs(self):
+        return [name for name in os.listdir(self.tmpdir.name) if len(name) == 32]
+
+    def test_jobs(self):
+        """Test a chunked job upload, its status and results, and that an aborted upload leaves nothing behind"""
+        self.upload([b'"Apple beats"\n"Shares', b' fell"\n'], disconnect=True)
+        self.assertEqual(self.job_dirs(), [])
+
+        sent = self.upload([b'"Apple beats"\n"Shares', b' fell"\n'])
+        self.assertEqual(sent[0]['status'], 202)
+        job = json.loads(sent[1]['body'])
+        self.assertEqual(job['total'], 2)
+        self.assertEqual(self.job_dirs(), [job['id']])
+
+        status, result = call(self.app, 'GET', f"/jobs/{job['id']}")
+        self.assertEqual((status, result['id']), (200, job['id']))
+        status, results = call(self.app, 'GET', f"/jobs/{job['id']}/results")
+        self.assertEqual(status, 200)
+        self.assertLessEqual(len(results), 2)
+        self.assertEqual(call(self.app, 'GET', f"/jobs/{'0' * 32}")[0], 404)
+
+        self.assertEqual(self.upload([b'\n\n'])[0]['status'], 400)
+        self.assertEqual(self.job_dirs(), [job['id']])
+
+    def test_health_probes(self):
+        """Test liveness, readiness and the 503 answer while the model is loading"""
+        self.assertEqual(call(self.app, 'GET', '/health/ready')[0], 200)
+
+        self.app.state.analyzer, self.app.state.status = None, self.app.state.LOADING
+        self.assertEqual(call(self.app, 'GET', '/health/live')[0], 200)
+        self.assertEqual(call(self.app, 'GET', '/health/ready')[0], 503)
+        self.assertEqual(call(self.app, 'POST', '/analyze', {"text": "Apple beats"})[0], 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Unit tests for the inference backends, using a tiny randomly initialized BERT
+"""
+
+import copy
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import torch
+from transformers import BertConfig, BertForSequenceClassification
+
+from src.backends import (
+    TorchBackend, compare_outputs, create_backend, export_onnx, model_size_mb
+)
+
+
+def make_tiny_model():
+    """Builds a small BERT classifier with FinBERT's three labels"""
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=100, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64, num_labels=3)
+    return BertForSequenceClassification(config).eval()
+
+
+def make_inputs(lengths):
+    """Builds padded model inputs for rows of the given lengths"""
+    width = max(lengths)
+    input_ids = torch.zeros((len(lengths), width), dtype=torch.long)
+    attention_mask = torch.zeros_like(input_ids)
+    for row, length in enumerate(lengths):
+        input_ids[row, :length] = torch.randint(1, 100, (length,))
+        attention_mask[row, :length] = 1
+    return {'input_ids': input_ids, 'attention_mask': attention_mask, 'token_type_ids': torch.zeros_like(input_ids)}
+
+
+class TestBackends(unittest.TestCase):
+    """Test cases for the backend implementations"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = make_tiny_model()
+        cls.reference = TorchBackend(cls.model)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def assert_matches_eager(self, backend):
+        """Checks a backend against eager torch on batches of several shapes"""
+        for lengths in ([5], [3, 17, 9], [30] * 4):
+            inputs = make_inputs(lengths)
+            expected = torch.softmax(self.reference(inputs), dim=1)
+            actual = torch.softmax(backend(inputs).float(), dim=1)
+            report = compare_outputs(expected, actual)
+            self.assertLess(report['max_abs_diff'], 1e-4)
+            self.assertEqual(report['label_agreement'], 1.0)
+
+    def test_torchscript_backend(self):
+        """Test that a traced graph reproduces eager outputs and can be reloaded"""
+        path = os.path.join(self.tmpdir.name, 'model.pt')
+
+        self.assert_matches_eager(create_backend('torchscript', self.model, path))
+        self.assertTrue(os.path.exists(path))
+        self.assert_matches_eager(create_backend('torchscript', None, path))
+
+    @unittest.skipUnless(importlib.util.find_spec('onnxruntime'), "onnxruntime is not installed")
+    def test_onnx_backend(self):
+        """Test that the exported ONNX graph reproduces eager outputs with dynamic shapes"""
+        path = export_onnx(self.model, os.path.join(self.tmpdir.name, 'model.onnx'))
+
+        self.assert_matches_eager(create_backend('onnx', None, path))
+
+    def test_int8_precision(self):
+        """Test that dynamic int8 quantization shrinks the model and stays close to fp32"""
+        model = copy.deepcopy(self.model)
+        backend = create_backend('torch', model, precision='int8')
+
+        self.assertEqual(backend.precision, 'int8')
+        self.assertLess(model_size_mb(backend.model), model_size_mb(self.model))
+        inputs = make_inputs([7, 12])
+        report = compare_outputs(torch.softmax(self.reference(inputs), dim=1),
+                                 torch.softmax(backend(inputs).float(), dim=1))
+        self.assertLess(report['max_abs_diff'], 1e-2)
+
+    def test_bf16_precision_falls_back_without_cpu_support(self):
+        """Test that bf16 is only used when the CPU supports it"""
+        with patch('src.backends.bf16_supported', return_value=False):
+            self.assertEqual(create_backend('torch', self.model, precision='bf16').precision, 'fp32')
+        with patch('src.backends.bf16_supported', return_value=True):
+            backend = create_backend('torch', self.model, precision='bf16')
+
+        self.assertEqual(backend.precision, 'bf16')
+        inputs = make_inputs([7, 12])
+        report = compare_outputs(torch.softmax(self.reference(inputs), dim=1),
+                                 torch.softmax(backend(inputs).float(), dim=1))
+        self.assertLess(report['max_abs_diff'], 5e-2)
+
+    def test_unknown_backend(self):
+        """Test that invalid backend settings are rejected"""
+        with self.assertRaises(ValueError):
+            create_backend('tensorrt', self.model)
+        with self.assertRaises(ValueError):
+            create_backend('onnx', self.model)
+        with self.assertRaises(ValueError):
+            create_backend('onnx', self.model, 'model.onnx', precision='int8')
+        with self.assertRaises(ValueError):
+            create_backend('torch', self.model, precision='fp8')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Unit tests for offline batch scoring, with the FinBERT model mocked out
+"""
+
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.batch_scoring import detect_format, score_file
+from tests.test_app import FakeAnalyzer
+
+
+class TestBatchScoring(unittest.TestCase):
+    """Test cases for score_file"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.analyzer = FakeAnalyzer()
+        patcher = patch('src.batch_scoring.StockSentimentAnalyzer', return_value=self.analyzer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_csv_to_jsonl(self):
+        """Test that records are scored in chunks and written in order, with bad records flagged"""
+        with open(self.path('in.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'headline'])
+            writer.writerows([[1, 'Apple beats'], [2, 'Shares fell'], [3, ''], [4, 'Guidance cut']])
+
+        summary = score_file(self.path('in.csv'), self.path('out.jsonl'), chunk_size=2,
+                             text_column='headline', progress_interval=0)
+
+        self.assertEqual(summary['records'], 4)
+        with open(self.path('out.jsonl')) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['id'] for row in rows], ['1', '2', '3', '4'])
+        self.assertNotIn('headline', rows[0])
+        self.assertEqual(rows[0]['dominant_sentiment'], 'positive')
+        self.assertIn('error', rows[2])
+        self.assertEqual([len(call[1]) for call in self.analyzer.calls], [2, 1])
+
+    def test_jsonl_to_csv(self):
+        """Test JSONL input with bare strings and objects, and CSV output keeping the text"""
+        with open(self.path('in.jsonl'), 'w') as f:
+            f.write('"Apple beats"\n\n{"symbol": "MSFT", "text": "Shares fell"}\nnot json\n5\n["a"]\n')
+
+        score_file(self.path('in.jsonl'), self.path('out.csv'), keep_text=True, progress_interval=0)
+
+        with open(self.path('out.csv'), newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['text'] for row in rows], ['Apple beats', 'Shares fell', '', '', ''])
+        self.assertEqual(rows[1]['symbol'], 'MSFT')
+        self.assertEqual(rows[2]['error'], "Line is not valid JSON")
+        self.assertEqual(rows[3]['error'], "Each line must be a string or an object")
+        self.assertEqual(rows[4]['error'], "Each line must be a string or an object")
+        self.assertEqual(float(rows[0]['positive']), FakeAnalyzer._scores(len('Apple beats'))['positive'])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        """Test Parquet input and output"""
+        import pyarrow
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(pyarrow.table({'id': [1, 2], 'text': ['Apple beats', 'Shares fell']}),
+                                    self.path('in.parquet'))
+        score_file(self.path('in.parquet'), self.path('out.parquet'), progress_interval=0)
+
+        rows = pyarrow.parquet.read_table(self.path('out.parquet')).to_pylist()
+        self.assertEqual([row['id'] for row in rows], [1, 2])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_parquet_errors_after_first_chunk(self):
+        """Test that the Parquet schema holds scores and errors whichever the first chunk has"""
+        import pyarrow.parquet
+
+        for lines in (['"Apple beats"', '"Shares fell"', '{"id": 3}', '5'],
+                      ['{"id": 1}', 'not json', '"Apple beats"', '"Shares fell"']):
+            with open(self.path('in.jsonl'), 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            score_file(self.path('in.jsonl'), self.path('out.parquet'), chunk_size=2, progress_interval=0)
+
+            table = pyarrow.parquet.read_table(self.path('out.parquet'))
+            self.assertEqual(str(table.schema.field('positive').type), 'double')
+            self.assertEqual(str(table.schema.field('error').type), 'string')
+            rows = table.to_pylist()
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(sum(row['error'] is None for row in rows), 2)
+            self.assertEqual(sum(row['positive'] is not None for row in rows), 2)
+
+    def test_detect_format(self):
+        """Test that formats follow the file extension"""
+        self.assertEqual(detect_format('a/b.CSV'), 'csv')
+        self.assertEqual(detect_format('b.ndjson'), 'jsonl')
+        with self.assertRaises(ValueError):
+            detect_format('b.xlsx')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Unit tests for the MicroBatcher scheduler
+"""
+
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+from src.api import create_batcher
+from src.batching import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """Test cases for the MicroBatcher class"""
+
+    def setUp(self):
+        """Set up a score function that records the batches it receives"""
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+        def score_fn(texts):
+            self.release.wait()
+            self.batches.append(list(texts))
+            return [text.upper() for text in texts]
+
+        self.score_fn = score_fn
+
+    def test_single_request(self):
+        """Test that a lone request is scored after the wait expires"""
+        batcher = MicroBatcher(self.score_fn, max_batch_size=8, max_wait_ms=1)
+
+        self.assertEqual(batcher.analyze("apple", timeout=5), "APPLE")
+        self.assertEqual(self.batches, [["apple"]])
+
+    def test_concurrent_requests_share_a_batch(self):
+        """Test that queued requests are coalesced and each caller gets its own row"""
+        batcher = MicroBatcher(self.score_fn, max_batch_size=4, max_wait_ms=50)
+
+        # Hold the worker on the first batch so the rest queue up behind it
+        self.release.clear()
+        first = batcher.submit("t0")
+        futures = [batcher.submit(f"t{i}") for i in range(1, 9)]
+        self.release.set()
+
+        self.assertEqual(first.result(timeout=5), "T0")
+        for i, future in enumerate(futures, start=1):
+            self.assertEqual(future.result(timeout=5), f"T{i}")
+
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+        self.assertLess(len(self.batches), 9)
+
+    def test_errors_are_propagated_to_every_caller(self):
+        """Test that a failing batch raises in each waiting caller"""
+        def failing_score_fn(texts):
+            raise RuntimeError("model failure")
+
+        batcher = MicroBatcher(failing_score_fn, max_batch_size=4, max_wait_ms=1)
+
+        with self.assertRaises(RuntimeError):
+            batcher.analyze("apple", timeout=5)
+
+        # The worker keeps serving after a failed batch
+        with self.assertRaises(RuntimeError):
+            batcher.analyze("apple", timeout=5)
+
+    def test_create_batcher_reads_environment(self):
+        """Test that the app's batcher is configured through SENTIMENT_* variables"""
+        with patch.dict(os.environ, {'SENTIMENT_MAX_BATCH_SIZE': '8', 'SENTIMENT_MAX_BATCH_WAIT_MS': '2'}):
+            batcher = create_batcher(None)
+
+        self.assertEqual(batcher.max_batch_size, 8)
+        self.assertEqual(batcher.max_wait, 0.002)
+
+
+if __name__ == '__main__':
+    unittest.main()
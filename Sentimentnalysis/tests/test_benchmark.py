@@ -0,0 +1,67 @@
+"""
+Unit tests for the offline benchmark suite
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from src.benchmark import build_stand_in_model, compare_results, make_texts, run_benchmarks
+from src.sentiment_analyzer import StockSentimentAnalyzer
+
+
+TINY_SHAPE = {'hidden_size': 32, 'num_hidden_layers': 1, 'num_attention_heads': 2, 'intermediate_size': 64}
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test cases for the stand-in model, the benchmark grid and result comparison"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model = os.path.join(cls.tmpdir.name, 'stand-in')
+        cls.manifest = build_stand_in_model(cls.model, **TINY_SHAPE)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_stand_in_is_reproducible(self):
+        """Test that the same seed writes identical weights"""
+        other = build_stand_in_model(os.path.join(self.tmpdir.name, 'again'), **TINY_SHAPE)
+
+        self.assertEqual(other['files']['weights.safetensors']['sha256'],
+                         self.manifest['files']['weights.safetensors']['sha256'])
+        with open(os.path.join(self.model, 'config.json')) as f:
+            self.assertEqual(json.load(f)['vocab_size'], 30522)
+
+    def test_make_texts_lengths(self):
+        """Test that generated texts tokenize to exactly the requested length"""
+        analyzer = StockSentimentAnalyzer(model_name=self.model)
+        texts = make_texts(analyzer.tokenizer, 5, 40)
+
+        self.assertEqual(len(set(texts)), 5)
+        self.assertEqual(texts, make_texts(analyzer.tokenizer, 5, 40))
+        self.assertEqual([len(ids) for ids in analyzer._encode(texts)], [40] * 5)
+
+    def test_run_and_compare(self):
+        """Test that every case is measured and a slowdown is reported as a regression"""
+        report = run_benchmarks(self.model, sequence_lengths=(16,), batch_sizes=(1, 4), single_calls=2,
+                                articles=4, repeats=1, progress=None)
+
+        cases = [(r['benchmark'], r['batch_size']) for r in report['results']]
+        self.assertEqual(cases, [('analyze_sentiment', 1), ('get_stock_sentiment', 1), ('get_stock_sentiment', 4)])
+        self.assertTrue(all(r['texts_per_second'] > 0 and r['p50_ms'] <= r['p99_ms'] for r in report['results']))
+
+        slower = json.loads(json.dumps(report))
+        slower['results'][0]['texts_per_second'] /= 2
+        comparison = compare_results(report, slower)
+        self.assertEqual(comparison['compared'], 3)
+        self.assertEqual([(r['benchmark'], r['metric']) for r in comparison['regressions']],
+                         [('analyze_sentiment', 'texts_per_second')])
+        self.assertEqual(compare_results(slower, report)['improvements'][0]['change'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Unit tests for local model bundles, using a tiny randomly initialized BERT
+"""
+
+import os
+import tempfile
+import unittest
+
+import torch
+from transformers import BertTokenizerFast
+
+from src.bundle import build_bundle, is_bundle, load_bundle_model, verify_bundle
+from src.sentiment_analyzer import StockSentimentAnalyzer
+from tests.test_backends import make_inputs, make_tiny_model
+
+
+VOCAB = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', 'apple', 'shares', 'fell', 'rose', 'sharply', 'today']
+
+
+class TestBundle(unittest.TestCase):
+    """Test cases for building and loading bundles"""
+
+    def setUp(self):
+        """Save a tiny model and tokenizer as the bundle source"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.source = os.path.join(self.tmpdir.name, 'source')
+        self.output = os.path.join(self.tmpdir.name, 'bundle')
+        vocab_file = os.path.join(self.tmpdir.name, 'vocab.txt')
+        with open(vocab_file, 'w') as f:
+            f.write('\n'.join(VOCAB + [f'tok{i}' for i in range(100 - len(VOCAB))]))
+
+        self.model = make_tiny_model()
+        self.model.save_pretrained(self.source)
+        BertTokenizerFast(vocab_file=vocab_file).save_pretrained(self.source)
+
+    def test_bundle_round_trip(self):
+        """Test that a bundled model reproduces the source model exactly"""
+        manifest = build_bundle(self.source, self.output)
+
+        self.assertTrue(is_bundle(self.output))
+        self.assertFalse(is_bundle(self.source))
+        self.assertIn('tokenizer.json', manifest['files'])
+        self.assertEqual(verify_bundle(self.output), [])
+
+        model = load_bundle_model(self.output)
+        self.assertFalse(any(t.is_meta for t in list(model.parameters()) + list(model.buffers())))
+        inputs = make_inputs([5, 12])
+        with torch.no_grad():
+            self.assertTrue(torch.equal(model(**inputs).logits, self.model(**inputs).logits))
+
+    def test_analyzer_loads_bundle(self):
+        """Test that the analyzer scores the same from a bundle as from the source"""
+        build_bundle(self.source, self.output)
+        texts = ["apple shares rose sharply today", "shares fell"]
+
+        expected = StockSentimentAnalyzer(model_name=self.source, cache_size=0).analyze_batch(texts)
+        actual = StockSentimentAnalyzer(model_name=self.output, cache_size=0).analyze_batch(texts)
+
+        self.assertEqual(actual, expected)
+
+    def test_verify_detects_damage(self):
+        """Test that a modified weights file is reported"""
+        build_bundle(self.source, self.output)
+        with open(os.path.join(self.output, 'weights.safetensors'), 'r+b') as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b'\x00\x00\x80\x7f')
+
+        self.assertEqual(verify_bundle(self.output), ['weights.safetensors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit tests for the result cache
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from src.cache import DiskResultCache, ResultCache, make_cache_key
+
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the ResultCache class"""
+
+    def test_cache_key_normalizes_whitespace(self):
+        """Test that keys ignore whitespace differences but not model settings"""
+        key = make_cache_key("Apple beats  estimates", "ProsusAI/finbert", 512)
+
+        self.assertEqual(key, make_cache_key(" Apple beats\nestimates ", "ProsusAI/finbert", 512))
+        self.assertNotEqual(key, make_cache_key("Apple beats estimates", "ProsusAI/finbert", 128))
+        self.assertNotEqual(key, make_cache_key("Apple beats estimates", "other/model", 512))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = ResultCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        cache = ResultCache(max_entries=2, ttl=10)
+        with patch('src.cache.time.monotonic', return_value=100.0):
+            cache.set("a", 1)
+        with patch('src.cache.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get("a"), 1)
+        with patch('src.cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_disabled_cache(self):
+        """Test that a zero-size cache stores nothing"""
+        cache = ResultCache(max_entries=0)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+
+
+class TestDiskResultCache(unittest.TestCase):
+    """Test cases for the DiskResultCache class"""
+
+    def setUp(self):
+        """Create a temporary database location"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache', 'results.sqlite')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_results_are_shared_between_instances(self):
+        """Test that a second store on the same file sees the first one's writes"""
+        writer = DiskResultCache(self.path)
+        writer.set_many({"a": {"positive": 0.9, "negative": 0.05, "neutral": 0.05}})
+
+        reader = DiskResultCache(self.path)
+        found = reader.get_many(["a", "b"])
+
+        self.assertEqual(found, {"a": {"positive": 0.9, "negative": 0.05, "neutral": 0.05}})
+        self.assertEqual(reader.stats()['hits'], 1)
+        self.assertEqual(reader.stats()['misses'], 1)
+
+    def test_eviction_keeps_newest_entries(self):
+        """Test that the store is trimmed back to max_entries, oldest first"""
+        store = DiskResultCache(self.path, max_entries=3)
+        for i in range(5):
+            with patch('src.cache.time.time', return_value=float(i)):
+                store.set_many({f"k{i}": i})
+        store.evict()
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.get_many([f"k{i}" for i in range(5)]), {"k2": 2, "k3": 3, "k4": 4})
+
+    def test_concurrent_writers(self):
+        """Test that several writers on separate connections do not lose results"""
+        stores = [DiskResultCache(self.path) for _ in range(4)]
+
+        def write(store, offset):
+            for i in range(25):
+                store.set_many({f"{offset}-{i}": i})
+
+        threads = [threading.Thread(target=write, args=(store, n)) for n, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(stores[0]), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Unit tests for SimHash near-duplicate detection
+"""
+
+import random
+import unittest
+
+from src.backends import REFERENCE_TEXTS
+from src.dedup import NearDuplicateIndex, hamming_distance, simhash
+
+
+STORY = ' '.join(REFERENCE_TEXTS)
+
+# 85 words
+SHORT_STORY = ' '.join(REFERENCE_TEXTS[:8])
+
+
+class TestSimHash(unittest.TestCase):
+    """Test cases for the fingerprint function"""
+
+    def test_ignores_case_punctuation_and_spacing(self):
+        self.assertEqual(simhash(STORY), simhash("  " + STORY.upper().replace(',', ';').replace(' ', '\n')))
+
+    def test_light_edits_stay_close(self):
+        max_distance = NearDuplicateIndex().max_distance
+        for story in (STORY, SHORT_STORY):
+            fingerprint = simhash(story)
+            for copy in ("By Jane Doe (Reuters) - " + story, story + " Not investment advice.",
+                         "By Jane Doe (Reuters) - " + story + " Not investment advice.",
+                         "NEW YORK, March 3 (Reuters) - " + story + " (Reporting by Jane Doe; Editing by Mark Potter)"):
+                self.assertLessEqual(hamming_distance(fingerprint, simhash(copy)), max_distance, copy)
+        self.assertGreater(hamming_distance(simhash(STORY), simhash(SHORT_STORY)), max_distance)
+
+    def test_sentiment_edits_never_match(self):
+        fingerprint = simhash(SHORT_STORY)
+        for old, new in [("raises", "cuts"), ("record", "weak"), ("plunged", "jumped"), ("downgraded", "upgraded")]:
+            self.assertGreater(hamming_distance(fingerprint, simhash(SHORT_STORY.replace(old, new))), 15, new)
+        edited = SHORT_STORY.replace("raises", "cuts").replace("record", "weak")
+        self.assertGreater(hamming_distance(fingerprint, simhash(edited)), 15)
+
+        index = NearDuplicateIndex()
+        index.add(fingerprint, 'scores')
+        self.assertIsNone(index.find(simhash(edited)))
+        self.assertEqual(index.find(simhash("By Jane Doe (Reuters) - " + SHORT_STORY + " Not investment advice.")),
+                         'scores')
+
+    def test_ignores_stopwords_and_short_words(self):
+        self.assertEqual(simhash("Apple reports record revenue, up 12% in Q4"),
+                         simhash("Apple reports a record revenue that is up by 12% in the Q4"))
+
+    def test_short_texts(self):
+        self.assertIsNone(simhash("Apple beats estimates", min_words=20))
+        self.assertIsNone(simhash("  ...  "))
+        self.assertIsInstance(simhash("Apple"), int)
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    """Test cases for NearDuplicateIndex"""
+
+    def test_finds_within_max_distance(self):
+        index = NearDuplicateIndex(max_distance=3)
+        base = 0x0123456789ABCDEF
+        index.add(base, 'scores')
+
+        self.assertEqual(index.find(base ^ 0b111), 'scores')
+        self.assertEqual(index.find(base ^ (1 << 63) ^ (1 << 40) ^ (1 << 20)), 'scores')
+        self.assertIsNone(index.find(base ^ 0b1111))
+        self.assertIsNone(index.find(base, namespace='long'))
+        self.assertEqual(index.stats()['hits'], 2)
+        self.assertEqual(index.stats()['misses'], 2)
+
+    def test_prefers_closest_match(self):
+        index = NearDuplicateIndex(max_distance=4)
+        index.add(0b1111, 'far')
+        index.add(0b0001, 'near')
+        self.assertEqual(index.find(0b0000), 'near')
+
+    def test_bounded_least_recently_used(self):
+        rng = random.Random(0)
+        index = NearDuplicateIndex(max_entries=3)
+        fingerprints = [rng.getrandbits(64) for _ in range(4)]
+        for i, fingerprint in enumerate(fingerprints[:3]):
+            index.add(fingerprint, i)
+        index.find(fingerprints[0])
+        index.add(fingerprints[3], 3)
+
+        self.assertEqual(len(index), 3)
+        self.assertIsNone(index.find(fingerprints[1]))
+        self.assertEqual(index.find(fingerprints[0]), 0)
+        self.assertEqual(sum(len(bucket) for bucket in index._buckets.values()), 3 * len(index._bands))
+
+    def test_rejects_unsupported_distance(self):
+        with self.assertRaises(ValueError):
+            NearDuplicateIndex(max_distance=16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Unit tests for response encoding and content negotiation
+"""
+
+import gzip
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src import encoding
+from src.encoding import (
+    JSON_MIMETYPE, MSGPACK_MIMETYPE, accepts_gzip, compress, dumps_json, encode, loads_json, negotiate
+)
+
+
+PAYLOAD = {"symbol": "AAPL", "scores": {"positive": [0.25, 0.5], "negative": [0.125, 0.25]}, "note": "café"}
+
+
+class TestEncoding(unittest.TestCase):
+    """Test cases for the encoding helpers"""
+
+    def test_json_round_trip_with_and_without_orjson(self):
+        fast = dumps_json(PAYLOAD)
+        with patch.object(encoding, 'orjson', None):
+            slow = dumps_json(PAYLOAD)
+            self.assertEqual(loads_json(slow), PAYLOAD)
+        self.assertEqual(json.loads(fast), PAYLOAD)
+        self.assertEqual(loads_json(fast), PAYLOAD)
+        self.assertNotIn(b' ', slow)
+        with self.assertRaises(ValueError):
+            loads_json(b'{"text": ')
+
+    def test_negotiate(self):
+        with patch.object(encoding, 'msgpack', MagicMock()):
+            self.assertEqual(negotiate('application/msgpack'), MSGPACK_MIMETYPE)
+            self.assertEqual(negotiate('application/x-msgpack, application/json;q=0.5'), MSGPACK_MIMETYPE)
+            self.assertEqual(negotiate('application/json, application/msgpack;q=0.5'), JSON_MIMETYPE)
+            self.assertEqual(negotiate('application/msgpack;q=0'), JSON_MIMETYPE)
+            self.assertEqual(negotiate('*/*'), JSON_MIMETYPE)
+            self.assertEqual(negotiate(None), JSON_MIMETYPE)
+        with patch.object(encoding, 'msgpack', None):
+            self.assertEqual(negotiate('application/msgpack'), JSON_MIMETYPE)
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip('gzip, deflate, br'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip('gzip;q=0, deflate'))
+        self.assertFalse(accepts_gzip('br'))
+        self.assertFalse(accepts_gzip(None))
+
+    def test_compress_only_large_bodies(self):
+        body = dumps_json({"scores": [0.5] * 1000})
+        compressed, headers = compress(body, 'gzip', min_gzip_bytes=1000)
+        self.assertEqual(headers, {'Content-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(compressed), body)
+        self.assertEqual(compress(body, 'gzip', min_gzip_bytes=len(body) + 1), (body, {}))
+        self.assertEqual(compress(body, 'identity', min_gzip_bytes=0), (body, {}))
+        self.assertEqual(compress(body, 'gzip', min_gzip_bytes=None), (body, {}))
+
+    def test_encode(self):
+        body, mimetype, headers = encode(PAYLOAD, 'application/msgpack', 'gzip', min_gzip_bytes=0)
+        self.assertEqual(headers['Vary'], 'Accept, Accept-Encoding')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        if encoding.msgpack is None:
+            self.assertEqual(mimetype, JSON_MIMETYPE)
+            self.assertEqual(loads_json(gzip.decompress(body)), PAYLOAD)
+        else:
+            self.assertEqual(mimetype, MSGPACK_MIMETYPE)
+            self.assertEqual(encoding.msgpack.unpackb(gzip.decompress(body)), PAYLOAD)
+
+
+if __name__ == '__main__':
+    unittest.main()
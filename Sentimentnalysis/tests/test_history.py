@@ -0,0 +1,57 @@
+"""
+Unit tests for the persistent sentiment history
+"""
+
+import os
+import tempfile
+import unittest
+
+from src.history import SentimentHistory, text_hash
+
+
+POSITIVE = {'positive': 0.8, 'negative': 0.1, 'neutral': 0.1}
+NEGATIVE = {'positive': 0.1, 'negative': 0.7, 'neutral': 0.2}
+
+
+class TestSentimentHistory(unittest.TestCase):
+    """Test cases for SentimentHistory"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.history = SentimentHistory(os.path.join(self.tmpdir.name, 'history', 'sentiment.db'))
+
+    def test_series_downsamples_by_interval(self):
+        """Test that points are per interval, aligned to its multiples, and limited to the symbol and range"""
+        self.history.append('aapl', ['a', 'b'], [POSITIVE, NEGATIVE], 7200)
+        self.history.append('AAPL', ['c'], [POSITIVE], 7300)
+        self.history.append('AAPL', ['d'], [NEGATIVE], 10900)
+        self.history.append('AAPL', ['e'], [NEGATIVE], 20000)
+        self.history.append('MSFT', ['f'], [NEGATIVE], 7200)
+
+        points = self.history.series('AAPL', 7000, 14400, 3600)
+
+        self.assertEqual([(p['start'], p['count']) for p in points], [(7200, 3), (10800, 1)])
+        self.assertAlmostEqual(points[0]['mean']['positive'], 1.7 / 3)
+        self.assertEqual(points[1]['mean'], NEGATIVE)
+        self.assertEqual(len(self.history), 6)
+
+    def test_range_query_uses_covering_index(self):
+        """Test that a symbol's time-range query is answered from the index alone"""
+        plan = self.history._connect().execute(
+            "EXPLAIN QUERY PLAN SELECT CAST(ts / 60 AS INTEGER) AS bucket, COUNT(*), AVG(positive), "
+            "AVG(negative), AVG(neutral) FROM history WHERE symbol = 'AAPL' AND ts >= 0 AND ts < 1 "
+            "GROUP BY bucket ORDER BY bucket"
+        ).fetchall()
+
+        self.assertIn('USING COVERING INDEX history_symbol_ts', ' '.join(row[-1] for row in plan))
+
+    def test_text_hash(self):
+        """Test that hashes ignore whitespace differences and cover token ids"""
+        self.assertEqual(text_hash("Apple  beats\nestimates"), text_hash("Apple beats estimates"))
+        self.assertNotEqual(text_hash([101, 102]), text_hash([101, 103]))
+        self.assertEqual(self.history.append(' ', ['a'], [POSITIVE], 0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Unit tests for bulk jobs
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from src.jobs import JobRunner, JobStore
+from tests.test_app import FakeAnalyzer
+
+
+def read_results(store, job_id):
+    with open(store.path(job_id, 'results.jsonl')) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestJobs(unittest.TestCase):
+    """Test cases for JobStore and JobRunner"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = JobStore(self.tmpdir.name)
+        self.analyzer = FakeAnalyzer()
+        self.runner = JobRunner(self.store, lambda: self.analyzer, batch_size=2)
+
+    def test_upload_and_run(self):
+        """Test that records split across chunks are scored in order, with bad lines reported"""
+        job = self.store.create([b'"Apple beats"\n{"id": 7, "te', b'xt": "Shares fell"}\n\n[1]\n', b'"last"'])
+        self.assertEqual((job['status'], job['total']), ('queued', 4))
+
+        self.runner.run_pending()
+
+        job = self.store.get(job['id'])
+        self.assertEqual((job['status'], job['done']), ('completed', 4))
+        self.assertIsNotNone(job['items_per_second'])
+        results = read_results(self.store, job['id'])
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertEqual(results[1]['id'], 7)
+        self.assertEqual(results[1]['sentiment_scores'], FakeAnalyzer._scores(len("Shares fell")))
+        self.assertIn('error', results[2])
+        # Two records per batch, the invalid one is never sent to the model
+        self.assertEqual(self.analyzer.calls, [('analyze_batch', ["Apple beats", "Shares fell"]),
+                                               ('analyze_batch', ["last"])])
+        self.assertEqual(self.store.pending(), [])
+
+    def test_resume_after_crash(self):
+        """Test that a job interrupted mid-write continues after its last complete result"""
+        job = self.store.create([b'"a"\n"bb"\n"ccc"\n"dddd"\n'])
+        with open(self.store.path(job['id'], 'results.jsonl'), 'w') as f:
+            f.write(json.dumps({"index": 0, "sentiment_scores": {}}) + '\n{"index": 1, "sent')
+        job.update(status='running', done=1)
+        self.store.save(job)
+
+        self.runner.run_pending()
+
+        results = read_results(self.store, job['id'])
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertEqual(self.analyzer.calls, [('analyze_batch', ["bb", "ccc"]), ('analyze_batch', ["dddd"])])
+        self.assertEqual(self.store.get(job['id'])['status'], 'completed')
+
+    def test_empty_and_unknown(self):
+        """Test that empty corpora are rejected and unknown ids are not found"""
+        with self.assertRaises(ValueError):
+            self.store.create([b'\n\n'])
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+        def interrupted():
+            yield b'"a"\n"b'
+            raise ConnectionError("client went away")
+
+        with self.assertRaises(ConnectionError):
+            self.store.create(interrupted())
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+        self.assertIsNone(self.store.get('../etc'))
+        self.assertIsNone(self.store.get('0' * 32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Unit tests for the HTTP load generator
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.loadgen import TrafficMix, run_load, wait_until_ready
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answers /analyze with 200 and /analyze-stock with 500, keeping connections alive"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._reply(200)
+
+    def do_POST(self):
+        json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self._reply(200 if self.path == '/analyze' else 500)
+
+    def _reply(self, status):
+        body = b'{}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """Test cases for the traffic mix and both load modes"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def test_traffic_mix(self):
+        """Test that the mix is reproducible, unique and split between the endpoints"""
+        mix = TrafficMix(single_fraction=0.5, article_counts=(3,))
+        requests = [mix.next_request() for _ in range(200)]
+
+        self.assertEqual(requests[0], TrafficMix(single_fraction=0.5, article_counts=(3,)).next_request())
+        singles = [json.loads(body)["text"] for endpoint, _, body, _ in requests if endpoint == 'analyze']
+        self.assertTrue(50 < len(singles) < 150)
+        self.assertEqual(len(set(singles)), len(singles))
+        self.assertTrue(all(texts == 3 for endpoint, _, _, texts in requests if endpoint == 'analyze_stock'))
+
+    def test_closed_loop(self):
+        """Test that closed-loop load reports errors and latency per endpoint"""
+        wait_until_ready(self.url, timeout=5)
+        report = run_load(self.url, mode='closed', duration=0.5, concurrency=2,
+                          mix=TrafficMix(single_fraction=0.5))
+
+        self.assertGreater(report['requests'], 10)
+        analyze, stock = report['endpoints']['analyze'], report['endpoints']['analyze_stock']
+        self.assertEqual(analyze['error_rate'], 0.0)
+        self.assertEqual(stock['error_rate'], 1.0)
+        self.assertEqual(report['errors'], stock['requests'])
+        self.assertEqual(report['status_codes'], {'200': analyze['requests'], '500': stock['requests']})
+        self.assertLessEqual(report['latency_ms']['p50'], report['latency_ms']['p99'])
+
+    def test_open_loop(self):
+        """Test that open-loop load starts requests at about the target rate"""
+        report = run_load(self.url, mode='open', duration=1.0, qps=100, concurrency=4,
+                          mix=TrafficMix(single_fraction=1.0))
+
+        self.assertTrue(50 <= report['requests'] <= 150)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['target_qps'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Unit tests for the pipeline instrumentation
+"""
+
+import unittest
+
+from src.metrics import Histogram, PrometheusWriter, RequestMetrics, StageTimer
+
+
+class TestHistogram(unittest.TestCase):
+    """Test cases for Histogram"""
+
+    def test_cumulative_buckets(self):
+        """Test that observations land in the first bucket whose bound they do not exceed"""
+        histogram = Histogram((1, 4))
+        histogram.observe(0.5)
+        histogram.observe(1)
+        histogram.observe_many([3, 10])
+
+        cumulative, total, count = histogram.snapshot()
+
+        self.assertEqual(cumulative, [2, 3, 4])
+        self.assertEqual(total, 14.5)
+        self.assertEqual(count, 4)
+
+    def test_reset(self):
+        """Test that reset clears counts and sum"""
+        histogram = Histogram((1,))
+        histogram.observe(2, count=3)
+        histogram.reset()
+
+        self.assertEqual(histogram.snapshot(), ([0, 0], 0.0, 0))
+
+
+class TestStageTimer(unittest.TestCase):
+    """Test cases for StageTimer"""
+
+    def test_records_histogram_per_stage(self):
+        """Test that each stage gets its own latency histogram alongside the totals"""
+        timer = StageTimer()
+        timer.record('forward', 0.002, items=8)
+        timer.record('forward', 0.2, items=8)
+        timer.record('tokenize', 0.001)
+
+        histograms = timer.histograms()
+
+        self.assertEqual(sorted(histograms), ['forward', 'tokenize'])
+        self.assertEqual(histograms['forward'].snapshot()[2], 2)
+        self.assertEqual(timer.snapshot()['forward']['items'], 16)
+        timer.reset()
+        self.assertEqual(timer.histograms(), {})
+
+
+class TestPrometheusWriter(unittest.TestCase):
+    """Test cases for the Prometheus text format"""
+
+    def test_render(self):
+        """Test histogram, counter and gauge families with escaped labels"""
+        histogram = Histogram((0.1,))
+        histogram.observe(0.05)
+        histogram.observe(1.0)
+        metrics = RequestMetrics()
+        metrics.observe('analyze_single', 200, 0.01)
+        metrics.observe('analyze_single', 200, 0.02)
+
+        writer = PrometheusWriter()
+        writer.histogram('latency_seconds', "Latency", [({'stage': 'a"b'}, histogram)])
+        writer.counter('responses_total', "Responses",
+                       [({'endpoint': e, 'status': s}, n) for (e, s), n in metrics.responses().items()])
+        writer.gauge('queue_depth', "Queue", [({}, 3)])
+        lines = writer.render().splitlines()
+
+        self.assertEqual(lines[:2], ['# HELP latency_seconds Latency', '# TYPE latency_seconds histogram'])
+        self.assertIn('latency_seconds_bucket{stage="a\\"b",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{stage="a\\"b",le="+Inf"} 2', lines)
+        self.assertIn('latency_seconds_sum{stage="a\\"b"} 1.05', lines)
+        self.assertIn('latency_seconds_count{stage="a\\"b"} 2', lines)
+        self.assertIn('responses_total{endpoint="analyze_single",status="200"} 2', lines)
+        self.assertIn('queue_depth 3', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
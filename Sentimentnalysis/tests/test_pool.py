@@ -0,0 +1,145 @@
+"""
+Unit tests for the multi-process inference pool, using a tiny randomly initialized BERT
+"""
+
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import torch
+
+from src.backends import TorchBackend, compare_outputs, create_backend
+from src.pool import PoolBackend, _available_cores
+from tests.test_backends import make_inputs, make_tiny_model
+
+
+class TestPoolBackend(unittest.TestCase):
+    """Test cases for PoolBackend"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        model = make_tiny_model()
+        model.save_pretrained(cls.tmpdir.name)
+        cls.reference = TorchBackend(model)
+        # A small capacity forces batches to be split into several round trips per worker
+        cls.pool = create_backend('pool', model_name=cls.tmpdir.name, workers=2, num_threads=1)
+        cls.pool.capacity = 64
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        cls.tmpdir.cleanup()
+
+    def assert_matches_eager(self, inputs):
+        report = compare_outputs(torch.softmax(self.reference(inputs), dim=1), torch.softmax(self.pool(inputs), dim=1))
+        self.assertLess(report['max_abs_diff'], 1e-5)
+
+    def test_matches_eager(self):
+        """Test that sharded batches reproduce eager outputs in row order"""
+        for lengths in ([5], [3, 17, 9], [30] * 7):
+            self.assert_matches_eager(make_inputs(lengths))
+
+    def test_concurrent_callers(self):
+        """Test that calls from several threads share the workers without mixing results"""
+        errors = []
+
+        def run():
+            try:
+                for _ in range(5):
+                    self.assert_matches_eager(make_inputs([12, 4, 20]))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_failed_shard_leaves_workers_in_sync(self):
+        """Test that a worker error is raised without leaving a stale reply for the next call"""
+        for bad_row in (0, 1, 0, 1):
+            inputs = make_inputs([5, 5])
+            inputs['input_ids'][bad_row, 2] = 1000  # Outside the vocabulary, so that shard fails
+            with self.assertRaises(RuntimeError):
+                self.pool(inputs)
+            self.assert_matches_eager(make_inputs([5, 5]))
+            self.assert_matches_eager(make_inputs([7, 3, 9]))
+
+    def test_replaces_dead_worker(self):
+        """Test that a worker whose process died is restarted rather than reused"""
+        self.pool(make_inputs([4]))
+        dead = self.pool._handles[0]
+        dead.process.kill()
+        dead.process.join()
+
+        with self.assertRaises(RuntimeError):
+            for _ in range(4):
+                self.pool(make_inputs([6, 6]))
+        self.assertNotIn(dead, self.pool._handles)
+        self.assertEqual(len(self.pool._handles), 2)
+        self.assert_matches_eager(make_inputs([6, 6]))
+
+    @unittest.skipUnless(hasattr(signal, 'SIGSTOP'), "needs SIGSTOP")
+    def test_replaces_wedged_worker(self):
+        """Test that a worker that stops answering times out and is replaced"""
+        self.pool(make_inputs([4]))
+        wedged = self.pool._handles[0]
+        os.kill(wedged.process.pid, signal.SIGSTOP)
+        self.pool.reply_timeout = 1
+        try:
+            with self.assertRaisesRegex(RuntimeError, "did not answer"):
+                for _ in range(4):
+                    self.pool(make_inputs([6, 6]))
+        finally:
+            self.pool.reply_timeout = 120
+        self.assertFalse(wedged.process.is_alive())
+        self.assertNotIn(wedged, self.pool._handles)
+        self.assert_matches_eager(make_inputs([6, 6]))
+
+    def test_fails_fast_without_workers(self):
+        """Test that a pool whose only worker cannot be restarted raises, reports itself unhealthy and recovers"""
+        pool = create_backend('pool', model_name=self.tmpdir.name, workers=1, num_threads=1)
+        self.addCleanup(pool.close)
+        pool(make_inputs([4]))
+        self.assertTrue(pool.health()['healthy'])
+        pool._handles[0].process.kill()
+
+        with patch.object(pool, '_spawn', side_effect=RuntimeError("no memory")):
+            with self.assertRaises(RuntimeError):
+                pool(make_inputs([4]))
+            started = time.monotonic()
+            with self.assertRaisesRegex(RuntimeError, "No inference pool workers are running"):
+                pool(make_inputs([4]))
+            self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(pool.health(), {'healthy': False, 'workers': 1, 'running': 0, 'restarting': 1})
+
+        # The slot is retried once its backoff has expired
+        time.sleep(1.1)
+        self.assertEqual(pool(make_inputs([4])).shape, (1, 3))
+        self.assertEqual(pool.health(), {'healthy': True, 'workers': 1, 'running': 1, 'restarting': 0})
+
+    def test_default_size_shares_cores_with_web_workers(self):
+        """Test that each web worker's pool defaults to its share of the cores rather than all of them"""
+        cores = len(_available_cores())
+        with patch.dict(os.environ, {'WEB_CONCURRENCY': '2'}):
+            self.assertEqual(PoolBackend(self.tmpdir.name).workers, max(1, cores // 2))
+        with patch.dict(os.environ, {'WEB_CONCURRENCY': str(cores * 4)}):
+            self.assertEqual(PoolBackend(self.tmpdir.name).workers, 1)
+        with patch.dict(os.environ, {'WEB_CONCURRENCY': ''}):
+            self.assertEqual(PoolBackend(self.tmpdir.name).workers, cores)
+
+    def test_rejects_oversized_rows(self):
+        """Test that rows longer than the shared buffers are refused"""
+        with self.assertRaises(ValueError):
+            self.pool(make_inputs([65]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,16 +2,32 @@
 Unit tests for the StockSentimentAnalyzer class
 """
 
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 import torch
-import sys
-import os
 
-# Add src directory to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from src.backends import REFERENCE_TEXTS, TorchBackend
+from src.sentiment_analyzer import StockSentimentAnalyzer
+
+
+def make_mock_tokenizer():
+    """Builds a tokenizer mock that encodes each word of a text as one token id"""
+    tokenizer = MagicMock()
+    tokenizer.vocab_size = 30522
+    tokenizer.pad_token_id = 0
+    tokenizer.cls_token_id = 101
+    tokenizer.sep_token_id = 102
 
-from sentiment_analyzer import StockSentimentAnalyzer
+    def tokenize(texts, add_special_tokens=True, **kwargs):
+        encoded = [[len(word) for word in text.split()] for text in texts]
+        if add_special_tokens:
+            encoded = [[101] + ids + [102] for ids in encoded]
+        return {'input_ids': encoded}
+
+    tokenizer.side_effect = tokenize
+    return tokenizer
 
 
 class TestStockSentimentAnalyzer(unittest.TestCase):
@@ -26,8 +42,8 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
             "Market concerns about supply chain issues"
         ]
     
-    @patch('sentiment_analyzer.BertTokenizer')
-    @patch('sentiment_analyzer.BertForSequenceClassification')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
     def test_analyzer_initialization(self, mock_model_class, mock_tokenizer_class):
         """Test that the analyzer initializes correctly"""
         # Mock the tokenizer and model
@@ -48,8 +64,8 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
         mock_tokenizer_class.from_pretrained.assert_called_with('ProsusAI/finbert')
         mock_model_class.from_pretrained.assert_called_with('ProsusAI/finbert')
     
-    @patch('sentiment_analyzer.BertTokenizer')
-    @patch('sentiment_analyzer.BertForSequenceClassification')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
     def test_analyzer_initialization_custom_model(self, mock_model_class, mock_tokenizer_class):
         """Test that the analyzer initializes with custom model name"""
         mock_tokenizer = MagicMock()
@@ -63,21 +79,14 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
         mock_tokenizer_class.from_pretrained.assert_called_with(custom_model)
         mock_model_class.from_pretrained.assert_called_with(custom_model)
     
-    @patch('sentiment_analyzer.BertTokenizer')
-    @patch('sentiment_analyzer.BertForSequenceClassification')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
     def test_analyze_sentiment(self, mock_model_class, mock_tokenizer_class):
         """Test sentiment analysis of single text"""
         # Setup mocks
-        mock_tokenizer = MagicMock()
+        mock_tokenizer = make_mock_tokenizer()
         mock_model = MagicMock()
         
-        # Mock tokenizer output
-        mock_inputs = {
-            'input_ids': torch.tensor([[1, 2, 3, 4]]),
-            'attention_mask': torch.tensor([[1, 1, 1, 1]])
-        }
-        mock_tokenizer.return_value = mock_inputs
-        
         # Mock model output - simulate logits for positive, negative, neutral
         mock_logits = torch.tensor([[2.0, 1.0, 0.5]])  # Higher score for positive
         mock_model.return_value.logits = mock_logits
@@ -93,15 +102,17 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
         
         # Verify tokenizer was called correctly
         mock_tokenizer.assert_called_once_with(
-            self.sample_text,
-            return_tensors="pt",
-            padding=True,
+            [self.sample_text],
             truncation=True,
             max_length=512
         )
         
-        # Verify model was called
-        mock_model.assert_called_once_with(**mock_inputs)
+        # Verify model was called with the encoded text
+        mock_model.assert_called_once()
+        inputs = mock_model.call_args.kwargs
+        self.assertEqual(inputs['input_ids'].tolist(), [[101, 5, 5, 2, 10, 13, 4, 6, 102]])
+        self.assertEqual(inputs['attention_mask'].tolist(), [[1] * 9])
+        self.assertEqual(inputs['token_type_ids'].tolist(), [[0] * 9])
         
         # Verify result structure
         self.assertIn('positive', result)
@@ -117,23 +128,16 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
             self.assertGreaterEqual(score, 0.0)
             self.assertLessEqual(score, 1.0)
     
-    @patch('sentiment_analyzer.BertTokenizer')
-    @patch('sentiment_analyzer.BertForSequenceClassification')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
     def test_get_stock_sentiment(self, mock_model_class, mock_tokenizer_class):
         """Test sentiment analysis of multiple articles"""
         # Setup mocks
-        mock_tokenizer = MagicMock()
+        mock_tokenizer = make_mock_tokenizer()
         mock_model = MagicMock()
         
-        # Mock tokenizer output
-        mock_inputs = {
-            'input_ids': torch.tensor([[1, 2, 3, 4]]),
-            'attention_mask': torch.tensor([[1, 1, 1, 1]])
-        }
-        mock_tokenizer.return_value = mock_inputs
-        
-        # Mock model output
-        mock_logits = torch.tensor([[1.5, 1.0, 1.2]])
+        # Mock model output - one row of logits per article in the batch
+        mock_logits = torch.tensor([[1.5, 1.0, 1.2], [0.2, 2.0, 0.1], [0.3, 0.4, 1.9]])
         mock_model.return_value.logits = mock_logits
         
         mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
@@ -160,11 +164,309 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
             total_score = sum(article_result.values())
             self.assertAlmostEqual(total_score, 1.0, places=2)
         
-        # Verify tokenizer was called for each article
-        self.assertEqual(mock_tokenizer.call_count, len(self.sample_articles))
+        # Verify all articles were tokenized and scored in a single batch
+        mock_tokenizer.assert_called_once_with(
+            self.sample_articles,
+            truncation=True,
+            max_length=512
+        )
+        mock_model.assert_called_once()
+        self.assertEqual(mock_model.call_args.kwargs['input_ids'].shape, (3, 8))
+        self.assertGreater(result[0]['positive'], result[0]['negative'])
+        self.assertGreater(result[1]['negative'], result[1]['positive'])
+        self.assertGreater(result[2]['neutral'], result[2]['positive'])
+        
+        # The articles are folded into the symbol's rolling aggregates
+        aggregates = analyzer.aggregates.get(symbol)
+        self.assertEqual(aggregates['windows']['1h']['count'], len(self.sample_articles))
+        self.assertAlmostEqual(aggregates['windows']['1h']['mean']['negative'],
+                               sum(r['negative'] for r in result) / len(result), places=5)
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_analyze_batch_respects_batch_size(self, mock_model_class, mock_tokenizer_class):
+        """Test that batches are split according to batch_size and keep input order"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.side_effect = [
+            MagicMock(logits=torch.tensor([[3.0, 0.0, 0.0], [0.0, 3.0, 0.0]])),
+            MagicMock(logits=torch.tensor([[0.0, 0.0, 3.0]]))
+        ]
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        analyzer = StockSentimentAnalyzer(batch_size=2)
+        result = analyzer.analyze_batch(self.sample_articles)
+        
+        mock_tokenizer.assert_called_once()
+        self.assertEqual(mock_model.call_count, 2)
+        self.assertEqual(mock_model.call_args_list[0].kwargs['input_ids'].shape[0], 2)
+        self.assertEqual(mock_model.call_args_list[1].kwargs['input_ids'].shape[0], 1)
+        self.assertEqual([max(r, key=r.get) for r in result], ['positive', 'negative', 'neutral'])
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_analyze_batch_buckets_by_length(self, mock_model_class, mock_tokenizer_class):
+        """Test that mixed-length texts are batched by length and returned in input order"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        # Logits favour positive for short inputs and negative for long ones
+        mock_model.side_effect = lambda input_ids, **kwargs: MagicMock(logits=torch.tensor(
+            [[3.0, 0.0, 0.0] if row_len < 6 else [0.0, 3.0, 0.0]
+             for row_len in kwargs['attention_mask'].sum(dim=1).tolist()]
+        ))
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        texts = ["a b c d e f g h", "up", "x y z w v u", "down", "one two three four five six seven"]
+        analyzer = StockSentimentAnalyzer(batch_size=2)
+        result = analyzer.analyze_batch(texts)
+        
+        widths = [call.kwargs['input_ids'].shape for call in mock_model.call_args_list]
+        self.assertEqual(widths, [(2, 3), (2, 9), (1, 10)])
+        self.assertEqual([max(r, key=r.get) for r in result],
+                         ['negative', 'positive', 'negative', 'positive', 'negative'])
+    
+    def test_plan_batches_respects_token_budget(self):
+        """Test that batches stop growing once their padded size would exceed the budget"""
+        lengths = [10, 500, 12, 11, 480]
+        
+        self.assertEqual(StockSentimentAnalyzer._plan_batches(lengths, 8), [[0, 3, 2, 4, 1]])
+        self.assertEqual(StockSentimentAnalyzer._plan_batches(lengths, 8, max_batch_tokens=600),
+                         [[0, 3, 2], [4], [1]])
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_analyze_long_documents(self, mock_model_class, mock_tokenizer_class):
+        """Test that long texts are scored in overlapping windows and the windows are combined"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        # Windows containing a 9-letter word are negative, all others positive
+        mock_model.side_effect = lambda input_ids, **kwargs: MagicMock(logits=torch.tensor(
+            [[0.0, 4.0, 0.0] if 9 in row else [4.0, 0.0, 0.0] for row in input_ids.tolist()]
+        ))
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        # 8 tokens of content per window, 2 shared between consecutive windows
+        analyzer = StockSentimentAnalyzer(max_length=10, batch_size=16)
+        long_text = " ".join(["up"] * 14 + ["downgrade"] * 2)
+        
+        self.assertEqual(analyzer._windows(list(range(16)), stride=2), [
+            [101] + list(range(0, 8)) + [102],
+            [101] + list(range(6, 14)) + [102],
+            [101] + list(range(12, 16)) + [102]
+        ])
+        
+        mean = analyzer.analyze_long_documents([long_text, "up up"], stride=2)
+        mock_model.assert_called_once()
+        self.assertAlmostEqual(mean[0]['negative'], analyzer.analyze_long_documents(
+            [long_text], stride=2, aggregation='mean')[0]['negative'])
+        self.assertGreater(mean[0]['positive'], mean[0]['negative'])
+        self.assertGreater(mean[1]['positive'], 0.9)
+        
+        weighted = analyzer.analyze_long_documents([long_text], stride=2, aggregation='weighted')
+        self.assertGreater(weighted[0]['positive'], mean[0]['positive'])
+        
+        most_confident = analyzer.analyze_long_documents([long_text], stride=2, aggregation='max')
+        self.assertGreater(most_confident[0]['positive'], 0.9)
+        
+        # Texts without content tokens fall back to equal weights instead of dividing by zero
+        empty = analyzer.analyze_long_documents(["", "   "], stride=2, aggregation='weighted')
+        self.assertEqual(empty[0], empty[1])
+        self.assertGreater(empty[0]['positive'], 0.9)
+        
+        with self.assertRaises(ValueError):
+            analyzer.analyze_long_documents([long_text], aggregation='median')
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_cached_results_skip_inference(self, mock_model_class, mock_tokenizer_class):
+        """Test that repeated texts are served from the result cache"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.return_value.logits = torch.tensor([[2.0, 1.0, 0.5]])
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        analyzer = StockSentimentAnalyzer()
+        first = analyzer.analyze_sentiment(self.sample_text)
+        second = analyzer.analyze_sentiment("  " + self.sample_text.replace(" ", "\n") + " ")
+        batch = analyzer.analyze_batch([self.sample_text, self.sample_text])
+        
+        self.assertEqual(first, second)
+        self.assertEqual(batch, [first, first])
+        mock_tokenizer.assert_called_once()
+        mock_model.assert_called_once()
+        self.assertEqual(analyzer.cache.stats()['hits'], 2)
+        self.assertEqual(analyzer.cache.stats()['misses'], 1)
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_near_duplicates_skip_inference(self, mock_model_class, mock_tokenizer_class):
+        """Test that lightly edited copies of an article reuse its scores when matching is enabled"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.side_effect = lambda input_ids, **kwargs: MagicMock(
+            logits=torch.tensor([[2.0, 1.0, 0.5]] * input_ids.shape[0]))
+
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+
+        story = ' '.join(REFERENCE_TEXTS)
+        copies = ["By Jane Doe (Reuters) - " + story,
+                  story + " Reporting by Jane Doe; editing by John Roe.",
+                  story.upper()]
+        other = ' '.join(REFERENCE_TEXTS[:8])
+
+        analyzer = StockSentimentAnalyzer(near_duplicate_distance=10)
+        stats = {}
+        results = analyzer.analyze_batch([story, copies[0], other], stats=stats)
+        self.assertEqual(stats, {'near_duplicates': 1})
+        self.assertEqual(mock_model.call_args.kwargs['input_ids'].shape[0], 2)
+        self.assertEqual(results[1], results[0])
+
+        mock_model.reset_mock()
+        results = analyzer.get_stock_sentiment('NVDA', copies[1:], stats=stats)
+        self.assertEqual(stats, {'near_duplicates': 3})
+        mock_model.assert_not_called()
+        self.assertEqual(results, [results[0], results[0]])
+
+        # Short texts, edits of sentiment words and other scoring modes are never matched
+        analyzer.analyze_batch(["Apple beats estimates", "Apple misses estimates"], stats=stats)
+        analyzer.analyze_batch([story.replace("raises", "cuts")], stats=stats)
+        analyzer.analyze_long_documents([copies[0]], stats=stats)
+        self.assertEqual(stats, {'near_duplicates': 3})
+        self.assertEqual(mock_model.call_count, 3)
+
+        self.assertIsNone(StockSentimentAnalyzer().near_duplicates)
+
+        # Borrowed scores are approximate and never reach the exact caches
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.sqlite')
+            matching = StockSentimentAnalyzer(near_duplicate_distance=10, disk_cache_path=path)
+            matching.analyze_batch([story, copies[0]])
+            matching.analyze_batch([copies[1]])
+            self.assertEqual(len(matching.cache), 1)
+            mock_model.reset_mock()
+            StockSentimentAnalyzer(disk_cache_path=path).analyze_batch([story, copies[0], copies[1]])
+        mock_model.assert_called_once()
+        self.assertEqual(mock_model.call_args.kwargs['input_ids'].shape[0], 2)
+
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_disk_cache_shared_between_analyzers(self, mock_model_class, mock_tokenizer_class):
+        """Test that one analyzer's results are reused by another through the disk cache"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.return_value.logits = torch.tensor([[2.0, 1.0, 0.5]])
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.sqlite')
+            first = StockSentimentAnalyzer(disk_cache_path=path).analyze_sentiment(self.sample_text)
+            second = StockSentimentAnalyzer(disk_cache_path=path).analyze_batch([self.sample_text])
+        
+        self.assertEqual(second, [first])
+        mock_model.assert_called_once()
+
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_disk_cache_keyed_by_backend_and_precision(self, mock_model_class, mock_tokenizer_class):
+        """Test that results cached by one backend or precision are not reused by another"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.return_value.logits = torch.tensor([[2.0, 1.0, 0.5]])
+
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.sqlite')
+            StockSentimentAnalyzer(disk_cache_path=path).analyze_sentiment(self.sample_text)
+            for name, precision in [('torchscript', 'fp32'), ('torch', 'int8')]:
+                backend = TorchBackend(mock_model)
+                backend.name, backend.precision = name, precision
+                with patch('src.sentiment_analyzer.create_backend', return_value=backend):
+                    analyzer = StockSentimentAnalyzer(disk_cache_path=path)
+                self.assertEqual(analyzer.cache_variant, f"{name}:{precision}")
+                analyzer.analyze_sentiment(self.sample_text)
+                analyzer.analyze_long_documents([self.sample_text])
+            StockSentimentAnalyzer(disk_cache_path=path).analyze_batch([self.sample_text])
+
+        # One call for each configuration's sentence and windowed scores, none for the repeat
+        self.assertEqual(mock_model.call_count, 5)
+    
+    @patch('src.sentiment_analyzer.BertTokenizer')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_falls_back_to_python_tokenizer(self, mock_model_class, mock_fast_class, mock_slow_class):
+        """Test that the Python tokenizer is used when the fast one cannot load"""
+        mock_fast_class.from_pretrained.side_effect = OSError("no tokenizer.json")
+        
+        analyzer = StockSentimentAnalyzer()
+        
+        self.assertEqual(analyzer.tokenizer, mock_slow_class.from_pretrained.return_value)
+        
+        analyzer = StockSentimentAnalyzer(use_fast_tokenizer=False)
+        
+        self.assertEqual(mock_fast_class.from_pretrained.call_count, 1)
+        self.assertEqual(mock_slow_class.from_pretrained.call_count, 2)
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_token_cache_skips_tokenization(self, mock_model_class, mock_tokenizer_class):
+        """Test that repeated texts reuse their encoding even when results are not cached"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.return_value.logits = torch.tensor([[2.0, 1.0, 0.5]])
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        analyzer = StockSentimentAnalyzer(cache_size=0)
+        analyzer.analyze_sentiment(self.sample_text)
+        analyzer.analyze_sentiment(self.sample_text)
+        
+        mock_tokenizer.assert_called_once()
+        self.assertEqual(mock_model.call_count, 2)
+        timings = analyzer.get_stage_timings()
+        self.assertEqual(timings['tokenize']['items'], 1)
+        self.assertEqual(timings['forward']['items'], 2)
+        self.assertEqual(analyzer.batch_sizes.snapshot()[2], 2)
+    
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
+    def test_analyze_token_ids(self, mock_model_class, mock_tokenizer_class):
+        """Test that pre-tokenized inputs skip the tokenizer and are truncated like it would"""
+        mock_tokenizer = make_mock_tokenizer()
+        mock_model = MagicMock()
+        mock_model.return_value.logits = torch.tensor([[2.0, 1.0, 0.5], [0.5, 1.0, 2.0]])
+        
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+        mock_model_class.from_pretrained.return_value = mock_model
+        
+        analyzer = StockSentimentAnalyzer(max_length=4)
+        result = analyzer.analyze_token_ids([[101, 7, 102], [101, 1, 2, 3, 4, 102]])
+        
+        mock_tokenizer.assert_not_called()
+        inputs = mock_model.call_args.kwargs
+        self.assertEqual(inputs['input_ids'].tolist(), [[101, 7, 102, 0], [101, 1, 2, 102]])
+        self.assertEqual(inputs['attention_mask'].tolist(), [[1, 1, 1, 0], [1, 1, 1, 1]])
+        self.assertEqual([max(r, key=r.get) for r in result], ['positive', 'neutral'])
+
+        with self.assertRaises(ValueError):
+            analyzer.analyze_token_ids([[101, 30522, 102]])
+        self.assertEqual(mock_model.call_count, 1)
     
-    @patch('sentiment_analyzer.BertTokenizer')
-    @patch('sentiment_analyzer.BertForSequenceClassification')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
     def test_analyze_sentiment_empty_text(self, mock_model_class, mock_tokenizer_class):
         """Test sentiment analysis with empty text"""
         mock_tokenizer = MagicMock()
@@ -183,8 +485,8 @@ class TestStockSentimentAnalyzer(unittest.TestCase):
         self.assertIn('negative', result)
         self.assertIn('neutral', result)
     
-    @patch('sentiment_analyzer.BertTokenizer')
-    @patch('sentiment_analyzer.BertForSequenceClassification')
+    @patch('src.sentiment_analyzer.BertTokenizerFast')
+    @patch('src.sentiment_analyzer.BertForSequenceClassification')
     def test_get_stock_sentiment_empty_list(self, mock_model_class, mock_tokenizer_class):
         """Test stock sentiment analysis with empty articles list"""
         mock_tokenizer = MagicMock()